@@ -10,7 +10,9 @@
 #of the execution are included in a simple python class: 
 #rrr = RRR('74', 'VIC', '3H', '2000-01')
 #This class combines the pfaf_level_02 code, the Land Surface Model (LSM) name,
-#the LSM temporal resolution, and the month in yyyy-mm format.
+#the LSM temporal resolution, and the month in yyyy-mm format. Each driver runs
+#its programs with the RRR_PRF_DIR environment variable set to its own folder so
+#that the JSON traces of all programs are gathered into one profile at the end.
 #Authors:
 #Cedric H. David, Kevin Marlis, 2023-2023
 
@@ -19,10 +21,15 @@
 #Import Python modules
 #*******************************************************************************
 import os
+import sys
+import json
+import shutil
 import subprocess
 import datetime
 import dateutil.relativedelta
 import glob
+sys.path.append('../src')
+import rrr_lib_prf
 
 
 #*******************************************************************************
@@ -57,6 +64,7 @@ class RRR(object):
 
           self.out_dir = f'/tmp/output/'
           os.makedirs(self.out_dir, exist_ok=True)
+          self.prf_dir = f'/tmp/output/prf_{self.basn_id}_{self.yyyy_mm}/'
 
  
           #--------------------------------------------------------------------- 
@@ -106,6 +114,19 @@ class RRR(object):
           #--------------------------------------------------------------------- 
           self.m3r_ncf = f'm3_riv_pfaf_{self.basn_id}_GLDAS_{self.lsm_mod}_{self.lsm_stp}_{self.yyyy_mm}_utc.nc4'
 
+          #--------------------------------------------------------------------- 
+          #Profile {basn_id} {lsm_mod} {lsm_stp} {yyyy_mm}
+          #--------------------------------------------------------------------- 
+          self.prf_jsn = f'prf_pfaf_{self.basn_id}_GLDAS_{self.lsm_mod}_{self.lsm_stp}_{self.yyyy_mm}.json'
+
+
+#*******************************************************************************
+#Environment of the programs run by each driver
+#*******************************************************************************
+
+def drv_env(rrr: RRR, stage):
+     return dict(os.environ, RRR_PRF_DIR=rrr.prf_dir + stage)
+
 
 #*******************************************************************************
 #Driver for downloading
@@ -126,7 +147,8 @@ def drv_dwn(rrr: RRR):
           +[rrr.iso_end]                                                       \
           +[rrr.lsm_dir]                                                       \
           +['org_no']
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'dwn'))
 
 
 #*******************************************************************************
@@ -148,7 +170,8 @@ def drv_hyd(rrr: RRR):
           +[rrr.out_dir + rrr.xfc_csv]                                         \
           +[rrr.out_dir + rrr.srt_csv]                                         \
           +[rrr.out_dir + rrr.crd_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
      #--------------------------------------------------------------------------
      #Parameters
@@ -161,7 +184,8 @@ def drv_hyd(rrr: RRR):
           +['0.00']                                                            \
           +[rrr.out_dir + rrr.klo_csv]                                         \
           +[rrr.out_dir + rrr.xlo_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
      comnd=['../src/rrr_riv_tot_scl_prm.py']                                   \
           +[rrr.out_dir + rrr.kfc_csv]                                         \
@@ -170,7 +194,8 @@ def drv_hyd(rrr: RRR):
           +['3.00']                                                            \
           +[rrr.out_dir + rrr.knr_csv]                                         \
           +[rrr.out_dir + rrr.xnr_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
      comnd=['../src/rrr_riv_tot_scl_prm.py']                                   \
           +[rrr.out_dir + rrr.kfc_csv]                                         \
@@ -179,7 +204,8 @@ def drv_hyd(rrr: RRR):
           +['5.00']                                                            \
           +[rrr.out_dir + rrr.khi_csv]                                         \
           +[rrr.out_dir + rrr.xhi_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
      #--------------------------------------------------------------------------
      #Sorted subset
@@ -190,7 +216,8 @@ def drv_hyd(rrr: RRR):
           +[rrr.out_dir + rrr.con_csv]                                         \
           +[rrr.out_dir + rrr.srt_csv]                                         \
           +[rrr.out_dir + rrr.bas_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
      #--------------------------------------------------------------------------
      #Contributing catchment information
@@ -199,7 +226,8 @@ def drv_hyd(rrr: RRR):
      comnd=['../src/rrr_cat_tot_gen_one_meritbasins.py']                       \
           +[rrr.hyd_dir + rrr.cat_shp]                                         \
           +[rrr.out_dir + rrr.cat_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'hyd'))
 
 
 #*******************************************************************************
@@ -219,7 +247,8 @@ def drv_lsm(rrr: RRR):
           +all_nc4                                                             \
           +['1']                                                               \
           +[rrr.out_dir + rrr.lsm_tmp]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'lsm'))
 
      #--------------------------------------------------------------------------
      #Make file CF compliant
@@ -231,7 +260,8 @@ def drv_lsm(rrr: RRR):
           +['10800']                                                           \
           +['1.0']                                                             \
           +[rrr.out_dir + rrr.lsm_ncf]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'lsm'))
 
      #--------------------------------------------------------------------------
      #Delete temporary file
@@ -239,7 +269,8 @@ def drv_lsm(rrr: RRR):
      print('- Delete temporary file')
      comnd=['rm']                                                              \
           +[rrr.out_dir + rrr.lsm_tmp]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'lsm'))
 
 
 #*******************************************************************************
@@ -258,7 +289,8 @@ def drv_cpl(rrr: RRR):
           +[rrr.out_dir + rrr.cat_csv]                                         \
           +[rrr.out_dir + rrr.lsm_ncf]                                         \
           +[rrr.out_dir + rrr.cpl_csv]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'cpl'))
 
 
 #*******************************************************************************
@@ -278,7 +310,8 @@ def drv_vol(rrr: RRR):
           +[rrr.out_dir + rrr.lsm_ncf]                                         \
           +[rrr.out_dir + rrr.cpl_csv]                                         \
           +[rrr.out_dir + rrr.m3r_ncf]
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'vol'))
 
      #--------------------------------------------------------------------------
      #Update netCDF attributes
@@ -292,7 +325,8 @@ def drv_vol(rrr: RRR):
           +['']                                                                \
           +['6378137']                                                         \
           +['298.257222101']
-     subprocess.run(comnd, capture_output=True, check=True)
+     subprocess.run(comnd, capture_output=True, check=True,
+                    env=drv_env(rrr, 'vol'))
 
 
 #*******************************************************************************
@@ -304,12 +338,20 @@ def drv_all(rrr: RRR):
      #--------------------------------------------------------------------------
      #Running all drivers
      #--------------------------------------------------------------------------
+     shutil.rmtree(rrr.prf_dir, ignore_errors=True)
      drv_dwn(rrr)
      drv_hyd(rrr)
      drv_lsm(rrr)
      drv_cpl(rrr)
      drv_vol(rrr)
 
+     #--------------------------------------------------------------------------
+     #Gathering all traces into one profile
+     #--------------------------------------------------------------------------
+     print('Gathering all traces into one profile')
+     with open(rrr.out_dir + rrr.prf_jsn, 'w') as jsnfile:
+          json.dump(rrr_lib_prf.prf_agg(rrr.prf_dir), jsnfile, indent=1)
+
 
 ##*******************************************************************************
 ##For testing purposes
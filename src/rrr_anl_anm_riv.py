@@ -12,6 +12,11 @@
 #created between these time steps.  If an additional georeferenced satellite 
 #image is given (with the same coordinate system as the shapefile and provided
 #as an 8bit or 24Bit RGB image), it will be added as a background of the video. 
+#Model values are read in blocks of consecutive time steps from which the line
+#widths of all frames in the block are computed at once. When more than one
+#process is requested (IS_cpu below), frames are rendered to PNG buffers by a
+#pool of worker processes, each reusing its own copy of the line collection,
+#and the buffers are piped to ffmpeg in the order of the animation.
 #Authors:
 #Klemen Cotar, Ashish Mahabal, Cedric H. David, Md Safat Sikder, 2016-2023
 
@@ -20,7 +25,11 @@
 #Import Python modules
 #*******************************************************************************
 import sys
+import io
 import datetime
+import subprocess
+import collections
+import multiprocessing
 import netCDF4 
 import shapefile
 import matplotlib.collections
@@ -56,6 +65,8 @@ ZS_Wlow = 0.05                                  # polyline width at low Q
 vid_fps = 30    # frame rate of created video
 vid_dpi = 300   # resolution of video in DPI unit
 IS_tim_spl = 1  # plot every so many time steps
+IS_blk = 100    # number of frames whose widths are computed from one read
+IS_cpu = 1      # number of rendering processes (1 uses matplotlib's writer)
 
 
 #*******************************************************************************
@@ -248,7 +259,7 @@ IM_hsh={}
 for JS_riv_tot in range(IS_riv_tot):
      IM_hsh[IV_riv_tot_id[JS_riv_tot]]=JS_riv_tot
 
-IV_riv_bas_index=[0]*IS_riv_bas
+IV_riv_bas_index=numpy.zeros(IS_riv_bas,dtype=numpy.int64)
 for JS_riv_bas in range(IS_riv_bas):
      IV_riv_bas_index[JS_riv_bas]=IM_hsh[IV_riv_bas_id[JS_riv_bas]]
 
@@ -346,37 +357,48 @@ if 'rrr_img_file' in locals():
         print('Unable to read given backround image '+rrr_img_file)
 
 
+#*******************************************************************************
+#Block reading of model values
+#*******************************************************************************
+IV_tim_all=list(range(IS_tim_str, IS_tim_end, IS_tim_spl))
+#All time steps that are shown in the video, one per frame
+
+def anm_blk(IV_tim):
+     #Returns the model values of the river reaches in the shapefile for a list
+     #of consecutive frames, using one netCDF read for all frames
+     ZM_Qout=f.variables[YV_var][IV_tim[0]:IV_tim[-1]+1:IS_tim_spl,:]
+     return ZM_Qout[:,IV_riv_bas_index]
+
+
 #*******************************************************************************
 #Finding high and low flows for best display
 #*******************************************************************************
 if BS_wid_auto:
      print('Finding high and low flows for best display')
 
-     IV_one=numpy.ones(IS_riv_bas)
      IV_npt=numpy.zeros(IS_riv_bas)
      ZV_Qavg=numpy.zeros(IS_riv_bas)
      ZV_Qmax=numpy.zeros(IS_riv_bas)
      ZV_Qmin=numpy.ones(IS_riv_bas)*1000000000
-     for JS_tim in range(IS_tim_str, IS_tim_end, IS_tim_spl):
-          ZV_Qout=f.variables[YV_var][JS_tim][IV_riv_bas_index]
-          #read netCDF values
-          if numpy.ma.is_masked(ZV_Qout):
-               BV_yes=~ZV_Qout.mask
-          else:
-               BV_yes=[True]*IS_riv_bas
+     for JS_blk in range(0, len(IV_tim_all), IS_blk):
+          ZM_Qout=anm_blk(IV_tim_all[JS_blk:JS_blk+IS_blk])
+          #read netCDF values for a block of frames
+          BM_yes=~numpy.ma.getmaskarray(ZM_Qout)
           #locations where the netCDF values are not masked
-          IV_npt=numpy.where(BV_yes,IV_npt+IV_one,IV_npt)
+          IV_npt=IV_npt+BM_yes.sum(axis=0)
           #updating the number of actual values (i.e. not NaN) for each reach
-          ZV_Qavg=numpy.where(BV_yes,ZV_Qavg+ZV_Qout,ZV_Qavg)
+          ZV_Qavg=ZV_Qavg+numpy.ma.filled(ZM_Qout,0).sum(axis=0,dtype=float)
           #updating the average
-          ZV_Qmax=numpy.where((BV_yes)&(ZV_Qout>ZV_Qmax),ZV_Qout,ZV_Qmax)
+          ZV_Qmax=numpy.maximum(ZV_Qmax,                                       \
+                                numpy.ma.filled(ZM_Qout,0).max(axis=0))
           #updating the maximum
-          ZV_Qmin=numpy.where((BV_yes)&(ZV_Qout<ZV_Qmin),ZV_Qout,ZV_Qmin)
+          ZV_Qmin=numpy.minimum(ZV_Qmin,                                       \
+                                numpy.ma.filled(ZM_Qout,1000000000).min(axis=0))
           #updating the minimum
      IV_npt=numpy.where(IV_npt==0,-9999,IV_npt)
      #Replacing number of values by -9999 only where there was 0 values to avoid
      #runtime warning during division below
-     ZV_Qavg=numpy.where(IV_npt>0,ZV_Qavg/IV_npt,numpy.NaN)
+     ZV_Qavg=numpy.where(IV_npt>0,ZV_Qavg/IV_npt,numpy.nan)
      #Dividing sum of values by number of values. Otherwise: NaN
      ZS_Qhig=numpy.nanmax(ZV_Qmax)
      ZS_Qlow=numpy.nanmean(ZV_Qavg)
@@ -418,65 +440,129 @@ print('- The estimate of low  flow to be plotted is: '+str(ZS_Qlow)+ ' m3/s')
 
 
 #*******************************************************************************
-#Plotting and video generation
+#Line widths and frame rendering
 #*******************************************************************************
-print('Plotting and video generation')
+def anm_wid(IV_tim):
+     #Returns the line widths of all river reaches for a list of consecutive
+     #frames, each row of the matrix corresponding to one frame
+     ZM_Qout=anm_blk(IV_tim)
+     BM_yes=~numpy.ma.getmaskarray(ZM_Qout)
+     #locations where the netCDF values are not masked
 
-#-------------------------------------------------------------------------------
-#Initialization of video driver
-#-------------------------------------------------------------------------------
-try:
-     FFMpegWriter = matplotlib.animation.writers['ffmpeg']
-except:
-     print('ERROR - Unable to initialize video writer')
-     raise SystemExit(22)
+     ZM_Qout=numpy.ma.filled(ZM_Qout,0)
+     #Replaces potential NoData values in the netCDF file by 0 for plotting
 
-writer = FFMpegWriter(fps=vid_fps)
-#Set additional setting of the driver
+     ZM_wid=ZV_Wlow+(ZV_Whig-ZV_Wlow)*(ZM_Qout-ZV_Qlow)/(ZV_Qhig-ZV_Qlow)
+     #Plot such that Qlow shows as Wlow and Qhig shows as Whig
 
-#-------------------------------------------------------------------------------
-#Video creation
-#-------------------------------------------------------------------------------
-print("- Video creation start: "                                               \
-      +datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+     ZM_wid=numpy.where(ZM_Qout>=ZV_Qlow,ZM_wid,ZV_Wlow)
+     #Sets width to Wlow if Qout<Qlow (avoids negative values in previous eq)
 
-with writer.saving(plt_fig, rrr_vid_file, vid_dpi):
-    ZV_one=numpy.ones(IS_riv_bas)
-    for JS_tim in range(IS_tim_str, IS_tim_end, IS_tim_spl):
+     ZM_wid=numpy.where(BM_yes,ZM_wid,0)
+     #Sets width to zero if NoData
 
-        date_str = (date_ini + date_stp*JS_tim).strftime("%Y-%m-%d %H:%M")
-        #date string to be shown in video title
-        plt.title(YV_title + ' ' + '\n' +                                      \
-                  date_str + ' UTC')
-        #title
+     return ZM_wid.astype(numpy.float32)
 
-        ZV_Qout=f.variables[YV_var][JS_tim][IV_riv_bas_index]
-        #This does not seem to be sped up by first reordering the polylines in  
-        #the shapefile so that they are sorted similarly to the netCDF file
-        if numpy.ma.is_masked(ZV_Qout):
-             BV_yes=~ZV_Qout.mask
-        else:
-             BV_yes=[True]*IS_riv_bas
-        #locations where the netCDF values are not masked
+def anm_ttl(JS_tim):
+     #Sets the title of the plot for a given time step
+     date_str = (date_ini + date_stp*JS_tim).strftime("%Y-%m-%d %H:%M")
+     #date string to be shown in video title
+     plt_axs.set_title(YV_title + ' ' + '\n' +                                 \
+                       date_str + ' UTC')
 
-        ZV_Qout=numpy.where(BV_yes,ZV_Qout,0*ZV_one)
-        #Replaces potential NoData values in the netCDF file by 0 for plotting
+def anm_png(IV_tim, ZM_wid):
+     #Renders a list of frames into PNG buffers. This is executed in worker
+     #processes that were forked after the canvas was prepared, hence each
+     #worker updates its own copy of the figure and line collection
+     YV_png=[]
+     for JS_frm in range(len(IV_tim)):
+          anm_ttl(IV_tim[JS_frm])
+          plt_clc.set_linewidths(ZM_wid[JS_frm])
+          #Scale thickness of each river reach by the magnitude of the variable
+          buf=io.BytesIO()
+          plt_fig.savefig(buf, format='png', dpi=vid_dpi)
+          YV_png.append(buf.getvalue())
+     return YV_png
 
-        polyline_wid=ZV_Wlow+(ZV_Whig-ZV_Wlow)*(ZV_Qout-ZV_Qlow)               \
-                                              /(ZV_Qhig-ZV_Qlow)
-        #Plot such that Qlow shows as Wlow and Qhig shows as Whig
 
-        polyline_wid=numpy.where(ZV_Qout>=ZV_Qlow,polyline_wid,ZS_Wlow*ZV_one)
-        #Sets width to Wlow if Qout<Qlow (avoids negative values in previous eq)
+#*******************************************************************************
+#Plotting and video generation
+#*******************************************************************************
+print('Plotting and video generation')
 
-        polyline_wid=numpy.where(BV_yes,polyline_wid,0*ZV_one)
-        #Sets width to zero if NoData
+print("- Video creation start: "                                               \
+      +datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-        plt_clc.set_linewidths(polyline_wid)
-        #Scale thickness of each river reach by the magnitude of the variable
+#-------------------------------------------------------------------------------
+#Video creation with one process
+#-------------------------------------------------------------------------------
+if IS_cpu == 1:
+
+     try:
+          FFMpegWriter = matplotlib.animation.writers['ffmpeg']
+     except:
+          print('ERROR - Unable to initialize video writer')
+          raise SystemExit(22)
+
+     writer = FFMpegWriter(fps=vid_fps)
+     #Set additional setting of the driver
+
+     with writer.saving(plt_fig, rrr_vid_file, vid_dpi):
+          for JS_blk in range(0, len(IV_tim_all), IS_blk):
+               IV_tim=IV_tim_all[JS_blk:JS_blk+IS_blk]
+               ZM_wid=anm_wid(IV_tim)
+               for JS_frm in range(len(IV_tim)):
+                    anm_ttl(IV_tim[JS_frm])
+                    plt_clc.set_linewidths(ZM_wid[JS_frm])
+                    #Scale thickness of each river reach by the variable
+                    writer.grab_frame()
+                    #This is the time consuming step, all above steps are fast
 
-        writer.grab_frame()
-        #This is the time consuming step, all above steps are fast 
+#-------------------------------------------------------------------------------
+#Video creation with a pool of processes
+#-------------------------------------------------------------------------------
+if IS_cpu > 1:
+
+     YV_ffm=[matplotlib.rcParams['animation.ffmpeg_path'],                     \
+             '-y', '-loglevel', 'error',                                       \
+             '-f', 'image2pipe', '-framerate', str(vid_fps),                   \
+             '-vcodec', 'png', '-i', '-',                                      \
+             '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',                           \
+             '-vcodec', 'h264', '-pix_fmt', 'yuv420p',                         \
+             rrr_vid_file]
+     #The same codec and pixel format as matplotlib's FFMpegWriter, the padding
+     #ensures even frame dimensions as required by yuv420p
+     try:
+          ffm_prc=subprocess.Popen(YV_ffm, stdin=subprocess.PIPE)
+     except:
+          print('ERROR - Unable to initialize video writer')
+          raise SystemExit(22)
+
+     IS_tsk=max(1, min(IS_blk, -(-len(IV_tim_all)//IS_cpu)))
+     #Number of frames rendered in each task, small enough to keep all workers
+     #busy on short animations
+
+     mpc_pol=multiprocessing.get_context('fork').Pool(IS_cpu)
+     #Forked workers inherit the canvas prepared above
+     mpc_que=collections.deque()
+     for JS_tsk in range(0, len(IV_tim_all), IS_tsk):
+          IV_tim=IV_tim_all[JS_tsk:JS_tsk+IS_tsk]
+          mpc_que.append(mpc_pol.apply_async(anm_png, (IV_tim,anm_wid(IV_tim))))
+          if len(mpc_que) >= 2*IS_cpu:
+               for png in mpc_que.popleft().get():
+                    ffm_prc.stdin.write(png)
+          #At most two tasks per process are pending, which bounds memory use
+          #while frames are piped to ffmpeg in order
+     while mpc_que:
+          for png in mpc_que.popleft().get():
+               ffm_prc.stdin.write(png)
+     mpc_pol.close()
+     mpc_pol.join()
+
+     ffm_prc.stdin.close()
+     if ffm_prc.wait() != 0:
+          print('ERROR - Unable to create video '+rrr_vid_file)
+          raise SystemExit(22)
 
 print("- Video creation end  : "                                               \
       +datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
@@ -19,9 +19,9 @@
 #*******************************************************************************
 import sys
 import os
-import fiona
 import csv
 import datetime
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -83,33 +83,30 @@ if not os.path.isdir(rrr_hyd_dir):
 #*******************************************************************************
 print('Read rrr_obs_shp')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
-IS_obs_tot=len(rrr_obs_lay)
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp,None,False)
+IS_obs_tot=IM_obs_met['count']
 print('- The number of gauge features is: '+str(IS_obs_tot))
 
-if 'COMID_1' in rrr_obs_lay[0]['properties']:
+if 'COMID_1' in IM_obs_fld:
      YV_obs_id='COMID_1'
-elif 'FLComID' in rrr_obs_lay[0]['properties']:
+elif 'FLComID' in IM_obs_fld:
      YV_obs_id='FLComID'
-elif 'ARCID' in rrr_obs_lay[0]['properties']:
+elif 'ARCID' in IM_obs_fld:
      YV_obs_id='ARCID'
 else:
      print('ERROR - COMID_1, FLComID, or ARCID do not exist in '+rrr_obs_shp)
      raise SystemExit(22) 
 
-if 'SOURCE_FEA' in rrr_obs_lay[0]['properties']:
+if 'SOURCE_FEA' in IM_obs_fld:
      YV_obs_cd='SOURCE_FEA'
-elif 'Code' in rrr_obs_lay[0]['properties']:
+elif 'Code' in IM_obs_fld:
      YV_obs_cd='Code'
 else:
      print('ERROR - Neither SOURCE_FEA nor Code exist in '+rrr_obs_shp)
      raise SystemExit(22) 
 
-IV_obs_tot_id=[]
-YV_obs_tot_cd=[]
-for JS_obs_tot in range(IS_obs_tot):
-     IV_obs_tot_id.append(int(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_id]))
-     YV_obs_tot_cd.append(str(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_cd]))
+IV_obs_tot_id=[int(IS_obs_id) for IS_obs_id in IM_obs_fld[YV_obs_id]]
+YV_obs_tot_cd=[str(YS_obs_cd) for YS_obs_cd in IM_obs_fld[YV_obs_cd]]
 
 z = sorted(zip(IV_obs_tot_id,YV_obs_tot_cd))
 IV_obs_tot_id_srt,YV_obs_tot_cd_srt=zip(*z)
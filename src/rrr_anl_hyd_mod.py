@@ -22,11 +22,12 @@
 import sys
 import os
 import csv
-import fiona
 import netCDF4
 import numpy
 import datetime
 import calendar
+import rrr_lib_vec
+import rrr_lib_mmp
 
 
 #*******************************************************************************
@@ -106,39 +107,36 @@ except IOError as e:
 #*******************************************************************************
 print('Read rrr_obs_shp')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
-IS_obs_tot=len(rrr_obs_lay)
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp,None,False)
+IS_obs_tot=IM_obs_met['count']
 print('- Number of river reaches in rrr_obs_shp: '+str(IS_obs_tot))
 
-if 'COMID_1' in rrr_obs_lay[0]['properties']:
+if 'COMID_1' in IM_obs_fld:
      YV_obs_id='COMID_1'
-elif 'FLComID' in rrr_obs_lay[0]['properties']:
+elif 'FLComID' in IM_obs_fld:
      YV_obs_id='FLComID'
-elif 'ARCID' in rrr_obs_lay[0]['properties']:
+elif 'ARCID' in IM_obs_fld:
      YV_obs_id='ARCID'
-elif 'COMID' in rrr_obs_lay[0]['properties']:
+elif 'COMID' in IM_obs_fld:
      YV_obs_id='COMID'
-elif 'rivid' in rrr_obs_lay[0]['properties']:
+elif 'rivid' in IM_obs_fld:
      YV_obs_id='rivid'
 else:
      print('ERROR - No known name for river ID exist in '+rrr_obs_shp)
      raise SystemExit(22)
 
-if 'SOURCE_FEA' in rrr_obs_lay[0]['properties']:
+if 'SOURCE_FEA' in IM_obs_fld:
      YV_obs_cd='SOURCE_FEA'
-elif 'Code' in rrr_obs_lay[0]['properties']:
+elif 'Code' in IM_obs_fld:
      YV_obs_cd='Code'
-elif 'Sttn_Nm' in rrr_obs_lay[0]['properties']:
+elif 'Sttn_Nm' in IM_obs_fld:
      YV_obs_cd='Sttn_Nm'
 else:
      print('ERROR - No known name for gauge station code exist in '+rrr_obs_shp)
      raise SystemExit(22)
 
-IV_obs_tot_id=[]
-YV_obs_tot_cd=[]
-for JS_obs_tot in range(IS_obs_tot):
-     IV_obs_tot_id.append(int(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_id]))
-     YV_obs_tot_cd.append(str(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_cd]))
+IV_obs_tot_id=[int(IS_obs_id) for IS_obs_id in IM_obs_fld[YV_obs_id]]
+YV_obs_tot_cd=[str(YS_obs_cd) for YS_obs_cd in IM_obs_fld[YV_obs_cd]]
 
 
 z = sorted(zip(IV_obs_tot_id,YV_obs_tot_cd))
@@ -274,13 +272,17 @@ IS_out_avg=int(IS_R/IS_avg)
 ZM_out_avg=numpy.array([]).reshape(0,IS_out_avg)
 #Initialize an empty array of size IS_out_avg to store all hydrographs
 
+ZM_out,BS_mmp=rrr_lib_mmp.mmp_var(rrr_out_ncf,f,YS_out_name,True)
+if BS_mmp: print('  . Reading '+YS_out_name+' from the cache of '+rrr_out_ncf)
+#Time series are contiguous in the reach-major order of the cache
+
 for JS_obs_tot in range(IS_obs_tot):
      print('  . processing river ID: '+str(IV_obs_tot_id_srt[JS_obs_tot]))
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Get values
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-     ZV_out=f.variables[YS_out_name][:,IM_hsh[IV_obs_tot_id_srt[JS_obs_tot]]]
+     ZV_out=ZM_out[:,IM_hsh[IV_obs_tot_id_srt[JS_obs_tot]]]
      #This follows the following format for RAPID outputs: Qout(time,rivid)
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
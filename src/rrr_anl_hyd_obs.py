@@ -19,10 +19,10 @@
 #*******************************************************************************
 import sys
 import os
-import fiona
 import numpy
 import csv
 import datetime
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -107,37 +107,34 @@ if (ZS_pct_uq < 0 or ZS_pct_uq >100):
 #*******************************************************************************
 print('Read rrr_obs_shp')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
-IS_obs_bas=len(rrr_obs_lay)
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp,None,False)
+IS_obs_bas=IM_obs_met['count']
 print('- The number of gauge features is: '+str(IS_obs_bas))
 
-if 'COMID_1' in rrr_obs_lay[0]['properties']:
+if 'COMID_1' in IM_obs_fld:
      YV_obs_id='COMID_1'
-elif 'FLComID' in rrr_obs_lay[0]['properties']:
+elif 'FLComID' in IM_obs_fld:
      YV_obs_id='FLComID'
-elif 'ARCID' in rrr_obs_lay[0]['properties']:
+elif 'ARCID' in IM_obs_fld:
      YV_obs_id='ARCID'
-elif 'rivid' in rrr_obs_lay[0]['properties']:
+elif 'rivid' in IM_obs_fld:
      YV_obs_id='rivid'
 else:
      print('ERROR - No known name for river ID exist in '+rrr_obs_shp)
      raise SystemExit(22)
 
-if 'SOURCE_FEA' in rrr_obs_lay[0]['properties']:
+if 'SOURCE_FEA' in IM_obs_fld:
      YV_obs_cd='SOURCE_FEA'
-elif 'Code' in rrr_obs_lay[0]['properties']:
+elif 'Code' in IM_obs_fld:
      YV_obs_cd='Code'
-elif 'Sttn_Nm' in rrr_obs_lay[0]['properties']:
+elif 'Sttn_Nm' in IM_obs_fld:
      YV_obs_cd='Sttn_Nm'
 else:
      print('ERROR - No known name for gauge station code exist in '+rrr_obs_shp)
      raise SystemExit(22)
 
-IV_obs_bas_id=[]
-YV_obs_bas_cd=[]
-for JS_obs_bas in range(IS_obs_bas):
-     IV_obs_bas_id.append(int(rrr_obs_lay[JS_obs_bas]['properties'][YV_obs_id]))
-     YV_obs_bas_cd.append(str(rrr_obs_lay[JS_obs_bas]['properties'][YV_obs_cd]))
+IV_obs_bas_id=[int(IS_obs_id) for IS_obs_id in IM_obs_fld[YV_obs_id]]
+YV_obs_bas_cd=[str(YS_obs_cd) for YS_obs_cd in IM_obs_fld[YV_obs_cd]]
 
 z = sorted(zip(IV_obs_bas_id,YV_obs_bas_cd))
 IV_obs_bas_id_srt,YV_obs_bas_cd_srt=zip(*z)
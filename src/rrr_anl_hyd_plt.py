@@ -18,13 +18,13 @@
 #*******************************************************************************
 import sys
 import os
-import fiona
 import csv
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import datetime
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -105,35 +105,32 @@ if not os.path.isdir(rrr_plt_dir):
 #*******************************************************************************
 print('Read rrr_obs_shp')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
-IS_obs_tot=len(rrr_obs_lay)
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp,None,False)
+IS_obs_tot=IM_obs_met['count']
 print('- The number of gauge features is: '+str(IS_obs_tot))
 
-if 'COMID_1' in rrr_obs_lay[0]['properties']:
+if 'COMID_1' in IM_obs_fld:
      YV_obs_id='COMID_1'
-elif 'FLComID' in rrr_obs_lay[0]['properties']:
+elif 'FLComID' in IM_obs_fld:
      YV_obs_id='FLComID'
-elif 'ARCID' in rrr_obs_lay[0]['properties']:
+elif 'ARCID' in IM_obs_fld:
      YV_obs_id='ARCID'
-elif 'COMID' in rrr_obs_lay[0]['properties']:
+elif 'COMID' in IM_obs_fld:
      YV_obs_id='COMID'
 else:
      print('ERROR - COMID_1, FLComID, or ARCID do not exist in '+rrr_obs_shp)
      raise SystemExit(22) 
 
-if 'STATION_NM' in rrr_obs_lay[0]['properties']:
+if 'STATION_NM' in IM_obs_fld:
      YV_obs_nm='STATION_NM'
-elif 'Name' in rrr_obs_lay[0]['properties']:
+elif 'Name' in IM_obs_fld:
      YV_obs_nm='Name'
 else:
      print('ERROR - STATION_NM or Name do not exist in '+rrr_obs_shp)
      raise SystemExit(22) 
 
-IV_obs_tot_id=[]
-YV_obs_tot_nm=[]
-for JS_obs_tot in range(IS_obs_tot):
-     IV_obs_tot_id.append(int(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_id]))
-     YV_obs_tot_nm.append(str(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_nm]))
+IV_obs_tot_id=[int(IS_obs_id) for IS_obs_id in IM_obs_fld[YV_obs_id]]
+YV_obs_tot_nm=[str(YS_obs_nm) for YS_obs_nm in IM_obs_fld[YV_obs_nm]]
 
 
 #*******************************************************************************
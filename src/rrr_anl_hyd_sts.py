@@ -9,6 +9,7 @@
 #program computes simple statistics comparing observed and modeled hydrographs.
 #In case timeseries of different lengths are given, the smallest length is used
 #unless an optional argument containing the desired length is given.
+#All stations are processed at once using the statistics in rrr_lib_sts.py.
 #Author:
 #Cedric H. David, 2011-2023
 
@@ -21,7 +22,8 @@ import os.path
 import csv
 import fiona
 from datetime import datetime
-import math
+import numpy
+import rrr_lib_sts
 
 
 #*******************************************************************************
@@ -35,6 +37,14 @@ import math
 #(6)- rrr_end_dat
 
 
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+BS_sts_all=False
+#Whether the Kling-Gupta efficiency (KGE) and the Nash-Sutcliffe efficiency of
+#logarithms (lNash) are appended to the original seven statistics in rrr_sts_csv
+
+
 #*******************************************************************************
 #Get command line arguments
 #*******************************************************************************
@@ -153,67 +163,38 @@ YV_obs_tot_cd_srt=list(YV_obs_tot_cd_srt)
 
 
 #*******************************************************************************
-#Check length of all hydrographs
+#Read hydrographs
 #*******************************************************************************
-print('- Checking the length of all hydrographs')
-
-with open(rrr_obs_csv) as csvfile:
-     csvreader=csv.reader(csvfile)
-     next(iter(csvreader), None)  # skip header
-     IS_count=sum(1 for row in csvreader)
-     #print(IS_count)
-     IS_step=IS_count
-with open(rrr_mod_csv) as csvfile:
-     csvreader=csv.reader(csvfile)
-     next(iter(csvreader), None)  # skip header
-     IS_count=sum(1 for row in csvreader)
-     #print(IS_count)
-     if (IS_count<IS_step):
-          IS_step=IS_count
-
+print('- Reading hydrographs')
+
+def hyd_csv(rrr_hyd_csv):
+     #Reads a hydrograph csv file with dates in the first column and one river
+     #ID per subsequent column, returns the list of river IDs, the total number
+     #of time steps, and a 2-D array (time x river) for the dates provided.
+     with open(rrr_hyd_csv) as csvfile:
+          csvreader=csv.reader(csvfile)
+          YV_header=next(iter(csvreader))
+          IV_headid=[int(h) for h in YV_header[1:]]
+          IS_count=0
+          YM_val=[]
+          for row in csvreader:
+               IS_count=IS_count+1
+               if rrr_str_dat is not None:
+                    dat=datetime.strptime(row[0], "%Y-%m-%d")
+                    if dat < rrr_str_dat or dat > rrr_end_dat: continue
+               YM_val.append(row[1:])
+     ZM_val=numpy.array(YM_val,dtype=numpy.float64)                           \
+                  .reshape(len(YM_val),len(IV_headid))
+     return IV_headid,IS_count,ZM_val
+
+IV_obs_hid,IS_obs_cnt,ZM_obs_all=hyd_csv(rrr_obs_csv)
+IV_mod_hid,IS_mod_cnt,ZM_mod_all=hyd_csv(rrr_mod_csv)
+
+IS_step=min(IS_obs_cnt,IS_mod_cnt)
 print('  . Shortest timeseries has: '+str(IS_step)+' time steps')
 
-
-#*******************************************************************************
-#Compute flow statistics
-#*******************************************************************************
-print('- Computing flow statistics')
-
-with open(rrr_sts_csv, 'w') as csvfile:
-     #'w' here ensures creation of a new file instead of appending.
-     csvwriter = csv.writer(csvfile, dialect='excel')
-     csvwriter.writerow(['rivid','Qobsbar','Qmodbar','RMSE','Bias',            \
-                         'STDE','Nash','Correl'])
-
-#-------------------------------------------------------------------------------
-#Read hydrographs
-#-------------------------------------------------------------------------------
-with open(rrr_obs_csv) as csvfile:
-     csvreader=csv.reader(csvfile)
-     YV_header = next(iter(csvreader))
-     IV_headid = [int(h) for h in YV_header[1:]]
-     ZH_obs = {rid: [] for rid in IV_headid}
-     JS_Mo = 0
-     for row in csvreader:
-          dat = datetime.strptime(row[0], "%Y-%m-%d")
-          if rrr_str_dat is None or (dat >= rrr_str_dat and dat <= rrr_end_dat):
-               for i, rid in enumerate(IV_headid):
-                    ZH_obs[rid].append(float(row[i+1]))
-               JS_Mo += 1
-
-with open(rrr_mod_csv) as csvfile:
-     csvreader=csv.reader(csvfile)
-     YV_header = next(iter(csvreader))
-     IV_headid = [int(h) for h in YV_header[1:]]
-     ZH_mod = {rid: [] for rid in IV_headid}
-     JS_Mm = 0
-     for row in csvreader:
-          dat = datetime.strptime(row[0], "%Y-%m-%d")
-          if rrr_str_dat is None or (dat >= rrr_str_dat and dat <= rrr_end_dat):
-               for i, rid in enumerate(IV_headid):
-                    ZH_mod[rid].append(float(row[i+1]))
-               JS_Mm += 1
-
+JS_Mo=ZM_obs_all.shape[0]
+JS_Mm=ZM_mod_all.shape[0]
 if JS_Mo==JS_Mm:
      print('  . Common number of time steps for dates provided: '+str(JS_Mo))
 else:
@@ -221,97 +202,51 @@ else:
           +str(JS_Mo)+' <> '+str(JS_Mm))
      raise SystemExit(22)
 
-for JS_obs_tot in range(IS_obs_tot):
-#-------------------------------------------------------------------------------
-#Initialize all stats to zero
-#-------------------------------------------------------------------------------
-     ZS_obsbar=0
-     ZS_modbar=0
-     ZS_modBIA=0
-     ZS_modRMS=0
-     ZS_modSTD=0
-     ZS_modNum=0
-     ZS_den=0
-     ZS_modNash=0
-     ZS_modCor=0
-     ZS_den2=0
-
-#-------------------------------------------------------------------------------
-#Select data and convert to list
-#-------------------------------------------------------------------------------
-     ZV_obs = [value for value in ZH_obs[IV_obs_tot_id_srt[JS_obs_tot]]]
-     ZV_mod = [value for value in ZH_mod[IV_obs_tot_id_srt[JS_obs_tot]]]
-
-     if len(ZV_obs)!=len(ZV_mod):
-          print('ERROR - Different number of steps for dates provided: '       \
-               +str(len(ZV_obs))+' <> '+str(len(ZV_mod)))
-          raise SystemExit(22)
 
-#-------------------------------------------------------------------------------
-#Get rid of pair only if obs is NaN
-#-------------------------------------------------------------------------------
-     ZV_mod = [ZV_mod[i] for i in range(len(ZV_mod))                           \
-               if not math.isnan(ZV_obs[i])]
-     ZV_obs = [ZV_obs[i] for i in range(len(ZV_obs))                           \
-               if not math.isnan(ZV_obs[i])]
-     #Doing mod before obs because obs is the common check before modification
-
-#-------------------------------------------------------------------------------
-#Determine common number of time steps
-#-------------------------------------------------------------------------------
-     if len(ZV_obs)==len(ZV_mod):
-          IS_M=len(ZV_obs)
-     else:
-          print('ERROR - Different number of steps for dates provided: '       \
-               +str(len(ZV_obs))+' <> '+str(len(ZV_mod)))
+#*******************************************************************************
+#Align hydrographs with stations
+#*******************************************************************************
+print('- Aligning hydrographs with stations')
+
+IM_hsh_obs={IS_hid:JS_hid for JS_hid,IS_hid in enumerate(IV_obs_hid)}
+IM_hsh_mod={IS_hid:JS_hid for JS_hid,IS_hid in enumerate(IV_mod_hid)}
+
+for IS_obs_id in IV_obs_tot_id_srt:
+     if IS_obs_id not in IM_hsh_obs or IS_obs_id not in IM_hsh_mod:
+          print('ERROR - River ID '+str(IS_obs_id)+' missing from '            \
+                +rrr_obs_csv+' or '+rrr_mod_csv)
           raise SystemExit(22)
 
-#-------------------------------------------------------------------------------
-#Calculate stats
-#-------------------------------------------------------------------------------
-     ZS_obsbar=sum(ZV_obs)/IS_M
-     ZS_modbar=sum(ZV_mod)/IS_M
-     ZS_modBIA=abs(ZS_obsbar-ZS_modbar)
-
-     for JS_M in range(IS_M):
-          ZS_modRMS=ZS_modRMS                                                  \
-                   +(ZV_mod[JS_M]-ZV_obs[JS_M])*(ZV_mod[JS_M]-ZV_obs[JS_M])
-          ZS_modSTD=ZS_modSTD                                                  \
-                   +((ZV_mod[JS_M]-ZS_modbar)-(ZV_obs[JS_M]-ZS_obsbar))**2
-          ZS_modCor=ZS_modCor                                                  \
-                   +(ZV_mod[JS_M]-ZS_modbar)*(ZV_obs[JS_M]-ZS_obsbar)
-          ZS_modNum=ZS_modNum                                                  \
-                   +(ZV_mod[JS_M]-ZV_obs[JS_M])*(ZV_mod[JS_M]-ZV_obs[JS_M])
-          ZS_den=ZS_den+(ZV_obs[JS_M]-ZS_obsbar)*(ZV_obs[JS_M]-ZS_obsbar)
-          ZS_den2=ZS_den2+(ZV_mod[JS_M]-ZS_modbar)*(ZV_mod[JS_M]-ZS_modbar)
-
-     ZS_modRMS=ZS_modRMS/IS_M
-     ZS_modRMS=(ZS_modRMS)**0.5
-     ZS_modSTD=ZS_modSTD/IS_M
-     ZS_modSTD=(ZS_modSTD)**0.5
-     if ZS_den!=0:
-          ZS_modNash=1-ZS_modNum/ZS_den
-     else:
-          ZS_modNash=float('nan')
-     if ZS_den!=0 and ZS_den2!=0:
-          ZS_modCor=ZS_modCor/(ZS_den*ZS_den2)**0.5
-     else:
-          ZS_modCor=float('nan')
-
-#-------------------------------------------------------------------------------
-#Print outputs
-#-------------------------------------------------------------------------------
-     with open(rrr_sts_csv, 'a') as csvfile:
-          csvwriter = csv.writer(csvfile, dialect='excel')
-          csvwriter.writerow([IV_obs_tot_id_srt[JS_obs_tot],                   \
-                              round(ZS_obsbar,2),                              \
-                              round(ZS_modbar,2),                              \
-                              round(ZS_modRMS,2),                              \
-                              round(ZS_modBIA,2),                              \
-                              round(ZS_modSTD,2),                              \
-                              round(ZS_modNash,2),                             \
-                              round(ZS_modCor,2),                              \
-                             ])
+ZM_obs=ZM_obs_all[:,[IM_hsh_obs[IS_obs_id] for IS_obs_id in IV_obs_tot_id_srt]]
+ZM_mod=ZM_mod_all[:,[IM_hsh_mod[IS_obs_id] for IS_obs_id in IV_obs_tot_id_srt]]
+#Arrays of size (time x station) in the order of increasing river ID
+
+
+#*******************************************************************************
+#Compute flow statistics
+#*******************************************************************************
+print('- Computing flow statistics')
+
+ZM_sts=numpy.array(rrr_lib_sts.sts_hyd(ZM_obs,ZM_mod))
+#Array of size (statistic x station), see rrr_lib_sts.YV_sts for statistics
+
+IS_sts=len(rrr_lib_sts.YV_sts)
+if not BS_sts_all: IS_sts=7
+
+
+#*******************************************************************************
+#Write rrr_sts_csv
+#*******************************************************************************
+print('- Writing rrr_sts_csv')
+
+with open(rrr_sts_csv, 'w') as csvfile:
+     #'w' here ensures creation of a new file instead of appending.
+     csvwriter = csv.writer(csvfile, dialect='excel')
+     csvwriter.writerow(['rivid']+rrr_lib_sts.YV_sts[:IS_sts])
+     for JS_obs_tot in range(IS_obs_tot):
+          csvwriter.writerow([IV_obs_tot_id_srt[JS_obs_tot]]                   \
+                            +[round(float(ZS_sts),2)                           \
+                              for ZS_sts in ZM_sts[:IS_sts,JS_obs_tot]])
 
 
 #*******************************************************************************
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#rrr_anl_hyd_swp.py
+#*******************************************************************************
+
+#Purpose:
+#Given a RAPID connectivity file (.csv), first-guess parameter files for the
+#Muskingum k and x values (.csv), a RAPID water inflow file (.nc4), an observing
+#stations shapefile with unique integer identifiers, a csv file with observed
+#hydrographs, a csv file with candidate scaling factors, and a number of
+#consecutive values to be averaged together, this program performs a sweep over
+#all candidates and produces a csv file with the statistics comparing observed
+#and modeled hydrographs for each candidate and each station.
+#Each line of the candidate file contains the multiplying factors for k and x
+#(as in rrr_riv_tot_scl_prm.py), and optionally a third multiplying factor for
+#the water inflow (as in a uniform bias correction).
+#The connectivity, the water inflow and the observations are read only once and
+#kept in memory. For each candidate, the Muskingum method is solved in matrix
+#form (David et al., 2011) for the entire network, but only discharge at the
+#stations is kept, averaged, and compared with rrr_lib_sts.py. Because routing
+#is linear, candidates sharing the same k and x factors are routed only once.
+#Candidates are spread across a pool of processes.
+#Author:
+#Cedric H. David, 2011-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import csv
+import fiona
+import netCDF4
+import numpy
+import datetime
+import calendar
+import multiprocessing
+from scipy.sparse import csc_matrix, identity, diags
+from scipy.sparse.linalg import splu
+import rrr_lib_sts
+
+
+#*******************************************************************************
+#Domain specific hard-coded variables in case metadata is missing for netCDF
+#*******************************************************************************
+iso_str_dat='1970-01-01T00:00:00'
+#The beginning time of the first time step in the input netCDF file.
+#ISO 8601 format: '1970-01-01T00:00:00', make sure UTC is used
+ZS_TaM=10800
+#The duration (s) of the time steps in the input netCDF files, 3h is most common
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+ZS_TaR=900      # routing time step (s), must divide the inflow time step
+IS_cpu=1        # number of processes used to route the candidates
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - rrr_con_csv
+# 2 - rrr_kfc_csv
+# 3 - rrr_xfc_csv
+# 4 - rrr_m3r_ncf
+# 5 - rrr_obs_shp
+# 6 - rrr_obs_csv
+# 7 - rrr_cdt_csv
+# 8 - IS_avg
+# 9 - rrr_swp_csv
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 10:
+     print('ERROR - 9 and only 9 arguments can be used')
+     raise SystemExit(22)
+
+rrr_con_csv=sys.argv[1]
+rrr_kfc_csv=sys.argv[2]
+rrr_xfc_csv=sys.argv[3]
+rrr_m3r_ncf=sys.argv[4]
+rrr_obs_shp=sys.argv[5]
+rrr_obs_csv=sys.argv[6]
+rrr_cdt_csv=sys.argv[7]
+IS_avg=int(sys.argv[8])
+rrr_swp_csv=sys.argv[9]
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+rrr_con_csv)
+print('- '+rrr_kfc_csv)
+print('- '+rrr_xfc_csv)
+print('- '+rrr_m3r_ncf)
+print('- '+rrr_obs_shp)
+print('- '+rrr_obs_csv)
+print('- '+rrr_cdt_csv)
+print('- '+str(IS_avg))
+print('- '+rrr_swp_csv)
+
+
+#*******************************************************************************
+#Check if files exist
+#*******************************************************************************
+for rrr_chk_file in [rrr_con_csv,rrr_kfc_csv,rrr_xfc_csv,rrr_m3r_ncf,          \
+                     rrr_obs_shp,rrr_obs_csv,rrr_cdt_csv]:
+     try:
+          with open(rrr_chk_file) as file:
+               pass
+     except IOError as e:
+          print('ERROR - Unable to open '+rrr_chk_file)
+          raise SystemExit(22)
+
+
+#*******************************************************************************
+#Reading connectivity and parameter files
+#*******************************************************************************
+print('Reading connectivity and parameter files')
+
+IV_riv_tot_id=[]
+IV_riv_tot_dn=[]
+with open(rrr_con_csv) as csvfile:
+     csvreader=csv.reader(csvfile)
+     for row in csvreader:
+          IV_riv_tot_id.append(int(row[0]))
+          IV_riv_tot_dn.append(int(row[1]))
+
+IS_riv_tot=len(IV_riv_tot_id)
+print('- Number of river reaches in rrr_con_csv: '+str(IS_riv_tot))
+
+ZV_kfac=[]
+with open(rrr_kfc_csv) as csvfile:
+     csvreader=csv.reader(csvfile)
+     for row in csvreader:
+          ZV_kfac.append(float(row[0]))
+
+ZV_xfac=[]
+with open(rrr_xfc_csv) as csvfile:
+     csvreader=csv.reader(csvfile)
+     for row in csvreader:
+          ZV_xfac.append(float(row[0]))
+
+if len(ZV_kfac)!=IS_riv_tot or len(ZV_xfac)!=IS_riv_tot:
+     print('ERROR - The number of river reaches in rrr_con_csv, rrr_kfc_csv ' \
+           'and rrr_xfc_csv differ')
+     raise SystemExit(22)
+
+ZV_kfac=numpy.array(ZV_kfac)
+ZV_xfac=numpy.array(ZV_xfac)
+
+
+#*******************************************************************************
+#Reading candidate file
+#*******************************************************************************
+print('Reading candidate file')
+
+ZM_cdt=[]
+with open(rrr_cdt_csv) as csvfile:
+     csvreader=csv.reader(csvfile)
+     for row in csvreader:
+          if len(row)==2:
+               ZM_cdt.append([float(row[0]),float(row[1]),1.])
+          elif len(row)==3:
+               ZM_cdt.append([float(row[0]),float(row[1]),float(row[2])])
+          else:
+               print('ERROR - Each line of rrr_cdt_csv must have 2 or 3 values')
+               raise SystemExit(22)
+
+ZM_cdt=numpy.array(ZM_cdt).reshape(-1,3)
+IS_cdt=ZM_cdt.shape[0]
+print('- Number of candidates in rrr_cdt_csv: '+str(IS_cdt))
+
+ZM_lkx,IV_cdt_lkx=numpy.unique(ZM_cdt[:,0:2],axis=0,return_inverse=True)
+IV_cdt_lkx=IV_cdt_lkx.reshape(-1)
+IS_lkx=ZM_lkx.shape[0]
+print('- Number of unique k and x factors: '+str(IS_lkx))
+
+
+#*******************************************************************************
+#Read rrr_obs_shp
+#*******************************************************************************
+print('Reading rrr_obs_shp')
+
+IV_obs_tot_id=[]
+with fiona.open(rrr_obs_shp, 'r') as shpfile:
+     if 'COMID_1' in shpfile[0]['properties']:
+          YV_obs_id='COMID_1'
+     elif 'FLComID' in shpfile[0]['properties']:
+          YV_obs_id='FLComID'
+     elif 'ARCID' in shpfile[0]['properties']:
+          YV_obs_id='ARCID'
+     elif 'COMID' in shpfile[0]['properties']:
+          YV_obs_id='COMID'
+     elif 'rivid' in shpfile[0]['properties']:
+          YV_obs_id='rivid'
+     else:
+          print('ERROR - No known name for river ID exist in '+rrr_obs_shp)
+          raise SystemExit(22)
+
+     for reach in shpfile:
+          IV_obs_tot_id.append(int(reach['properties'][YV_obs_id]))
+
+IV_obs_tot_id_srt=sorted(IV_obs_tot_id)
+IS_obs_tot=len(IV_obs_tot_id_srt)
+print('- Number of river reaches in rrr_obs_shp: '+str(IS_obs_tot))
+
+
+#*******************************************************************************
+#Creating hash table and gauge index
+#*******************************************************************************
+print('Creating hash table and gauge index')
+
+IM_hsh_tot={IS_riv_id:JS_riv_tot for JS_riv_tot,IS_riv_id                      \
+                                 in enumerate(IV_riv_tot_id)}
+
+for IS_obs_id in IV_obs_tot_id_srt:
+     if IS_obs_id not in IM_hsh_tot:
+          print('ERROR - River ID '+str(IS_obs_id)+' missing from '+rrr_con_csv)
+          raise SystemExit(22)
+
+IV_obs_ix=numpy.array([IM_hsh_tot[IS_obs_id]                                  \
+                       for IS_obs_id in IV_obs_tot_id_srt],dtype=numpy.int64)
+#IV_riv_tot_id[IV_obs_ix[JS_obs_tot]]=IV_obs_tot_id_srt[JS_obs_tot]
+
+
+#*******************************************************************************
+#Creating network matrix
+#*******************************************************************************
+print('Creating network matrix')
+
+IV_row=[]
+IV_col=[]
+for JS_riv_tot in range(IS_riv_tot):
+     if IV_riv_tot_dn[JS_riv_tot]!=0:
+          if IV_riv_tot_dn[JS_riv_tot] not in IM_hsh_tot:
+               print('ERROR - Downstream river ID '                            \
+                     +str(IV_riv_tot_dn[JS_riv_tot])+' missing from '          \
+                     +rrr_con_csv)
+               raise SystemExit(22)
+          IV_row.append(IM_hsh_tot[IV_riv_tot_dn[JS_riv_tot]])
+          IV_col.append(JS_riv_tot)
+
+ZM_Net=csc_matrix(([1.]*len(IV_row),(IV_row,IV_col)),                         \
+                  shape=(IS_riv_tot,IS_riv_tot))
+ZM_I=identity(IS_riv_tot,format='csc')
+
+print('- Network matrix created')
+print('  . Total number of connections: '+str(len(IV_row)))
+
+
+#*******************************************************************************
+#Reading rrr_m3r_ncf
+#*******************************************************************************
+print('Reading rrr_m3r_ncf')
+
+f=netCDF4.Dataset(rrr_m3r_ncf, 'r')
+
+if 'COMID' in f.dimensions:
+     YS_rivid='COMID'
+elif 'rivid' in f.dimensions:
+     YS_rivid='rivid'
+else:
+     print('ERROR - Neither COMID nor rivid exist in '+rrr_m3r_ncf)
+     raise SystemExit(22)
+
+if 'Time' in f.dimensions:
+     YS_time='Time'
+elif 'time' in f.dimensions:
+     YS_time='time'
+else:
+     print('ERROR - Neither Time nor time exist in '+rrr_m3r_ncf)
+     raise SystemExit(22)
+
+if 'm3_riv' not in f.variables:
+     print('ERROR - m3_riv does not exist in '+rrr_m3r_ncf)
+     raise SystemExit(22)
+
+if YS_rivid in f.variables:
+     if list(f.variables[YS_rivid][:])!=IV_riv_tot_id:
+          print('ERROR - The river IDs in rrr_m3r_ncf and rrr_con_csv differ')
+          raise SystemExit(22)
+
+IS_m3r_tim=len(f.dimensions[YS_time])
+print('- The number of time steps is: '+str(IS_m3r_tim))
+
+if IS_m3r_tim%IS_avg!=0:
+     print('ERROR - The number of time steps is not a multiple of '+str(IS_avg))
+     raise SystemExit(22)
+
+if YS_time in f.variables and IS_m3r_tim>1:
+     ZV_time=numpy.array(f.variables[YS_time][:],dtype=numpy.float64)
+     ZS_TaM=ZV_time[1]-ZV_time[0]
+else:
+     obj_str_date=datetime.datetime.strptime(iso_str_dat,'%Y-%m-%dT%H:%M:%S')
+     ZV_time=calendar.timegm(obj_str_date.timetuple())                         \
+            +ZS_TaM*numpy.arange(IS_m3r_tim,dtype=numpy.float64)
+print('- The time step in rrr_m3r_ncf is: '+str(ZS_TaM)+' seconds')
+
+if ZS_TaM%ZS_TaR!=0:
+     print('ERROR - The routing time step does not divide the inflow time step')
+     raise SystemExit(22)
+IS_TaR=int(ZS_TaM//ZS_TaR)
+
+ZM_Qex=numpy.array(f.variables['m3_riv'][:],dtype=numpy.float32)/ZS_TaM
+#All inflow kept in memory as external inflow (m3 s-1) of size (time x river)
+
+f.close()
+
+ZV_time_avg=ZV_time.reshape(-1,IS_avg).mean(axis=1)
+YV_time_avg=[datetime.datetime.fromtimestamp(t,datetime.timezone.utc)          \
+                                                .strftime('%Y-%m-%d')          \
+             for t in ZV_time_avg]
+IS_tim_avg=len(YV_time_avg)
+
+
+#*******************************************************************************
+#Reading rrr_obs_csv
+#*******************************************************************************
+print('Reading rrr_obs_csv')
+
+with open(rrr_obs_csv) as csvfile:
+     csvreader=csv.reader(csvfile)
+     YV_header=next(iter(csvreader))
+     IM_hsh_obs={int(h):JS_hid for JS_hid,h in enumerate(YV_header[1:])}
+     IM_hsh_dat={}
+     YM_val=[]
+     for row in csvreader:
+          IM_hsh_dat[row[0]]=len(YM_val)
+          YM_val.append(row[1:])
+
+for IS_obs_id in IV_obs_tot_id_srt:
+     if IS_obs_id not in IM_hsh_obs:
+          print('ERROR - River ID '+str(IS_obs_id)+' missing from '+rrr_obs_csv)
+          raise SystemExit(22)
+
+ZM_obs_all=numpy.array(YM_val,dtype=numpy.float64)                            \
+                .reshape(len(YM_val),len(IM_hsh_obs))
+ZM_obs_all=ZM_obs_all[:,[IM_hsh_obs[IS_obs_id]                                 \
+                         for IS_obs_id in IV_obs_tot_id_srt]]
+
+ZM_obs=numpy.full((IS_tim_avg,IS_obs_tot),numpy.nan)
+IS_dat=0
+for JS_tim_avg in range(IS_tim_avg):
+     if YV_time_avg[JS_tim_avg] in IM_hsh_dat:
+          ZM_obs[JS_tim_avg,:]=ZM_obs_all[IM_hsh_dat[YV_time_avg[JS_tim_avg]]]
+          IS_dat=IS_dat+1
+#Observations aligned with the averaged model time steps, NaN if missing
+
+print('- Number of common time steps: '+str(IS_dat))
+
+
+#*******************************************************************************
+#Routing one set of k and x factors
+#*******************************************************************************
+def swp_rte(JS_lkx):
+     #Routes the inflow with the Muskingum method using the k and x factors of
+     #row JS_lkx in ZM_lkx, and returns the discharge at the stations averaged
+     #over each inflow time step, then over every IS_avg inflow time steps.
+     ZV_k=ZV_kfac*ZM_lkx[JS_lkx,0]
+     ZV_x=ZV_xfac*ZM_lkx[JS_lkx,1]
+     ZV_den=ZV_k*(1-ZV_x)+ZS_TaR/2
+     ZV_C1=(ZS_TaR/2-ZV_k*ZV_x)/ZV_den
+     ZV_C2=(ZS_TaR/2+ZV_k*ZV_x)/ZV_den
+     ZV_C3=(-ZS_TaR/2+ZV_k*(1-ZV_x))/ZV_den
+
+     ZM_C1N=diags(ZV_C1)*ZM_Net
+     ZM_C2N=diags(ZV_C2)*ZM_Net
+     ZM_Mus=splu((ZM_I-ZM_C1N).tocsc())
+     #Muskingum operator, factorized once for all time steps
+
+     ZV_C12=ZV_C1+ZV_C2
+     ZV_Qou=numpy.zeros(IS_riv_tot)
+     ZM_Qou_obs=numpy.zeros((IS_m3r_tim,IS_obs_tot))
+     for JS_m3r_tim in range(IS_m3r_tim):
+          ZV_Qex=ZV_C12*ZM_Qex[JS_m3r_tim,:]
+          ZV_Qav=numpy.zeros(IS_obs_tot)
+          for JS_TaR in range(IS_TaR):
+               ZV_Qou=ZM_Mus.solve(ZV_Qex+ZM_C2N*ZV_Qou+ZV_C3*ZV_Qou)
+               ZV_Qav=ZV_Qav+ZV_Qou[IV_obs_ix]
+          ZM_Qou_obs[JS_m3r_tim,:]=ZV_Qav/IS_TaR
+
+     return ZM_Qou_obs.reshape(IS_tim_avg,IS_avg,IS_obs_tot).mean(axis=1)
+
+
+#*******************************************************************************
+#Routing and scoring all candidates
+#*******************************************************************************
+print('Routing and scoring all candidates')
+
+with open(rrr_swp_csv, 'w') as csvfile:
+     csvwriter = csv.writer(csvfile, dialect='excel')
+     csvwriter.writerow(['kfac','xfac','qfac','rivid']+rrr_lib_sts.YV_sts)
+
+def swp_sts(JS_lkx,ZM_mod):
+     #Scores all candidates sharing the k and x factors of row JS_lkx in ZM_lkx,
+     #the discharge being proportional to the inflow multiplying factor.
+     with open(rrr_swp_csv, 'a') as csvfile:
+          csvwriter = csv.writer(csvfile, dialect='excel')
+          for JS_cdt in numpy.nonzero(IV_cdt_lkx==JS_lkx)[0]:
+               ZM_sts=numpy.array(rrr_lib_sts.sts_hyd(ZM_obs,                  \
+                                                      ZM_mod*ZM_cdt[JS_cdt,2]))
+               for JS_obs_tot in range(IS_obs_tot):
+                    csvwriter.writerow(list(ZM_cdt[JS_cdt,:])                  \
+                                      +[IV_obs_tot_id_srt[JS_obs_tot]]         \
+                                      +[round(float(ZS_sts),2)                 \
+                                        for ZS_sts in ZM_sts[:,JS_obs_tot]])
+     print('- Scored k factor: '+str(ZM_lkx[JS_lkx,0])+', x factor: '          \
+           +str(ZM_lkx[JS_lkx,1]))
+
+if IS_cpu==1:
+     for JS_lkx in range(IS_lkx):
+          swp_sts(JS_lkx,swp_rte(JS_lkx))
+else:
+     with multiprocessing.get_context('fork').Pool(IS_cpu) as pool:
+          for JS_lkx,ZM_mod in enumerate(pool.imap(swp_rte,range(IS_lkx))):
+               swp_sts(JS_lkx,ZM_mod)
+     #Forked processes inherit the network, inflow and observations in memory
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -19,10 +19,10 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import netCDF4
 import numpy
 import csv
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -78,39 +78,36 @@ except IOError as e:
 #*******************************************************************************
 print('Reading rrr_obs_shp')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp,None,False)
 
-IS_obs_tot=len(rrr_obs_lay)
+IS_obs_tot=IM_obs_met['count']
 print('- Number of river reaches in rrr_obs_shp: '+str(IS_obs_tot))
 
-if 'COMID_1' in rrr_obs_lay[0]['properties']:
+if 'COMID_1' in IM_obs_fld:
      YV_obs_id='COMID_1'
-elif 'FLComID' in rrr_obs_lay[0]['properties']:
+elif 'FLComID' in IM_obs_fld:
      YV_obs_id='FLComID'
-elif 'ARCID' in rrr_obs_lay[0]['properties']:
+elif 'ARCID' in IM_obs_fld:
      YV_obs_id='ARCID'
-elif 'ComID' in rrr_obs_lay[0]['properties']:
+elif 'ComID' in IM_obs_fld:
      YV_obs_id='ComID'
 else:
      print('ERROR - COMID_1, FLComID, ARCID, or ComID do not exist in '        \
            +rrr_obs_shp)
      raise SystemExit(22) 
-if 'SOURCE_FEA' in rrr_obs_lay[0]['properties']:
+if 'SOURCE_FEA' in IM_obs_fld:
      YV_obs_cd='SOURCE_FEA'
-elif 'Code' in rrr_obs_lay[0]['properties']:
+elif 'Code' in IM_obs_fld:
      YV_obs_cd='Code'
-elif 'ReachCode' in rrr_obs_lay[0]['properties']:
+elif 'ReachCode' in IM_obs_fld:
      YV_obs_cd='ReachCode'
 else:
      print('ERROR - SOURCE_FEA, Code, or ReachCode do not exist in '           \
            +rrr_obs_shp)
      raise SystemExit(22)
 
-IV_obs_tot_id=[]
-YV_obs_tot_cd=[]
-for JS_obs_tot in range(IS_obs_tot):
-     IV_obs_tot_id.append(int(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_id]))
-     YV_obs_tot_cd.append(str(rrr_obs_lay[JS_obs_tot]['properties'][YV_obs_cd]))
+IV_obs_tot_id=[int(IS_obs_id) for IS_obs_id in IM_obs_fld[YV_obs_id]]
+YV_obs_tot_cd=[str(YS_obs_cd) for YS_obs_cd in IM_obs_fld[YV_obs_cd]]
 
 z = sorted(zip(IV_obs_tot_id,YV_obs_tot_cd))
 IV_obs_tot_id_srt,YV_obs_tot_cd_srt=zip(*z)
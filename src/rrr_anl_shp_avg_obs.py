@@ -16,9 +16,9 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import pandas
 import numpy
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -74,19 +74,17 @@ except IOError as e:
 #*******************************************************************************
 print('Read shapefile')
 
-rrr_obs_lay=fiona.open(rrr_obs_shp, 'r')
-IS_obs_shp=len(rrr_obs_lay)
+IM_obs_fld,YV_obs_geo,IM_obs_met=rrr_lib_vec.vec_rea(rrr_obs_shp)
+IS_obs_shp=IM_obs_met['count']
 print('- The number of gauges in shapefile is: '+str(IS_obs_shp))
 
-if 'Sttn_Nm' in rrr_obs_lay[0]['properties']:
+if 'Sttn_Nm' in IM_obs_fld:
      YS_obs_nam='Sttn_Nm'
 else:
      print('ERROR - Sttn_Nm does not exist in '+rrr_obs_shp)
      raise SystemExit(22)
 
-YV_obs_nam=[]
-for rrr_obs_fea in rrr_obs_lay:
-     YV_obs_nam.append(rrr_obs_fea['properties'][YS_obs_nam])
+YV_obs_nam=IM_obs_fld[YS_obs_nam].tolist()
 
 
 #*******************************************************************************
@@ -136,42 +134,20 @@ print('- Done')
 #*******************************************************************************
 print('Copying shapefile and appending with average')
 
-rrr_obs_crs=rrr_obs_lay.crs
-rrr_new_crs=rrr_obs_crs.copy()
-#print(rrr_new_crs)
+IM_new_met={'crs_wkt':IM_obs_met['crs_wkt'],                                   \
+            'schema':{'geometry':IM_obs_met['schema']['geometry'],             \
+                      'properties':IM_obs_met['schema']['properties'].copy()}}
 print('- Coordinate Reference System copied')
 
-rrr_obs_sch=rrr_obs_lay.schema
-rrr_new_sch=rrr_obs_sch.copy()
-rrr_new_sch['properties']['meanQ']='float:10.3'
-#print(rrr_new_sch)
+IM_new_met['schema']['properties']['meanQ']='float:10.3'
+#print(IM_new_met['schema'])
 print('- Schema copied')
 
-rrr_new_lay=fiona.open(rrr_new_shp, 'w',                                       \
-                       crs=rrr_new_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_new_sch                                      \
-                       )
-print('- New shapefile created')
+IM_new_fld=IM_obs_fld.copy()
+IM_new_fld['meanQ']=[round(ZS_Qav,3) for ZS_Qav in ZV_Qav]
 
-for JS_obs_shp in range(IS_obs_shp):
-     rrr_obs_fea=rrr_obs_lay[JS_obs_shp]
-     rrr_obs_prp=rrr_obs_fea['properties']
-     rrr_obs_geo=rrr_obs_fea['geometry']
-
-     rrr_new_prp=rrr_obs_prp.copy()
-     rrr_new_geo=rrr_obs_geo.copy()
-
-     rrr_new_prp['meanQ']=round(ZV_Qav[JS_obs_shp],3)
-
-     rrr_new_lay.write({                                                       \
-                        'properties': rrr_new_prp,                             \
-                        'geometry': rrr_new_geo,                               \
-                        })
-print('- New shapefile populated')
-
-rrr_new_lay.close()
-print('- Closing shapefile so that values are saved')
+rrr_lib_vec.vec_wri(rrr_new_shp,IM_new_fld,YV_obs_geo,IM_new_met)
+print('- New shapefile created and populated')
 
 
 #*******************************************************************************
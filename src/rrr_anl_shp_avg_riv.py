@@ -15,9 +15,10 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import netCDF4
 import numpy
+import rrr_lib_vec
+import rrr_lib_mmp
 
 
 #*******************************************************************************
@@ -73,25 +74,21 @@ except IOError as e:
 #*******************************************************************************
 print('Read shapefile')
 
-rrr_riv_lay=fiona.open(rrr_riv_shp, 'r')
-IS_riv_shp=len(rrr_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(rrr_riv_shp)
+IS_riv_shp=IM_riv_met['count']
 print('- The number of river features is: '+str(IS_riv_shp))
 
-if 'COMID' in rrr_riv_lay[0]['properties']:
+if 'COMID' in IM_riv_fld:
      YV_riv_id='COMID'
-elif 'ComID' in rrr_riv_lay[0]['properties']:
+elif 'ComID' in IM_riv_fld:
      YV_riv_id='ComID'
-elif 'ARCID' in rrr_riv_lay[0]['properties']:
+elif 'ARCID' in IM_riv_fld:
      YV_riv_id='ARCID'
 else:
      print('ERROR - Neither COMID, ComID, nor ARCID exist in '+rrr_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_shp=[0]*IS_riv_shp
-for JS_riv_shp in range(IS_riv_shp):
-     riv_fea=rrr_riv_lay[JS_riv_shp]
-     riv_prp=riv_fea['properties']
-     IV_riv_shp[JS_riv_shp]=int(riv_prp[YV_riv_id])
+IV_riv_shp=[int(IS_riv_id) for IS_riv_id in IM_riv_fld[YV_riv_id]]
 
 
 #*******************************************************************************
@@ -162,8 +159,11 @@ print('Computing average')
 
 ZV_avg_ncf=numpy.zeros(IS_riv_ncf)
 
+ZM_out,BS_mmp=rrr_lib_mmp.mmp_var(rrr_out_ncf,f,YS_out_name)
+if BS_mmp: print('- Reading '+YS_out_name+' from the cache of '+rrr_out_ncf)
+
 for JS_time in range(IS_time):
-     ZV_out=f.variables[YS_out_name][JS_time,:]
+     ZV_out=ZM_out[JS_time,:]
      ZV_avg_ncf=ZV_avg_ncf+ZV_out
 
 ZV_avg_ncf=ZV_avg_ncf/IS_time
@@ -192,42 +192,20 @@ for JS_riv_ncf in range(IS_riv_ncf):
      ZV_avg_shp[JS_riv_shp]=ZV_avg_ncf[JS_riv_ncf]
 print('- Average resorted for shapefile ')
 
-rrr_riv_crs=rrr_riv_lay.crs
-rrr_new_crs=rrr_riv_crs.copy()
-#print(rrr_new_crs)
+IM_new_met={'crs_wkt':IM_riv_met['crs_wkt'],                                   \
+            'schema':{'geometry':IM_riv_met['schema']['geometry'],             \
+                      'properties':IM_riv_met['schema']['properties'].copy()}}
 print('- Coordinate Reference System copied')
 
-rrr_riv_sch=rrr_riv_lay.schema
-rrr_new_sch=rrr_riv_sch.copy()
-rrr_new_sch['properties']['meanQ']='float:24.5'
-#print(rrr_new_sch)
+IM_new_met['schema']['properties']['meanQ']='float:24.5'
+#print(IM_new_met['schema'])
 print('- Schema copied')
 
-rrr_new_lay=fiona.open(rrr_new_shp, 'w',                                       \
-                       crs=rrr_new_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_new_sch                                      \
-                       )
-print('- New shapefile created')
-
-for JS_riv_shp in range(IS_riv_shp):
-     rrr_riv_fea=rrr_riv_lay[JS_riv_shp]
-     rrr_riv_prp=rrr_riv_fea['properties']
-     rrr_riv_geo=rrr_riv_fea['geometry']
-
-     rrr_new_prp=rrr_riv_prp.copy()
-     rrr_new_geo=rrr_riv_geo.copy()
-
-     rrr_new_prp['meanQ']=ZV_avg_shp[JS_riv_shp]
-
-     rrr_new_lay.write({                                                       \
-                        'properties': rrr_new_prp,                             \
-                        'geometry': rrr_new_geo,                               \
-                        })
-print('- New shapefile populated')
+IM_new_fld=IM_riv_fld.copy()
+IM_new_fld['meanQ']=ZV_avg_shp
 
-rrr_new_lay.close()
-print('- Closing shapefile so that values are saved')
+rrr_lib_vec.vec_wri(rrr_new_shp,IM_new_fld,YV_riv_geo,IM_new_met)
+print('- New shapefile created and populated')
 
 
 #*******************************************************************************
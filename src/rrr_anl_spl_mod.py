@@ -6,6 +6,10 @@
 #This script sumbsamples river model outputs based on prior subsampling of
 #the river network based on polylines/polygons and their mean times and on the
 #time (second) required to complete one cycle.
+#The subsampling sequence is represented by flat arrays of (mean time, river
+#reach index) pairs sorted by mean time. Model outputs are then read in blocks
+#of time steps, the subsamples falling within each block are gathered with one
+#indexing operation, and the subsampled block is written at once.
 #Author:
 #Etienne Fluet Chouinard, Cedric H. David, Md Safat Sikder, 2016-2023
 
@@ -21,7 +25,6 @@ import calendar
 import numpy
 import os.path
 import subprocess
-import progressbar
 
 
 #*******************************************************************************
@@ -34,6 +37,14 @@ ZS_TauR=10800
 #The duration (s) of the time steps in the input netCDF files, 3h is most common
 
 
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_val_blk=50000000
+#The number of values read from the input netCDF file at once, which determines
+#the number of time steps processed in each block (200 MB for float32)
+
+
 #*******************************************************************************
 #Declaration of variables (given as command line arguments)
 #*******************************************************************************
@@ -166,76 +177,34 @@ print('- The total number of subsample/river reach pairs is: '+str(IS_spl_tot))
 
 
 #*******************************************************************************
-#Creating hash tables
-#*******************************************************************************
-print('Creating hash tables')
-
-IH_hsh1={}
-for JS_riv_tot1 in range(IS_riv_tot1):
-     IH_hsh1[IV_riv_tot_id1[JS_riv_tot1]]=JS_riv_tot1
-     #This hash table relates a given rivid with its index in rrr_mod_nc1
-
-IH_hsh2={}
-for JS_riv_tot2 in range(IS_riv_tot2):
-     IH_hsh2[IV_riv_tot_id2[JS_riv_tot2]]=JS_riv_tot2
-     #This hash table relates a given rivid with its index in rrr_spl_csv
-
-print('- Done')
-
-
-#*******************************************************************************
-#Reorganizing subsamples chronologically in a dictionary for faster I/O
+#Creating flat arrays of subsamples sorted by meantime
 #*******************************************************************************
-print('Reorganizing subsamples chronologically in a dictionary for faster I/O')
-
-ZH_mea_tim={}
-for JS_riv_tot2 in range(IS_riv_tot2):
-     for JS_spl_cnt in range(IV_spl_cnt[JS_riv_tot2]):
-          ZH_mea_tim[IM_mea_tim[JS_riv_tot2][JS_spl_cnt]]=[]
-#Each meantime value now has a key in the Python dictionary
-
-for JS_riv_tot2 in range(IS_riv_tot2):
-     for JS_spl_cnt in range(IV_spl_cnt[JS_riv_tot2]):
-          ZH_mea_tim[IM_mea_tim[JS_riv_tot2][JS_spl_cnt]]                      \
-               .append(IV_riv_tot_id2[JS_riv_tot2])
-#Each meantime value now has a list of all associated river IDs
-
-ZV_mea_tim=list(ZH_mea_tim.keys())
-ZV_mea_tim.sort()
-#The list of meantime values sorted in chronological order
-IS_mea_tim=len(ZV_mea_tim)
-
+print('Creating flat arrays of subsamples sorted by meantime')
+
+IV_riv_srt1=numpy.argsort(IV_riv_tot_id1)
+IV_pos=numpy.searchsorted(IV_riv_tot_id1[IV_riv_srt1],IV_riv_tot_id2)
+IV_pos=numpy.minimum(IV_pos,IS_riv_tot1-1)
+if not numpy.array_equal(IV_riv_tot_id1[IV_riv_srt1][IV_pos],IV_riv_tot_id2):
+     print('ERROR - Some river IDs in rrr_spl_csv are not in rrr_mod_nc1')
+     raise SystemExit(22)
+IV_riv_idx2=IV_riv_srt1[IV_pos]
+#The index in rrr_mod_nc1 of each river reach in rrr_spl_csv
+
+IV_spl_riv=numpy.repeat(IV_riv_idx2,IV_spl_cnt)
+ZV_spl_mea=numpy.array([ZS_mea_tim for ZV_mea in IM_mea_tim                    \
+                                   for ZS_mea_tim in ZV_mea],dtype=numpy.float64)
+#Each subsample/river reach pair, with the index of the river reach in
+#rrr_mod_nc1 and the meantime of the subsample
+
+IV_spl_srt=numpy.argsort(ZV_spl_mea,kind='stable')
+IV_spl_riv=IV_spl_riv[IV_spl_srt]
+ZV_spl_mea=ZV_spl_mea[IV_spl_srt]
+#The pairs are now sorted in chronological order
+
+IS_mea_tim=len(numpy.unique(ZV_spl_mea))
 print('- The number of meantime values in subsample file is: '+str(IS_mea_tim))
 
 
-#*******************************************************************************
-#Reorganizing subsamples dictionary following river IDs for faster I/O
-#*******************************************************************************
-print('Reorganizing subsamples dictionary following river IDs for faster I/O')
-
-for JS_mea_tim in range(IS_mea_tim):
-     ZS_mea_tim=ZV_mea_tim[JS_mea_tim]
-     IV_ids=ZH_mea_tim[ZS_mea_tim]
-     IS_ids=len(IV_ids)
-     IV_idx=[]
-     #--------------------------------------------------------------------------
-     #If river IDs are sorted following IV_riv_tot_id1
-     #--------------------------------------------------------------------------
-     for JS_ids in range(IS_ids):
-          IV_idx.append(IH_hsh1[IV_ids[JS_ids]])
-     IV_idx.sort()
-     ZH_mea_tim[ZS_mea_tim]=[IV_riv_tot_id1[JS_idx] for JS_idx in IV_idx]
-     #--------------------------------------------------------------------------
-     #If river IDs are sorted following IV_riv_tot_id2
-     #--------------------------------------------------------------------------
-     #for JS_ids in range(IS_ids):
-     #     IV_idx.append(IH_hsh2[IV_ids[JS_ids]])
-     #IV_idx.sort()
-     #ZH_mea_tim[ZS_mea_tim]=[IV_riv_tot_id2[JS_idx] for JS_idx in IV_idx]
-
-print('- Done')
-
-
 #*******************************************************************************
 #Generating rrr_mod_nc3 based on rrr_mod_nc1 and rrr_spl_csv
 #*******************************************************************************
@@ -318,16 +287,17 @@ time[:]=ZV_time3
 #or with those built from hardcoded values
 
 IS_time3=IS_time1
-for JS_time3 in range(IS_time3):
-     var[JS_time3,:]=[ZS_fill]*IS_riv_tot2
-#Initialize all variable values (Qout or V) that are being subsampled to NoData
 
 #-------------------------------------------------------------------------------
 #Populate netCDF variables
 #-------------------------------------------------------------------------------
 print('- Populate netCDF variables')
 
-ZS_cyc=(ZV_time3[IS_time3-1]+ZS_TauR-ZV_time3[0])/ZS_cyc_tim
+ZV_time3=numpy.array(ZV_time3,dtype=numpy.float64)
+ZS_tim_end=ZV_time3[IS_time3-1]+ZS_TauR
+#The end of the last time step, after which no subsample is taken
+
+ZS_cyc=(ZS_tim_end-ZV_time3[0])/ZS_cyc_tim
 if ZS_cyc.is_integer():
      IS_cyc=int(ZS_cyc)
 else:
@@ -335,34 +305,59 @@ else:
 #Total integer number of complete cycles needed to fully cover simulation
 #(note that a value of 1 was added in the integer here to round up)
 
-prg_bar=progressbar.ProgressBar(maxval=IS_cyc-1,                               \
-        widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
-
-#prg_bar.start()
-for JS_cyc in range(IS_cyc):
-     #Here we're looping on all complete cycles sequentially
-     #prg_bar.update(JS_cyc)
-     for JS_mea_tim in range(IS_mea_tim):
-          #Here we're looping on mean times sequentially in increasing order
-          ZS_mea_tim=ZV_mea_tim[JS_mea_tim]
-          ZS_spl_tim=ZV_time3[0]+JS_cyc*ZS_cyc_tim+ZS_mea_tim
-          if (ZS_spl_tim<=ZV_time3[IS_time3-1]+ZS_TauR):
-               #Here we're copying the value for each of the sampled river IDs
-               JS_time3=numpy.searchsorted(ZV_time1,ZS_spl_tim,side='right')-1
-               if JS_time3<0 or JS_time3>IS_time3-1:
-                    print('ERROR: Unexpected JS_time3 value: '+str(JS_time3))
-                    raise SystemExit(22)
-               IV_ids=ZH_mea_tim[ZS_mea_tim]
-               IV_idx1=[IH_hsh1[IS_ids] for IS_ids in IV_ids]
-               # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-               IV_idx3=[IH_hsh1[IS_ids] for IS_ids in IV_ids]
-               #If river IDs are sorted following IV_riv_tot_id1
-               # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-               #IV_idx3=[IH_hsh2[IS_ids] for IS_ids in IV_ids]
-               ##If river IDs are sorted following IV_riv_tot_id2
-               # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-               var[JS_time3,IV_idx3]=f1.variables[YV_var][JS_time3,IV_idx1]
-#prg_bar.finish()
+IS_blk=max(1,IS_val_blk//max(1,IS_riv_tot1))
+print(' . The number of time steps processed in each block is: '+str(IS_blk))
+
+for JS_blk in range(0,IS_time3,IS_blk):
+     JS_end=min(JS_blk+IS_blk,IS_time3)
+     #Here we're looping on blocks of time steps sequentially
+
+     ZS_blk_str=ZV_time3[JS_blk]-ZS_TauR
+     if JS_end<IS_time3:
+          ZS_blk_end=ZV_time3[JS_end]+ZS_TauR
+     else:
+          ZS_blk_end=ZS_tim_end+ZS_TauR
+     #The time range covered by this block, widened by one time step so that
+     #candidate subsamples are not missed because of roundoff
+
+     IV_tim=[]
+     IV_riv=[]
+     if IS_spl_tot>0:
+          JS_cyc_str=int(numpy.floor((ZS_blk_str-ZV_time3[0]-ZV_spl_mea[-1])   \
+                                     /ZS_cyc_tim))
+          JS_cyc_end=int(numpy.floor((ZS_blk_end-ZV_time3[0]-ZV_spl_mea[0])    \
+                                     /ZS_cyc_tim))
+          for JS_cyc in range(max(JS_cyc_str,0),min(JS_cyc_end,IS_cyc-1)+1):
+               ZS_cyc_str=ZV_time3[0]+JS_cyc*ZS_cyc_tim
+               JS_spl_str=numpy.searchsorted(ZV_spl_mea,ZS_blk_str-ZS_cyc_str, \
+                                             side='left')
+               JS_spl_end=numpy.searchsorted(ZV_spl_mea,ZS_blk_end-ZS_cyc_str, \
+                                             side='right')
+               #The contiguous range of candidate subsamples for this cycle
+
+               ZV_spl_tim=ZS_cyc_str+ZV_spl_mea[JS_spl_str:JS_spl_end]
+               IV_spl_tim=numpy.searchsorted(ZV_time3,ZV_spl_tim,side='right')-1
+               BV_spl=(ZV_spl_tim<=ZS_tim_end)                                 \
+                     &(IV_spl_tim>=JS_blk)&(IV_spl_tim<JS_end)
+               #The subsamples that truly fall within this block
+
+               IV_tim.append(IV_spl_tim[BV_spl]-JS_blk)
+               IV_riv.append(IV_spl_riv[JS_spl_str:JS_spl_end][BV_spl])
+
+     ZM_var3=numpy.full((JS_end-JS_blk,IS_riv_tot2),ZS_fill,dtype=numpy.float32)
+     #Initialize all variable values (Qout or V) that are being subsampled to
+     #NoData
+
+     if IV_tim:
+          IV_tim=numpy.concatenate(IV_tim)
+          IV_riv=numpy.concatenate(IV_riv)
+     if len(IV_tim)>0:
+          ZM_var1=f1.variables[YV_var][JS_blk:JS_end,:]
+          ZM_var1=numpy.ma.filled(ZM_var1,ZS_fill)
+          ZM_var3[IV_tim,IV_riv]=ZM_var1[IV_tim,IV_riv]
+          #If river IDs are sorted following IV_riv_tot_id1
+
+     var[JS_blk:JS_end,:]=ZM_var3
 
 
 #*******************************************************************************
@@ -6,7 +6,9 @@
 #Purpose:
 #Given a polyline/polygon shapefile that contains mean times, and a river
 #shapefile, this script subsamples the rivers based on the polygon/polyline
-#features.
+#features. All geometries are loaded once into arrays of shapely geometries and
+#the intersections are found in bulk using a spatial index (STRtree) built on
+#the river features.
 #Authors:
 #Etienne Fluet Chouinard, Cedric H. David, Md Safat Sikder, 2016-2023
 
@@ -16,10 +18,9 @@
 #*******************************************************************************
 import sys
 import fiona
-import progressbar
+import numpy
+import shapely
 import shapely.geometry
-import shapely.prepared
-import rtree
 import csv
 
 
@@ -93,30 +94,19 @@ else:
      print('ERROR - Neither COMID, ComID, nor ARCID exist in '+rrr_riv_shp)
      raise SystemExit(22) 
 
-prg_bar=progressbar.ProgressBar(maxval=IS_riv_tot-1,                           \
-        widgets=[progressbar.Bar('=','- [',']'),' ',progressbar.Percentage()])
-
-#prg_bar.start()
-IV_riv_fid=[0]*IS_riv_tot
-hsh_riv_prp={}
-hsh_riv_geo={}
-hsh_riv_shy={}
-hsh_riv_bnd={}
 IV_riv_tot_id=[0]*IS_riv_tot
-for JS_riv_tot in range(IS_riv_tot):
-     #prg_bar.update(JS_riv_tot)
-     riv_fea=rrr_riv_lay[JS_riv_tot]
-     riv_fid=int(riv_fea['id'])
-     riv_prp=riv_fea['properties']
-     riv_geo=riv_fea['geometry']
-     riv_shy=shapely.geometry.shape(riv_geo)
-     IV_riv_fid[JS_riv_tot]=riv_fid
-     IV_riv_tot_id[JS_riv_tot]=int(riv_prp[YV_riv_id])
-     hsh_riv_prp[riv_fid]=riv_prp
-     hsh_riv_geo[riv_fid]=riv_geo
-     hsh_riv_shy[riv_fid]=riv_shy
-     hsh_riv_bnd[riv_fid]=riv_shy.bounds
-#prg_bar.finish()
+riv_prp=[None]*IS_riv_tot
+riv_geo=[None]*IS_riv_tot
+JS_riv_tot=0
+for riv_fea in rrr_riv_lay:
+     riv_prp[JS_riv_tot]=dict(riv_fea['properties'])
+     riv_geo[JS_riv_tot]=riv_fea['geometry']
+     IV_riv_tot_id[JS_riv_tot]=int(riv_prp[JS_riv_tot][YV_riv_id])
+     JS_riv_tot=JS_riv_tot+1
+#All river features are read in one sequential pass
+
+riv_shy=numpy.array([shapely.geometry.shape(geo) for geo in riv_geo])
+#An array of shapely geometries for all river features
 
 
 #*******************************************************************************
@@ -128,25 +118,11 @@ rrr_pol_lay=fiona.open(rrr_pol_shp, 'r')
 IS_pol_tot=len(rrr_pol_lay)
 print('- The number of polyline/polygon features is: '+str(IS_pol_tot))
 
-prg_bar=progressbar.ProgressBar(maxval=IS_pol_tot-1,                           \
-        widgets=[progressbar.Bar('=','- [',']'),' ',progressbar.Percentage()])
-
-#prg_bar.start()
-IV_pol_fid=[0]*IS_pol_tot
-hsh_pol_prp={}
-hsh_pol_shy={}
-hsh_pol_bnd={}
-for JS_pol_tot in range(IS_pol_tot):
-     #prg_bar.update(JS_pol_tot)
-     pol_fea=rrr_pol_lay[JS_pol_tot]
-     pol_fid=int(pol_fea['id'])
-     pol_prp=pol_fea['properties']
-     pol_shy=shapely.geometry.shape(pol_fea['geometry'])
-     IV_pol_fid[JS_pol_tot]=pol_fid
-     hsh_pol_prp[pol_fid]=pol_prp
-     hsh_pol_shy[pol_fid]=pol_shy
-     hsh_pol_bnd[pol_fid]=pol_shy.bounds
-#prg_bar.finish()
+pol_shy=numpy.array([shapely.geometry.shape(pol_fea['geometry'])               \
+                     for pol_fea in rrr_pol_lay])
+ZV_pol_tim=numpy.array([float(pol_fea['properties']['Mean_time'])              \
+                        for pol_fea in rrr_pol_lay])
+#An array of shapely geometries and one of mean times for all polylines/polygons
 
 
 #*******************************************************************************
@@ -154,17 +130,7 @@ for JS_pol_tot in range(IS_pol_tot):
 #*******************************************************************************
 print('Create spatial index for the bounds of each river feature')
 
-prg_bar=progressbar.ProgressBar(maxval=IS_riv_tot-1,                           \
-        widgets=[progressbar.Bar('=','- [',']'),' ',progressbar.Percentage()])
-
-#prg_bar.start()
-index=rtree.index.Index()
-for JS_riv_tot in range(IS_riv_tot):
-     #prg_bar.update(JS_riv_tot)
-     riv_fid=IV_riv_fid[JS_riv_tot]
-     index.insert(riv_fid,hsh_riv_bnd[riv_fid])
-     #the first argument of index.insert has to be 'int', not 'long' or 'str'
-#prg_bar.finish()
+riv_tre=shapely.STRtree(riv_shy)
 
 
 #*******************************************************************************
@@ -172,48 +138,35 @@ for JS_riv_tot in range(IS_riv_tot):
 #*******************************************************************************
 print('Find intersections')
 
-IS_spl_cnt=0
+IV_spl_pol,IV_spl_riv=riv_tre.query(pol_shy,predicate='intersects')
+#All pairs of polyline/polygon and river features that intersect, the predicate
+#is evaluated on prepared polyline/polygon geometries
+
+IS_spl_cnt=len(IV_spl_riv)
 #The total count of river features intersecting with polyline/polygon features
 
+IV_spl_srt=numpy.lexsort((IV_spl_pol,IV_spl_riv))
+IV_spl_pol=IV_spl_pol[IV_spl_srt]
+IV_spl_riv=IV_spl_riv[IV_spl_srt]
+#The pairs are sorted by river feature, and then by polyline/polygon feature
+
+IV_riv_cnt=numpy.bincount(IV_spl_riv,minlength=IS_riv_tot)
+IV_riv_str=numpy.concatenate(([0],numpy.cumsum(IV_riv_cnt)))
+ZV_spl_tim=ZV_pol_tim[IV_spl_pol].tolist()
+
 IM_spl_cnt={}
 IM_spl_tim={}
 for JS_riv_tot in range(IS_riv_tot):
      IM_spl_cnt[IV_riv_tot_id[JS_riv_tot]]=0
-     #A hash table associating each river reach ID with the number of subsamples
      IM_spl_tim[IV_riv_tot_id[JS_riv_tot]]=[]
+for JS_riv_tot in range(IS_riv_tot):
+     IS_riv_id=IV_riv_tot_id[JS_riv_tot]
+     IM_spl_cnt[IS_riv_id]=IM_spl_cnt[IS_riv_id]+int(IV_riv_cnt[JS_riv_tot])
+     #A hash table associating each river reach ID with the number of subsamples
+     IM_spl_tim[IS_riv_id]=IM_spl_tim[IS_riv_id]                               \
+                   +ZV_spl_tim[IV_riv_str[JS_riv_tot]:IV_riv_str[JS_riv_tot+1]]
      #A hash table associating each river reach ID with the subsample times 
 
-prg_bar=progressbar.ProgressBar(maxval=IS_pol_tot-1,                           \
-        widgets=[progressbar.Bar('=','- [',']'),' ',progressbar.Percentage()])
-
-#prg_bar.start()
-for JS_pol_tot in range(IS_pol_tot):
-     #prg_bar.update(JS_pol_tot)
-     pol_fid=IV_pol_fid[JS_pol_tot]
-     pol_prp=hsh_pol_prp[pol_fid]
-     pol_shy=hsh_pol_shy[pol_fid]
-     pol_bnd=hsh_pol_bnd[pol_fid]
-     pol_pre=shapely.prepared.prep(pol_shy)
-     IV_riv_ids=[int(x) for x in list(index.intersection(pol_bnd))]
-     for riv_fid in IV_riv_ids:
-          #---------------------------------------------------------------------
-          #print('The bounds of riv_fid='+str(riv_fid)+                        \
-          #      ' intersect with the bounds of pol_fid='+str(pol_fid))
-          #---------------------------------------------------------------------
-          riv_shy=hsh_riv_shy[riv_fid]
-          riv_prp=hsh_riv_prp[riv_fid]
-          if pol_pre.intersects(riv_shy):
-               #----------------------------------------------------------------
-               #print('riv_fid='+str(riv_fid)+                                 \
-               #      ' intersects with pol_fid='+str(pol_fid))
-               #----------------------------------------------------------------
-               IS_spl_cnt=IS_spl_cnt+1
-               IS_riv_id=int(riv_prp[YV_riv_id])
-               ZS_pol_tim=float(pol_prp['Mean_time'])
-               IM_spl_cnt[IS_riv_id]=IM_spl_cnt[IS_riv_id]+1
-               IM_spl_tim[IS_riv_id].append(ZS_pol_tim)
-#prg_bar.finish()
-
 print('- The number of river features intersecting with the polyline/polygon'  \
       +' features is: '+str(IS_spl_cnt))
 
@@ -252,10 +205,9 @@ rrr_spl_lay=fiona.open(rrr_spl_shp, 'w',                                       \
 print('- New shapefile created')
 
 for JS_riv_tot in range(IS_riv_tot):
-     riv_fid=IV_riv_fid[JS_riv_tot]
-     rrr_spl_prp=hsh_riv_prp[riv_fid]
+     rrr_spl_prp=riv_prp[JS_riv_tot]
      rrr_spl_prp['SUBSAMPLES']=IM_spl_cnt[IV_riv_tot_id[JS_riv_tot]]
-     rrr_spl_geo=hsh_riv_geo[riv_fid]
+     rrr_spl_geo=riv_geo[JS_riv_tot]
      rrr_spl_lay.write({                                                       \
                         'properties': rrr_spl_prp,                             \
                         'geometry': rrr_spl_geo,                               \
@@ -20,9 +20,9 @@
 #*******************************************************************************
 import sys
 import math
-import fiona
-import shapely.geometry
 import csv
+import rrr_lib_geo
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -100,8 +100,8 @@ print('Read shapefile')
 #-------------------------------------------------------------------------------
 print('- Open file')
 
-hsd_cat_lay=fiona.open(hsd_cat_shp, 'r')
-IS_cat_tot=len(hsd_cat_lay)
+IM_cat_fld,YV_cat_geo,IM_cat_met=rrr_lib_vec.vec_rea(hsd_cat_shp)
+IS_cat_tot=IM_cat_met['count']
 print('- The number of catchment features is: '+str(IS_cat_tot))
 
 #-------------------------------------------------------------------------------
@@ -109,49 +109,41 @@ print('- The number of catchment features is: '+str(IS_cat_tot))
 #-------------------------------------------------------------------------------
 print('- Read attributes')
 
-if 'ARCID' in hsd_cat_lay[0]['properties']:
+if 'ARCID' in IM_cat_fld:
      YV_cat_id='ARCID'
 else:
      print('ERROR - ARCID does not exist in '+hsd_cat_shp)
      raise SystemExit(22) 
 
-if 'UP_CELLS' in hsd_cat_lay[0]['properties']:
+if 'UP_CELLS' in IM_cat_fld:
      YV_cat_up_cells='UP_CELLS'
 else:
      print('ERROR - UP_CELLS does not exist in '+hsd_cat_shp)
      raise SystemExit(22) 
 
-IV_cat_tot_id=[]
-IV_cat_up_cells=[]
-for JS_cat_tot in range(IS_cat_tot):
-     hsd_cat_prp=hsd_cat_lay[JS_cat_tot]['properties']
-     IV_cat_tot_id.append(int(hsd_cat_prp[YV_cat_id]))
-     IV_cat_up_cells.append(int(hsd_cat_prp[YV_cat_up_cells]))
+IV_cat_tot_id=[int(IS_cat_id) for IS_cat_id in IM_cat_fld[YV_cat_id]]
+IV_cat_up_cells=[int(IS_cat_up_cells) for IS_cat_up_cells in                   \
+                 IM_cat_fld[YV_cat_up_cells]]
 
 #-------------------------------------------------------------------------------
 #Read geometry
 #-------------------------------------------------------------------------------
 print('- Read geometry')
 
-ZV_cat_x_str=[]
-ZV_cat_y_str=[]
-ZV_cat_x_end=[]
-ZV_cat_y_end=[]
-ZV_cat_x_cen=[]
-ZV_cat_y_cen=[]
-for JS_cat_tot in range(IS_cat_tot):
-     hsd_cat_crd=hsd_cat_lay[JS_cat_tot]['geometry']['coordinates']
-     IS_point=len(hsd_cat_crd)
-     #Start and end points of each polyline:
-     ZV_cat_x_str.append(hsd_cat_crd[0][0])
-     ZV_cat_y_str.append(hsd_cat_crd[0][1])
-     ZV_cat_x_end.append(hsd_cat_crd[IS_point-1][0])
-     ZV_cat_y_end.append(hsd_cat_crd[IS_point-1][1])
-     #Centroid of each polyline:
-     hsd_cat_lns=shapely.geometry.LineString(hsd_cat_crd)
-     hsd_cat_cen=hsd_cat_lns.centroid.coords[:][0]
-     ZV_cat_x_cen.append(hsd_cat_cen[0])
-     ZV_cat_y_cen.append(hsd_cat_cen[1])
+YS_cat_typ,ZM_cat_xy,IV_cat_off=rrr_lib_geo.geo_rag(YV_cat_geo)
+#Flat array with the vertices of all polyline features, and offsets
+
+IV_cat_prt,IV_cat_ftr=IV_cat_off
+ZV_cat_x_str=ZM_cat_xy[IV_cat_prt[IV_cat_ftr[:-1]],0].tolist()
+ZV_cat_y_str=ZM_cat_xy[IV_cat_prt[IV_cat_ftr[:-1]],1].tolist()
+ZV_cat_x_end=ZM_cat_xy[IV_cat_prt[IV_cat_ftr[1:]]-1,0].tolist()
+ZV_cat_y_end=ZM_cat_xy[IV_cat_prt[IV_cat_ftr[1:]]-1,1].tolist()
+#Start and end points of each polyline
+
+ZV_cat_x_cen,ZV_cat_y_cen=rrr_lib_geo.geo_cen(YS_cat_typ,ZM_cat_xy,IV_cat_off)
+ZV_cat_x_cen=ZV_cat_x_cen.tolist()
+ZV_cat_y_cen=ZV_cat_y_cen.tolist()
+#Centroid of each polyline, all computed at once
 
 
 #*******************************************************************************
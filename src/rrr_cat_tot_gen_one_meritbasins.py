@@ -19,9 +19,10 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
-import shapely.geometry
 import csv
+import rrr_lib_geo
+import rrr_lib_prf
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -66,14 +67,15 @@ except IOError as e:
 #Read shapefile
 #*******************************************************************************
 print('Read shapefile')
+rrr_lib_prf.prf_sec('Read shapefile')
 
 #-------------------------------------------------------------------------------
 #Open file 
 #-------------------------------------------------------------------------------
 print('- Open file')
 
-mer_cat_lay=fiona.open(mer_cat_shp, 'r')
-IS_cat_tot=len(mer_cat_lay)
+IM_cat_fld,YV_cat_geo,IM_cat_met=rrr_lib_vec.vec_rea(mer_cat_shp)
+IS_cat_tot=IM_cat_met['count']
 print('- The number of catchment features is: '+str(IS_cat_tot))
 
 #-------------------------------------------------------------------------------
@@ -81,50 +83,47 @@ print('- The number of catchment features is: '+str(IS_cat_tot))
 #-------------------------------------------------------------------------------
 print('- Read attributes')
 
-if 'COMID' in mer_cat_lay[0]['properties']:
+if 'COMID' in IM_cat_fld:
      YV_cat_id='COMID'
 else:
      print('ERROR - COMID does not exist in '+mer_cat_shp)
      raise SystemExit(22) 
 
-if 'areasqkm' in mer_cat_lay[0]['properties']:
+if 'areasqkm' in IM_cat_fld:
      YV_cat_sqkm='areasqkm'
-elif 'unitarea' in mer_cat_lay[0]['properties']:
+elif 'unitarea' in IM_cat_fld:
      YV_cat_sqkm='unitarea'
 else:
      print('ERROR - Neither areasqkm nor unitarea exist in '+mer_cat_shp)
      raise SystemExit(22) 
 
-IV_cat_tot_id=[]
-ZV_cat_sqkm=[]
-for JS_cat_tot in range(IS_cat_tot):
-     mer_cat_prp=mer_cat_lay[JS_cat_tot]['properties']
-     IV_cat_tot_id.append(int(mer_cat_prp[YV_cat_id]))
-     ZV_cat_sqkm.append(float(mer_cat_prp[YV_cat_sqkm]))
+IV_cat_tot_id=[int(IS_cat_id) for IS_cat_id in IM_cat_fld[YV_cat_id]]
+ZV_cat_sqkm=[float(ZS_cat_sqkm) for ZS_cat_sqkm in IM_cat_fld[YV_cat_sqkm]]
 
 #-------------------------------------------------------------------------------
 #Read geometry
 #-------------------------------------------------------------------------------
 print('- Read geometry')
 
-ZV_cat_x_cen=[]
-ZV_cat_y_cen=[]
-for JS_cat_tot in range(IS_cat_tot):
-     mer_cat_geo=mer_cat_lay[JS_cat_tot]['geometry']
-     #extracted the geometry for one feature in this shapefile.
-     mer_cat_pnt=shapely.geometry.shape(mer_cat_geo).centroid
-     #create the centroid for this one feature.
-     mer_cat_cen=mer_cat_pnt.coords[:][0]
-     #extracted the coordinates for the centroid
-     ZV_cat_x_cen.append(mer_cat_cen[0])
-     ZV_cat_y_cen.append(mer_cat_cen[1])
-     #assigned coordinates to array
+YS_cat_typ,ZM_cat_xy,IV_cat_off=rrr_lib_geo.geo_rag(YV_cat_geo)
+#Flat array with the vertices of all polygon features, and offsets
+
+#-------------------------------------------------------------------------------
+#Compute centroids
+#-------------------------------------------------------------------------------
+print('- Compute centroids')
+
+ZV_cat_x_cen,ZV_cat_y_cen=rrr_lib_geo.geo_cen(YS_cat_typ,ZM_cat_xy,IV_cat_off)
+ZV_cat_x_cen=ZV_cat_x_cen.tolist()
+ZV_cat_y_cen=ZV_cat_y_cen.tolist()
+#Centroid coordinates of each polygon, all computed at once
 
 
 #*******************************************************************************
 #Write outputs
 #*******************************************************************************
 print('Writing files')
+rrr_lib_prf.prf_sec('Writing files')
 
 with open(rrr_cat_csv, 'w') as csvfile:
      csvwriter = csv.writer(csvfile, dialect='excel')
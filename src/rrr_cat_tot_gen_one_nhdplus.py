@@ -22,6 +22,8 @@ import sys
 import csv
 import dbf
 import shapefile
+import numpy
+import rrr_lib_geo
 
 
 #*******************************************************************************
@@ -97,68 +99,49 @@ IS_cat_tot=len(IV_cat_tot_id)
 print('- Read shapes')
 nhd_cat_shp=shapefile.Reader(nhd_cat_file)
 
-#For formulas used here, see:
-#https://en.wikipedia.org/wiki/Centroid#Centroid_of_polygon
-ZV_cat_x_cen=[]
-ZV_cat_y_cen=[]
-for JS_cat_tot in range(IS_cat_tot):
-     shape=nhd_cat_shp.shape(JS_cat_tot)
+IS_pnt=0
+ZV_xy=[]
+IV_prt=[]
+IV_ftr=[]
+for shape in nhd_cat_shp.iterShapes():
      #Current polygon feature in the shapefile
-     shpoints=shape.points
-     #Object with all vertices of the current polygon feature
-     IS_point=len(shpoints)
-     #Number of vertices in the current polygon feature
-     IV_idx=shape.parts
-     #Start indices for each part of the multipart polygon feature 
-     IS_part=len(IV_idx)
-     #Number of parts in the multipart polygon feature
-     IV_idx.append(IS_point)
-     #Add the total number of vertices to allow for looping from start to end
-     ZV_prt_area=[]
-     ZV_prt_x_cen=[]
-     ZV_prt_y_cen=[]
-     #area, longitude and latitude of each part of the multipart
-     for JS_part in range(IS_part):
-          #Start/end indices of the part in the multipart polygon shapefiles
-          IS_p_str=IV_idx[JS_part]
-          IS_p_end=IV_idx[JS_part+1]
-          #Area of each part in the multipart polygon shapefile:
-          ZS_area=0
-          for JS_point in range(IS_p_str,IS_p_end-1):
-               ZS_area += ( shpoints[JS_point  ][0]*shpoints[JS_point+1][1]    \
-                           -shpoints[JS_point+1][0]*shpoints[JS_point  ][1])
-          ZS_area += ( shpoints[IS_p_end-1][0]*shpoints[IS_p_str  ][1]         \
-                      -shpoints[IS_p_str  ][0]*shpoints[IS_p_end-1][1])
-          ZS_area /= 2
-          #Centroid of each part in the multipart polygon shapefile:
-          ZS_x=0
-          ZS_y=0
-          for JS_point in range(IS_p_str,IS_p_end-1):
-               ZS_x += ( shpoints[JS_point  ][0]+shpoints[JS_point+1][0] )     \
-                      *( shpoints[JS_point  ][0]*shpoints[JS_point+1][1]       \
-                        -shpoints[JS_point+1][0]*shpoints[JS_point  ][1])
-               ZS_y += ( shpoints[JS_point  ][1]+shpoints[JS_point+1][1] )     \
-                      *( shpoints[JS_point  ][0]*shpoints[JS_point+1][1]       \
-                        -shpoints[JS_point+1][0]*shpoints[JS_point  ][1])
-          ZS_x += ( shpoints[IS_p_end-1][0]+shpoints[IS_p_str  ][0] )          \
-                 *( shpoints[IS_p_end-1][0]*shpoints[IS_p_str  ][1]            \
-                   -shpoints[IS_p_str  ][0]*shpoints[IS_p_end-1][1])
-          ZS_y += ( shpoints[IS_p_end-1][1]+shpoints[IS_p_str  ][1] )          \
-                 *( shpoints[IS_p_end-1][0]*shpoints[IS_p_str  ][1]            \
-                   -shpoints[IS_p_str  ][0]*shpoints[IS_p_end-1][1])
-          ZS_x /= (ZS_area * 6.0)
-          ZS_y /= (ZS_area * 6.0)
-          #Append area and centroid coordinates of each part in the multipart:
-          ZV_prt_area.append(ZS_area)
-          ZV_prt_x_cen.append(ZS_x)
-          ZV_prt_y_cen.append(ZS_y)
-     #Calculate and append centroid coordinates of polygon in the shapefile:
-     ZS_cat_x_cen =sum([ZV_prt_area[i]*ZV_prt_x_cen[i] for i in range(IS_part)])
-     ZS_cat_x_cen /=sum(ZV_prt_area)
-     ZV_cat_x_cen.append(ZS_cat_x_cen)
-     ZS_cat_y_cen =sum([ZV_prt_area[i]*ZV_prt_y_cen[i] for i in range(IS_part)])
-     ZS_cat_y_cen /=sum(ZV_prt_area)
-     ZV_cat_y_cen.append(ZS_cat_y_cen)
+     IV_ftr.append(len(IV_prt))
+     #Index of the first part of the current polygon feature
+     IV_prt.extend([IS_pnt+IS_idx for IS_idx in shape.parts])
+     #Index of the first vertex of each part of the multipart polygon feature
+     ZV_xy.extend(shape.points)
+     IS_pnt=IS_pnt+len(shape.points)
+     #All vertices of the current polygon feature
+
+IV_prt.append(IS_pnt)
+IV_ftr.append(len(IV_prt)-1)
+#Total numbers of vertices and parts, following the last feature
+
+if len(IV_ftr)-1!=IS_cat_tot:
+     print('ERROR - Different number of shapes and records in '+nhd_cat_file)
+     raise SystemExit(22)
+
+ZM_xy=numpy.array(ZV_xy,dtype=numpy.float64).reshape(-1,2)
+ZV_x=ZM_xy[:,0].copy()
+ZV_y=ZM_xy[:,1].copy()
+IV_prt=numpy.array(IV_prt,dtype=numpy.int64)
+IV_ftr=numpy.array(IV_ftr,dtype=numpy.int64)
+del ZV_xy,ZM_xy
+#Flat arrays with the vertices of all polygon features, and offsets
+
+#-------------------------------------------------------------------------------
+#Computing centroids
+#-------------------------------------------------------------------------------
+print('- Compute centroids')
+
+ZV_prt_area,ZV_prt_x_cen,ZV_prt_y_cen=rrr_lib_geo.geo_pol(ZV_x,ZV_y,IV_prt)
+#Area and centroid coordinates of each part in the multipart polygons
+ZV_cat_area,ZV_cat_x_cen,ZV_cat_y_cen=rrr_lib_geo.geo_ftr(ZV_prt_area,         \
+                                                          ZV_prt_x_cen,        \
+                                                          ZV_prt_y_cen,IV_ftr)
+#Centroid coordinates of each polygon in the shapefile
+ZV_cat_x_cen=ZV_cat_x_cen.tolist()
+ZV_cat_y_cen=ZV_cat_y_cen.tolist()
 
 print('- Total number of catchments: '+str(IS_cat_tot))
 
@@ -8,6 +8,16 @@
 #this program dissolves all catchments into one polygon (without inner holes)
 #which is saved in the first shapefile, and its perimeter is saved in the second
 #shapefile. The attribute value is assigned as "pfaf_2" in the attribute table.
+#Large shapefiles are dissolved hierarchically: catchments are grouped in tiles
+#of a regular grid, the catchments of each tile are unified (possibly by several
+#processes), and the partial results are then merged pairwise with their
+#neighbors until only one remains. When all catchments fit in one tile (the
+#default for fewer than IS_grp catchments), they are unified at once and the
+#outputs are identical to those of a single union. Otherwise, the geometries are
+#normalized so that they do not depend on IS_grp or IS_cpu, but the first
+#vertex and the order of their rings differ from those of a single union: the
+#outputs are then only equal to those of a single union after normalization,
+#i.e. when compared using tst_cmp_shp.py with BS_nrm=True.
 #Author:
 #Cedric H. David, 2023-2023
 
@@ -16,9 +26,20 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
+import math
+import multiprocessing
+import numpy
+import shapely
 import shapely.geometry
 import shapely.ops
+import rrr_lib_vec
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_grp=10000    # approximate number of catchments unified at once in each tile
+IS_cpu=1        # number of processes used to unify tiles
 
 
 #*******************************************************************************
@@ -75,33 +96,78 @@ print('Dissolve input shapefile')
 #-------------------------------------------------------------------------------
 print('- Read shapefile')
 
-rrr_pol_lay=fiona.open(rrr_pol_shp, 'r')
-IS_pol_shp=len(rrr_pol_lay)
+IM_pol_fld,YV_pol_geo,IM_pol_met=rrr_lib_vec.vec_rea(rrr_pol_shp)
+IS_pol_shp=IM_pol_met['count']
 print(' . The number of features in shapefile is: '+str(IS_pol_shp))
 
+#-------------------------------------------------------------------------------
+#Group features in tiles
+#-------------------------------------------------------------------------------
+print('- Group features in tiles')
+
+IS_til=math.ceil(math.sqrt(IS_pol_shp/IS_grp))
+#Number of tiles along each direction
+ZM_pol_box=shapely.bounds(YV_pol_geo)
+ZV_pol_x=(ZM_pol_box[:,0]+ZM_pol_box[:,2])/2
+ZV_pol_y=(ZM_pol_box[:,1]+ZM_pol_box[:,3])/2
+IV_pol_til_x=numpy.minimum(((ZV_pol_x-ZV_pol_x.min())*IS_til                   \
+                            /max(numpy.ptp(ZV_pol_x),1e-12)).astype(int),      \
+                           IS_til-1)
+IV_pol_til_y=numpy.minimum(((ZV_pol_y-ZV_pol_y.min())*IS_til                   \
+                            /max(numpy.ptp(ZV_pol_y),1e-12)).astype(int),      \
+                           IS_til-1)
+IV_pol_til=IV_pol_til_y*IS_til                                                 \
+          +numpy.where(IV_pol_til_y%2==0,IV_pol_til_x,IS_til-1-IV_pol_til_x)
+#Tile of the center of the bounding box of each feature, the tiles being
+#numbered row after row in alternating directions so that consecutive tiles
+#are neighbors
+YV_til=[numpy.nonzero(IV_pol_til==JS_til)[0]                                   \
+        for JS_til in numpy.unique(IV_pol_til)]
+print(' . The number of tiles is: '+str(len(YV_til)))
+
 #-------------------------------------------------------------------------------
 #Unify all features into one
 #-------------------------------------------------------------------------------
 print('- Unify all features into one')
 
-all_pol_shy=[shapely.geometry.shape(rrr_pol_lay[JS_pol_shp]['geometry'])       \
-                                            for JS_pol_shp in range(IS_pol_shp)]
-
-rrr_dis_shy=shapely.ops.unary_union(all_pol_shy)
+def dis_til(IV_pol):
+     #Unifies the features of one tile
+     return shapely.ops.unary_union(list(YV_pol_geo[IV_pol]))
+
+def dis_two(YV_shy):
+     #Unifies two partial results
+     return shapely.ops.unary_union(YV_shy)
+
+if IS_cpu==1:
+     YV_shy=[dis_til(IV_pol) for IV_pol in YV_til]
+     while len(YV_shy)>1:
+          YV_shy=[dis_two(YV_shy[JS:JS+2]) for JS in range(0,len(YV_shy),2)]
+else:
+     with multiprocessing.get_context('fork').Pool(IS_cpu) as pool:
+          YV_shy=pool.map(dis_til,YV_til)
+          while len(YV_shy)>1:
+               YV_shy=pool.map(dis_two,[YV_shy[JS:JS+2]                        \
+                                        for JS in range(0,len(YV_shy),2)])
+     #Forked processes inherit the geometries of all features in memory
+print(' . The number of levels in reduction tree is: '                         \
+      +str(math.ceil(math.log2(len(YV_til)))))
+
+rrr_dis_shy=YV_shy[0]
 
 #-------------------------------------------------------------------------------
 #Only retain exterior
 #-------------------------------------------------------------------------------
 print('- Only retain exterior')
 
-if rrr_dis_shy.type=='Polygon':
+if rrr_dis_shy.geom_type=='Polygon':
      rrr_dis_shy=shapely.geometry.Polygon(rrr_dis_shy.exterior)
 
-if rrr_dis_shy.type=='MultiPolygon':
+if rrr_dis_shy.geom_type=='MultiPolygon':
      rrr_dis_shy=shapely.geometry.MultiPolygon(                                \
                 shapely.geometry.Polygon(p.exterior) for p in rrr_dis_shy.geoms)
 
-print(' . The dissolved catchment geometry is of type: '+rrr_dis_shy.type)
+print(' . The dissolved catchment geometry is of type: '                       \
+      +rrr_dis_shy.geom_type)
 
 #-------------------------------------------------------------------------------
 #Additional union in case of inner islands
@@ -109,6 +175,20 @@ print(' . The dissolved catchment geometry is of type: '+rrr_dis_shy.type)
 print('- Additional union in case of inner islands')
 rrr_dis_shy=shapely.ops.unary_union(rrr_dis_shy)
 
+#-------------------------------------------------------------------------------
+#Normalize geometry
+#-------------------------------------------------------------------------------
+print('- Normalize geometry')
+
+if len(YV_til)>1:
+     rrr_dis_shy=shapely.normalize(rrr_dis_shy)
+     print(' . The geometry was normalized')
+else:
+     print(' . The geometry of the single union was kept')
+#The order of rings and the first vertex of each ring depend on the order in
+#which tiles were unified, normalizing makes outputs identical for all values of
+#IS_grp and IS_cpu
+
 #-------------------------------------------------------------------------------
 #Get perimeter
 #-------------------------------------------------------------------------------
@@ -116,7 +196,8 @@ print('- Get perimeter')
 
 rrr_per_shy=rrr_dis_shy.boundary
 
-print(' . The dissolved perimeter geometry is of type: '+rrr_per_shy.type)
+print(' . The dissolved perimeter geometry is of type: '                       \
+      +rrr_per_shy.geom_type)
 
 
 #*******************************************************************************
@@ -125,58 +206,28 @@ print(' . The dissolved perimeter geometry is of type: '+rrr_per_shy.type)
 print('Creating dissolved shapefile')
 
 #-------------------------------------------------------------------------------
-#Copy Coordinate Reference System
-#-------------------------------------------------------------------------------
-print('- Copy Coordinate Reference System')
-
-rrr_pol_crs=rrr_pol_lay.crs
-rrr_dis_crs=rrr_pol_crs.copy()
-#print(rrr_dis_crs)
-
-#-------------------------------------------------------------------------------
-#Copy Schema
+#Copy Coordinate Reference System and Schema
 #-------------------------------------------------------------------------------
-print('- Copy Schema')
+print('- Copy Coordinate Reference System and Schema')
 
-rrr_pol_sch=rrr_pol_lay.schema
-rrr_dis_sch=rrr_pol_sch.copy()
-rrr_dis_sch['properties'].clear()
-rrr_dis_sch['properties']['pfaf_2']='str:2'
-#print(rrr_dis_sch)
+IM_dis_met={'crs_wkt':IM_pol_met['crs_wkt'],                                   \
+            'schema':{'geometry':IM_pol_met['schema']['geometry'],             \
+                      'properties':{'pfaf_2':'str:2'}}}
+#print(IM_dis_met)
 
 #-------------------------------------------------------------------------------
 #Copy Properties
 #-------------------------------------------------------------------------------
 print('- Copy Properties')
 
-rrr_dis_prp=rrr_pol_lay[0]['properties'].copy()
-rrr_dis_prp.clear()
-rrr_dis_prp['pfaf_2']=rrr_pff_str
-
-#-------------------------------------------------------------------------------
-#Copy Geometry
-#-------------------------------------------------------------------------------
-print('- Copy Geometry')
-
-rrr_dis_geo=shapely.geometry.mapping(rrr_dis_shy)
+IM_dis_fld={'pfaf_2':numpy.array([rrr_pff_str],dtype=object)}
 
 #-------------------------------------------------------------------------------
 #Create shapefile
 #-------------------------------------------------------------------------------
 print('- Create shapefile')
 
-rrr_dis_lay=fiona.open(rrr_dis_shp, 'w',                                       \
-                       crs=rrr_dis_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_dis_sch                                      \
-                       )
-
-rrr_dis_lay.write({                                                            \
-                        'properties': rrr_dis_prp,                             \
-                        'geometry': rrr_dis_geo,                               \
-                        })
-
-rrr_dis_lay.close()
+rrr_lib_vec.vec_wri(rrr_dis_shp,IM_dis_fld,[rrr_dis_shy],IM_dis_met)
 
 
 #*******************************************************************************
@@ -185,59 +236,28 @@ rrr_dis_lay.close()
 print('Creating perimeter shapefile')
 
 #-------------------------------------------------------------------------------
-#Copy Coordinate Reference System
-#-------------------------------------------------------------------------------
-print('- Copy Coordinate Reference System')
-
-rrr_pol_crs=rrr_pol_lay.crs
-rrr_per_crs=rrr_pol_crs.copy()
-#print(rrr_per_crs)
-
-#-------------------------------------------------------------------------------
-#Copy Schema
+#Copy Coordinate Reference System and Schema
 #-------------------------------------------------------------------------------
-print('- Copy Schema')
+print('- Copy Coordinate Reference System and Schema')
 
-rrr_pol_sch=rrr_pol_lay.schema
-rrr_per_sch=rrr_pol_sch.copy()
-rrr_per_sch['properties'].clear()
-rrr_per_sch['properties']['pfaf_2']='str:2'
-rrr_per_sch['geometry']=rrr_per_shy.type
-#print(rrr_per_sch)
+IM_per_met={'crs_wkt':IM_pol_met['crs_wkt'],                                   \
+            'schema':{'geometry':rrr_per_shy.geom_type,                        \
+                      'properties':{'pfaf_2':'str:2'}}}
+#print(IM_per_met)
 
 #-------------------------------------------------------------------------------
 #Copy Properties
 #-------------------------------------------------------------------------------
 print('- Copy Properties')
 
-rrr_per_prp=rrr_pol_lay[0]['properties'].copy()
-rrr_per_prp.clear()
-rrr_per_prp['pfaf_2']=rrr_pff_str
-
-#-------------------------------------------------------------------------------
-#Copy Geometry
-#-------------------------------------------------------------------------------
-print('- Copy Geometry')
-
-rrr_per_geo=shapely.geometry.mapping(rrr_per_shy)
+IM_per_fld={'pfaf_2':numpy.array([rrr_pff_str],dtype=object)}
 
 #-------------------------------------------------------------------------------
 #Create shapefile
 #-------------------------------------------------------------------------------
 print('- Create shapefile')
 
-rrr_per_lay=fiona.open(rrr_per_shp, 'w',                                       \
-                       crs=rrr_per_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_per_sch                                      \
-                       )
-
-rrr_per_lay.write({                                                            \
-                        'properties': rrr_per_prp,                             \
-                        'geometry': rrr_per_geo,                               \
-                        })
-
-rrr_per_lay.close()
+rrr_lib_vec.vec_wri(rrr_per_shp,IM_per_fld,[rrr_per_shy],IM_per_met)
 
 
 #*******************************************************************************
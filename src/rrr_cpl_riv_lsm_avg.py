@@ -10,6 +10,10 @@
 #desired percentage, and creates a copy of the previous file with the addition 
 #of the new partial values. If CF metadata are present, they are all copied, 
 #except for the long_name to which "estimate of error for " is appended.
+#The input file is read only once, by blocks of time steps that are aligned with
+#its chunks, and the new file is populated during that same pass. The average
+#and standard deviation are obtained by merging the statistics of each block
+#with those of the previous ones (Chan et al. 1979, generalizing Welford 1962).
 #Author:
 #Cedric H. David, 2016-2023
 
@@ -18,9 +22,16 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import shutil
 import netCDF4
 import numpy
+import rrr_lib_ens
+import rrr_lib_mmp
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_blk=16       # number of time steps read at once, rounded to the time chunks
 
 
 #*******************************************************************************
@@ -140,29 +151,85 @@ else:
      YV_cell_methods=None
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Computing average
+#Aligning blocks of time steps with chunks
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+YV_chk=f1.variables[YV_var].chunking()
+if YV_chk is not None and YV_chk!='contiguous':
+     IS_blk=max(IS_blk//YV_chk[0],1)*YV_chk[0]
+print('- The number of time steps read at once is: '+str(IS_blk))
+
+
+#*******************************************************************************
+#Creating netCDF file
+#*******************************************************************************
+print('Creating netCDF file')
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#Create netCDF file with the structure of the input file
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+print('- Creating netCDF file and copying all variables but '+YV_var)
+f2=rrr_lib_ens.ens_new(f1,rrr_lsm_file2,[YV_var],False,False)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#Create new variable
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+print('- Creating new variable')
+sm3_riv = f2.createVariable('sm3_riv',"f4",(YV_rivid,),fill_value=ZS_fill)
+#The new variable is defined before any time step is written so that the header
+#of netCDF3 files does not need to be moved past large amounts of data.
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#Add variable attributes
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-print('- Computing average')
+print('- Adding variable attributes')
+attdict={}
 
-ZV_vol_avg=numpy.empty(IS_riv_tot)
-for JS_lsm_time in range(IS_lsm_time):
-     ZV_vol_tmp=f1.variables[YV_var][JS_lsm_time,:]
-     ZV_vol_avg=ZV_vol_avg+ZV_vol_tmp
+if YV_long_name != None: attdict['long_name']='estimate of error for '         \
+                                             +YV_long_name
+if YV_units != None: attdict['units']=YV_units
+if YV_coordinates != None: attdict['coordinates']=YV_coordinates
+if YV_grid_mapping != None: attdict['grid_mapping']=YV_grid_mapping
+if YV_cell_methods != None: attdict['cell_methods']=YV_cell_methods
 
-ZV_vol_avg=ZV_vol_avg/IS_lsm_time
+sm3_riv.setncatts(attdict)
+#Setting multiple attributes at once helps decrease the writing time a lot.
+#It looks like otherwise the file is copied over and over each time otherwise.
+#This limitation may not exist if netCDF4 is used instead of netCDF3.
+
+
+#*******************************************************************************
+#Computing statistics while populating netCDF file
+#*******************************************************************************
+print('Computing statistics while populating netCDF file')
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Computing standard deviation
+#Computing average and standard deviation
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-print('- Computing standard deviation')
+print('- Computing average and standard deviation')
 
-ZV_vol_sdv=numpy.empty(IS_riv_tot)
-for JS_lsm_time in range(IS_lsm_time):
-     ZV_vol_tmp=f1.variables[YV_var][JS_lsm_time,:]
-     ZV_vol_sdv=ZV_vol_sdv+numpy.square(ZV_vol_tmp-ZV_vol_avg)
+ZM_vol_in,BS_mmp=rrr_lib_mmp.mmp_var(rrr_lsm_file1,f1,YV_var)
+if BS_mmp: print(' . Reading '+YV_var+' from the cache of '+rrr_lsm_file1)
 
-ZV_vol_sdv=ZV_vol_sdv/IS_lsm_time
-ZV_vol_sdv=numpy.sqrt(ZV_vol_sdv)
+IS_cnt=0
+ZV_vol_avg=numpy.zeros(IS_riv_tot)
+ZV_vol_M2=numpy.zeros(IS_riv_tot)
+for JS_lsm_time in range(0,IS_lsm_time,IS_blk):
+     JS_lsm_tend=min(JS_lsm_time+IS_blk,IS_lsm_time)
+     ZM_vol_tmp=ZM_vol_in[JS_lsm_time:JS_lsm_tend,:]
+     f2.variables[YV_var][JS_lsm_time:JS_lsm_tend,:]=ZM_vol_tmp
+
+     ZM_vol_tmp=numpy.ma.getdata(ZM_vol_tmp).astype(numpy.float64)
+     IS_blk_cnt=JS_lsm_tend-JS_lsm_time
+     ZV_blk_avg=ZM_vol_tmp.mean(axis=0)
+     ZV_blk_M2=numpy.square(ZM_vol_tmp-ZV_blk_avg).sum(axis=0)
+
+     ZV_vol_dlt=ZV_blk_avg-ZV_vol_avg
+     ZV_vol_avg=ZV_vol_avg+ZV_vol_dlt*IS_blk_cnt/(IS_cnt+IS_blk_cnt)
+     ZV_vol_M2=ZV_vol_M2+ZV_blk_M2                                             \
+              +numpy.square(ZV_vol_dlt)*IS_cnt*IS_blk_cnt/(IS_cnt+IS_blk_cnt)
+     IS_cnt=IS_cnt+IS_blk_cnt
+
+ZV_vol_sdv=numpy.sqrt(ZV_vol_M2/IS_lsm_time)
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Computing estimate of bias from average
@@ -217,56 +284,6 @@ ZS_vol_avg_rms=(sum([i**2 for i in ZV_vol_bia]))**0.5
 print(' . Estimate of error from square root of sum of squares: '              \
       +str(ZS_vol_avg_rms)+' m^3')
 
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Close file
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-f1.close()
-
-
-#*******************************************************************************
-#Copying netCDF file
-#*******************************************************************************
-print('Copying netCDF file')
-
-shutil.copyfile(rrr_lsm_file1,rrr_lsm_file2)
-
-print('- Done')
-
-
-#*******************************************************************************
-#Appending new netCDF file
-#*******************************************************************************
-print('Appending netCDF file')
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Open netCDF file
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-f2 = netCDF4.Dataset(rrr_lsm_file2, 'a')
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Create new variable
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-print('- Creating new variable')
-sm3_riv = f2.createVariable('sm3_riv',"f4",(YV_rivid,),fill_value=ZS_fill)
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Add variable attributes
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-print('- Adding variable attributes')
-attdict={}
-
-if YV_long_name != None: attdict['long_name']='estimate of error for '         \
-                                             +YV_long_name
-if YV_units != None: attdict['units']=YV_units
-if YV_coordinates != None: attdict['coordinates']=YV_coordinates
-if YV_grid_mapping != None: attdict['grid_mapping']=YV_grid_mapping
-if YV_cell_methods != None: attdict['cell_methods']=YV_cell_methods
-
-sm3_riv.setncatts(attdict)
-#Setting multiple attributes at once helps decrease the writing time a lot.
-#It looks like otherwise the file is copied over and over each time otherwise.
-#This limitation may not exist if netCDF4 is used instead of netCDF3.
-
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Populate new variable
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -274,8 +291,9 @@ print('- Populating new variable')
 sm3_riv[:]=ZV_vol_bia
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Close file
+#Close files
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+f1.close()
 f2.close()
 
 
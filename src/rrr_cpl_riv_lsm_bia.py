@@ -11,6 +11,9 @@
 #corrected. Note that all rivers in the network have to be included in the file
 #where they are sorted (no subbasin capability here). A common multiplying
 #factor is used for correcting runoff between the gauges that are used.
+#Alternatively, a small sidecar file that only includes the river reach
+#coordinates and the multiplying factors can be created instead of a new runoff
+#file.
 #Author:
 #Cedric H. David, 2021-2023
 
@@ -19,13 +22,20 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import shutil
 import csv
 import pandas
 import netCDF4
 import numpy
 from scipy.sparse import csc_matrix
 from scipy.sparse.linalg import spsolve
+import rrr_lib_ens
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+BS_sdc=False    # create a sidecar file with coordinates and factors only
+IS_blk=16       # number of time steps scaled at once, rounded to the chunks
 
 
 #*******************************************************************************
@@ -530,24 +540,37 @@ ZV_LAM=ZV_LAM[IV_riv_ix1]
 print(' . Done')
 
 #-------------------------------------------------------------------------------
-#Copying netCDF file
+#Creating netCDF file
 #-------------------------------------------------------------------------------
-print('- Copying netCDF file')
+f=netCDF4.Dataset(rrr_m3r_ncf, 'r')
 
-shutil.copyfile(rrr_m3r_ncf,rrr_m3b_ncf)
+if BS_sdc:
+     print('- Creating sidecar file with coordinates only')
+     g=rrr_lib_ens.ens_new(f,rrr_m3b_ncf,[],False,False,YV_time)
+else:
+     print('- Creating netCDF file and copying all variables but '+YV_var)
+     g=rrr_lib_ens.ens_new(f,rrr_m3b_ncf,[YV_var],False,False)
 
 print(' . Done')
 
 #-------------------------------------------------------------------------------
 #Scaling values in new netCDF file
 #-------------------------------------------------------------------------------
-print('- Scaling values in new netCDF file')
-
-g = netCDF4.Dataset(rrr_m3b_ncf, 'a')
-for JS_m3r_tim in range(IS_m3r_tim):
-     g.variables[YV_var][JS_m3r_tim,:]=g.variables[YV_var][JS_m3r_tim,:]       \
-                                      *ZV_LAM
+if BS_sdc:
+     print('- Adding multiplying factors in sidecar file')
+     m3_riv_lam=g.createVariable('m3_riv_lam','f8',(YV_rivid,))
+     attdict={}
+     if 'long_name' in f.variables[YV_var].ncattrs():
+          attdict['long_name']='multiplying factor for '                       \
+                              +f.variables[YV_var].long_name
+     attdict['units']='1'
+     m3_riv_lam.setncatts(attdict)
+     m3_riv_lam[:]=ZV_LAM
+else:
+     print('- Scaling values in new netCDF file')
+     rrr_lib_ens.ens_cpy(f,g,YV_var,YV_time,IS_blk,ZV_LAM)
 
+f.close()
 g.close()
 
 print(' . Done')
@@ -23,6 +23,7 @@ import sys
 import netCDF4
 import numpy
 import csv
+import rrr_lib_mmp
 
 
 #*******************************************************************************
@@ -329,6 +330,19 @@ else:
      raise SystemExit(22) 
      
 
+#*******************************************************************************
+#Preferring memory-mapped caches
+#*******************************************************************************
+print('Preferring memory-mapped caches')
+
+ZM_vol_in1,BS_mmp1=rrr_lib_mmp.mmp_var(rrr_mod_ncf,f1,YS_var1)
+if BS_mmp1: print('- Reading '+YS_var1+' from the cache of '+rrr_mod_ncf)
+ZM_vol_in2,BS_mmp2=rrr_lib_mmp.mmp_var(rrr_tru_ncf,f2,YS_var2)
+if BS_mmp2: print('- Reading '+YS_var2+' from the cache of '+rrr_tru_ncf)
+#The variables are read many times below, either from the caches written by
+#rrr_cpl_riv_lsm_mmp.py or from the netCDF files
+
+
 #*******************************************************************************
 #Creating hash table
 #*******************************************************************************
@@ -356,8 +370,8 @@ ZV_vol_av2=numpy.zeros(IS_riv_tot)
 ZV_vol_bia=numpy.zeros(IS_riv_tot)
 
 for JS_time in range(IS_time):
-     ZV_vol_in1=f1.variables[YS_var1][JS_time,:]*ZS_conv
-     ZV_vol_in2=f2.variables[YS_var2][JS_time,:]*ZS_conv
+     ZV_vol_in1=ZM_vol_in1[JS_time,:]*ZS_conv
+     ZV_vol_in2=ZM_vol_in2[JS_time,:]*ZS_conv
 
      ZV_vol_av1=ZV_vol_av1+ZV_vol_in1
      ZV_vol_av2=ZV_vol_av2+ZV_vol_in2
@@ -378,8 +392,8 @@ ZV_vol_sde=numpy.zeros(IS_riv_tot)
 ZV_vol_dmn=numpy.zeros(IS_time)
 
 for JS_time in range(IS_time):
-     ZV_vol_in1=f1.variables[YS_var1][JS_time,:]*ZS_conv
-     ZV_vol_in2=f2.variables[YS_var2][JS_time,:]*ZS_conv
+     ZV_vol_in1=ZM_vol_in1[JS_time,:]*ZS_conv
+     ZV_vol_in2=ZM_vol_in2[JS_time,:]*ZS_conv
 
      ZV_vol_dif=ZV_vol_in1-ZV_vol_in2
      #The current difference between the two values, i.e. the current error
@@ -519,8 +533,8 @@ if YS_opt=='incr':
           #A 1-D array with all downstream covariances for reach at JS_riv_tot
 
           for JS_time in range(IS_time):
-               ZV_vol_in1=f1.variables[YS_var1][JS_time,:]*ZS_conv
-               ZV_vol_in2=f2.variables[YS_var2][JS_time,:]*ZS_conv
+               ZV_vol_in1=ZM_vol_in1[JS_time,:]*ZS_conv
+               ZV_vol_in2=ZM_vol_in2[JS_time,:]*ZS_conv
 
                ZV_vol_dif=ZV_vol_in1-ZV_vol_in2
                ZV_vol_dev=ZV_vol_dif-ZV_vol_bia
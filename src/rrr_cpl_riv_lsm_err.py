@@ -10,7 +10,9 @@
 #for bias and one for square root of variance/covariance, this program creates a
 #netCDF file that is a copy of the initial netCDF that also includes estimates
 #of errors, which is to be used for uncertainty quantification and/or data
-#assimilation.
+#assimilation. Alternatively, a small sidecar file that only includes the river
+#reach coordinates and the estimates of errors can be created instead of a full
+#copy of the initial netCDF file.
 #Author:
 #Cedric H. David, 2018-2023
 
@@ -22,7 +24,14 @@ import sys
 import netCDF4
 import numpy
 import csv
-import shutil
+import rrr_lib_ens
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+BS_sdc=False    # create a sidecar file with coordinates and errors only
+IS_blk=16       # number of time steps copied at once, rounded to the chunks
 
 
 #*******************************************************************************
@@ -244,24 +253,21 @@ else:
      
 
 #*******************************************************************************
-#Copying netCDF file
+#Creating netCDF file
 #*******************************************************************************
-print('Copying netCDF file')
-
-shutil.copyfile(rrr_mod_ncf,rrr_err_ncf)
-
-print('- Done')
-
-
-#*******************************************************************************
-#Appending new netCDF file
-#*******************************************************************************
-print('Appending netCDF file')
+print('Creating netCDF file')
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Opening netCDF file
+#Opening netCDF files
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-f2 = netCDF4.Dataset(rrr_err_ncf, 'a')
+f1 = netCDF4.Dataset(rrr_mod_ncf, 'r')
+
+if BS_sdc:
+     print('- Creating sidecar file with coordinates only')
+     f2=rrr_lib_ens.ens_new(f1,rrr_err_ncf,[],False,False,YS_time)
+else:
+     print('- Creating netCDF file and copying all variables but '+YS_var)
+     f2=rrr_lib_ens.ens_new(f1,rrr_err_ncf,[YS_var],False,False)
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Creating new dimension
@@ -292,6 +298,13 @@ m3_riv_err.setncatts(attdict)
 #It looks like otherwise the file is copied over and over each time otherwise.
 #This limitation may not exist if netCDF4 is used instead of netCDF3.
 
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#Copying external inflow
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+if not BS_sdc:
+     print('- Copying '+YS_var)
+     rrr_lib_ens.ens_cpy(f1,f2,YS_var,YS_time,IS_blk,None)
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Populate new variable
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -303,8 +316,9 @@ for JS_riv_rad in range(IS_riv_rad):
      m3_riv_err[3+JS_riv_rad,:]=ZM_riv_tot_cvd[:,JS_riv_rad]
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Close file
+#Close files
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+f1.close()
 f2.close()
 
 
@@ -22,6 +22,7 @@ import sys
 import csv
 import netCDF4
 import numpy
+import rrr_lib_prf
 
 
 #*******************************************************************************
@@ -86,6 +87,7 @@ except IOError as e:
 #Read input files
 #*******************************************************************************
 print('Read input files')
+rrr_lib_prf.prf_sec('Read input files')
 
 #-------------------------------------------------------------------------------
 #Read connectivity file
@@ -158,6 +160,7 @@ for JS_lsm_lon in range(IS_lsm_lon):
 #Process data
 #*******************************************************************************
 print('Process data')
+rrr_lib_prf.prf_sec('Process data')
 
 #-------------------------------------------------------------------------------
 #Create hash table
@@ -207,6 +210,7 @@ for JS_riv_tot in range(IS_riv_tot):
 #Write outputs
 #*******************************************************************************
 print('Writing file')
+rrr_lib_prf.prf_sec('Writing file')
 
 with open(rrr_cpl_file, 'w') as csvfile:
      csvwriter = csv.writer(csvfile, dialect='excel')
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#rrr_cpl_riv_lsm_mmp.py
+#*******************************************************************************
+
+#Purpose:
+#Given a netCDF file with a variable referenced to a time dimension and a rivid
+#dimension (m3_riv, Qout, or V), this program writes a cache of the variable
+#next to the file. The cache is made of uncompressed little-endian raw files in
+#both time-major and reach-major orders, and of a small JSON header with rivid,
+#time, and the attributes of the variable (see rrr_lib_mmp.py). Programs that
+#read the variable many times (e.g., routing, bias correction, or analysis of
+#maps and time series) then read it through memory maps instead of the netCDF
+#file, as long as the file is not modified. The variable is streamed by blocks
+#of time steps so that memory use is bounded.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import netCDF4
+import rrr_lib_mmp
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_mem=2**29    # maximum size of the blocks of time steps copied (bytes)
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - rrr_ncf_in
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 2:
+     print('ERROR - 1 and only 1 argument can be used')
+     raise SystemExit(22)
+
+rrr_ncf_in=sys.argv[1]
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+rrr_ncf_in)
+
+
+#*******************************************************************************
+#Check if files exist
+#*******************************************************************************
+try:
+     with open(rrr_ncf_in) as file:
+          pass
+except IOError as e:
+     print('ERROR - Unable to open '+rrr_ncf_in)
+     raise SystemExit(22)
+
+
+#*******************************************************************************
+#Reading netCDF file
+#*******************************************************************************
+print('Reading netCDF file')
+
+#-------------------------------------------------------------------------------
+#Open netCDF file
+#-------------------------------------------------------------------------------
+f = netCDF4.Dataset(rrr_ncf_in, 'r')
+
+#-------------------------------------------------------------------------------
+#Get dimension sizes
+#-------------------------------------------------------------------------------
+if 'COMID' in f.dimensions:
+     YS_rivid='COMID'
+elif 'rivid' in f.dimensions:
+     YS_rivid='rivid'
+else:
+     print('ERROR - Neither COMID nor rivid exist in '+rrr_ncf_in)
+     raise SystemExit(22)
+
+IS_riv_tot=len(f.dimensions[YS_rivid])
+print('- The number of river reaches is: '+str(IS_riv_tot))
+
+if 'Time' in f.dimensions:
+     YS_time='Time'
+elif 'time' in f.dimensions:
+     YS_time='time'
+else:
+     print('ERROR - Neither Time nor time exist in '+rrr_ncf_in)
+     raise SystemExit(22)
+
+IS_time=len(f.dimensions[YS_time])
+print('- The number of time steps is: '+str(IS_time))
+
+#-------------------------------------------------------------------------------
+#Get variables
+#-------------------------------------------------------------------------------
+if 'm3_riv' in f.variables:
+     YS_var='m3_riv'
+elif 'Qout' in f.variables:
+     YS_var='Qout'
+elif 'V' in f.variables:
+     YS_var='V'
+else:
+     print('ERROR - m3_riv, Qout, or V are not variables in: '+rrr_ncf_in)
+     raise SystemExit(22)
+
+if f.variables[YS_var].dimensions!=(YS_time,YS_rivid):
+     print('ERROR - The dimensions of '+YS_var+' are not ('+YS_time+','        \
+           +YS_rivid+')')
+     raise SystemExit(22)
+
+print('- The variable that will be cached is: '+YS_var)
+
+
+#*******************************************************************************
+#Writing cache
+#*******************************************************************************
+print('Writing cache')
+
+rrr_lib_mmp.mmp_wri(f,rrr_ncf_in,YS_var,YS_rivid,YS_time,IS_mem)
+f.close()
+
+for rrr_mmp_fil in rrr_lib_mmp.mmp_fil(rrr_ncf_in):
+     print('- '+rrr_mmp_fil)
+
+print('- Done')
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#rrr_cpl_riv_lsm_rck.py
+#*******************************************************************************
+
+#Purpose:
+#Given a netCDF file with a variable referenced to a time dimension and a rivid
+#dimension (m3_riv, Qout, or V), the name of a new netCDF file, and optionally
+#the chunk sizes along time and rivid, this program creates a copy of the file
+#in which the variable is rechunked, compressed, and shuffled. The variable is
+#streamed by blocks of time steps so that memory use is bounded. If the chunk
+#sizes are not given, they are recommended based on read benchmarks performed
+#on a sample of the variable, balancing the reading of all river reaches for a
+#given time (maps) and that of all times for a given river reach (time series).
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import math
+import netCDF4
+import numpy
+import rrr_lib_ens
+import rrr_lib_ncf
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_cmp=1        # compression level (0 for no compression)
+BS_shf=True     # use the shuffle filter
+ZS_mix=0.5      # weight of map reads versus time series reads
+IS_smp_tim=64   # number of time steps in the benchmark sample
+IS_smp_riv=4096 # number of river reaches in the benchmark sample
+IS_read=10      # number of read operations in each benchmark
+IS_mem=2**29    # maximum size of the blocks of time steps copied (bytes)
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - rrr_ncf_in
+# 2 - rrr_ncf_out
+#(3)- IS_tim_chk
+#(4)- IS_riv_chk
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 3 and IS_arg != 5:
+     print('ERROR - 2 or 4 arguments must be used')
+     raise SystemExit(22)
+
+rrr_ncf_in=sys.argv[1]
+rrr_ncf_out=sys.argv[2]
+if IS_arg==5:
+     IS_tim_chk=int(sys.argv[3])
+     IS_riv_chk=int(sys.argv[4])
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+rrr_ncf_in)
+print('- '+rrr_ncf_out)
+if IS_arg==5:
+     print('- '+str(IS_tim_chk))
+     print('- '+str(IS_riv_chk))
+
+
+#*******************************************************************************
+#Check if files exist
+#*******************************************************************************
+try:
+     with open(rrr_ncf_in) as file:
+          pass
+except IOError as e:
+     print('ERROR - Unable to open '+rrr_ncf_in)
+     raise SystemExit(22)
+
+
+#*******************************************************************************
+#Reading netCDF file
+#*******************************************************************************
+print('Reading netCDF file')
+
+#-------------------------------------------------------------------------------
+#Open netCDF file
+#-------------------------------------------------------------------------------
+f = netCDF4.Dataset(rrr_ncf_in, 'r')
+
+if f.data_model!='NETCDF4':
+     print('ERROR - Chunking requires the NETCDF4 format, not '+f.data_model)
+     raise SystemExit(22)
+
+#-------------------------------------------------------------------------------
+#Get dimension sizes
+#-------------------------------------------------------------------------------
+if 'COMID' in f.dimensions:
+     YS_rivid='COMID'
+elif 'rivid' in f.dimensions:
+     YS_rivid='rivid'
+else:
+     print('ERROR - Neither COMID nor rivid exist in '+rrr_ncf_in)
+     raise SystemExit(22)
+
+IS_riv_tot=len(f.dimensions[YS_rivid])
+print('- The number of river reaches is: '+str(IS_riv_tot))
+
+if 'Time' in f.dimensions:
+     YS_time='Time'
+elif 'time' in f.dimensions:
+     YS_time='time'
+else:
+     print('ERROR - Neither Time nor time exist in '+rrr_ncf_in)
+     raise SystemExit(22)
+
+IS_time=len(f.dimensions[YS_time])
+print('- The number of time steps is: '+str(IS_time))
+
+#-------------------------------------------------------------------------------
+#Get variables
+#-------------------------------------------------------------------------------
+if 'm3_riv' in f.variables:
+     YS_var='m3_riv'
+elif 'Qout' in f.variables:
+     YS_var='Qout'
+elif 'V' in f.variables:
+     YS_var='V'
+else:
+     print('ERROR - m3_riv, Qout, or V are not variables in: '+rrr_ncf_in)
+     raise SystemExit(22)
+
+if f.variables[YS_var].dimensions!=(YS_time,YS_rivid):
+     print('ERROR - The dimensions of '+YS_var+' are not ('+YS_time+','        \
+           +YS_rivid+')')
+     raise SystemExit(22)
+
+IS_siz=f.variables[YS_var].dtype.itemsize
+print('- The variable that will be rechunked is: '+YS_var)
+print('- The current chunk sizes are: '+str(f.variables[YS_var].chunking()))
+
+
+#*******************************************************************************
+#Determining chunk sizes
+#*******************************************************************************
+print('Determining chunk sizes')
+
+if IS_arg==5:
+     print('- Using the chunk sizes given')
+else:
+     print('- Benchmarking reads on a sample of '+YS_var)
+     ZM_smp=f.variables[YS_var][0:min(IS_smp_tim,IS_time),                     \
+                                0:min(IS_smp_riv,IS_riv_tot)]
+     ZM_smp=numpy.ma.filled(ZM_smp,0)
+     ZS_ovh,ZS_val=rrr_lib_ncf.ncf_cal(ZM_smp,rrr_ncf_out+'.tmp',IS_cmp,       \
+                                       BS_shf,IS_read)
+     print(' . Overhead for accessing one chunk: '+str(ZS_ovh)+' s')
+     print(' . Cost of reading one value: '+str(ZS_val)+' s')
+     print('- Recommending chunk sizes')
+     IS_tim_chk,IS_riv_chk=rrr_lib_ncf.ncf_rec(IS_time,IS_riv_tot,IS_siz,      \
+                                               ZS_ovh,ZS_val,ZS_mix)
+
+IS_tim_chk=min(IS_tim_chk,IS_time)
+IS_riv_chk=min(IS_riv_chk,IS_riv_tot)
+print('- The new chunk sizes are: '+str([IS_tim_chk,IS_riv_chk]))
+
+
+#*******************************************************************************
+#Creating netCDF file
+#*******************************************************************************
+print('Creating netCDF file')
+
+IM_new={'chunksizes':(IS_tim_chk,IS_riv_chk),'zlib':IS_cmp>0,                  \
+        'complevel':max(IS_cmp,1),'shuffle':BS_shf}
+g=rrr_lib_ens.ens_new(f,rrr_ncf_out,[YS_var],False,False,None,IM_new)
+
+print('- Done')
+
+
+#*******************************************************************************
+#Copying variable by blocks of time steps
+#*******************************************************************************
+print('Copying variable by blocks of time steps')
+
+IS_blk=IS_tim_chk
+YV_chk=f.variables[YS_var].chunking()
+if YV_chk!='contiguous':
+     IS_blk=IS_blk*YV_chk[0]//math.gcd(IS_blk,YV_chk[0])
+#Blocks are aligned with both the old and the new chunks along time
+IS_blk=max(IS_mem//(IS_blk*IS_riv_tot*IS_siz),1)*IS_blk
+print('- The number of time steps copied at once is: '+str(IS_blk))
+
+for JS_time in range(0,IS_time,IS_blk):
+     JS_tend=min(JS_time+IS_blk,IS_time)
+     ZM_blk=f.variables[YS_var][JS_time:JS_tend,:]
+     g.variables[YS_var][JS_time:JS_tend,:]=ZM_blk
+
+f.close()
+g.close()
+
+print('- Done')
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
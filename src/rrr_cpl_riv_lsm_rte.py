@@ -11,6 +11,12 @@
 #ID file) is possible.
 #Optional arguments consisting of a Muskingum k file (.csv) and a water storage
 #file (.nc4) can allow for estimates of water storage.
+#If the name of the outflow file or of the water storage file ends with .zarr, a
+#Zarr store with the same variables and attributes is created instead, in which
+#values are written by blocks of time steps that are aligned with its chunks.
+#The water inflow can also be a Zarr store made by rrr_cpl_riv_lsm_vol.py if its
+#name ends with .zarr, in which case it is read by blocks of time steps that are
+#aligned with its chunks.
 #Author:
 #Cedric H. David, 2022-2023
 
@@ -26,6 +32,18 @@ import netCDF4
 import datetime
 import subprocess
 import os.path
+import numpy
+import rrr_lib_prf
+import rrr_lib_zar
+import rrr_lib_mmp
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IV_chk=None     # chunk sizes (time,rivid) of Qout and V, None for the defaults
+IS_cmp=0        # compression level of Qout and V (0 for no compression)
+BS_shf=False    # use the shuffle filter for Qout and V
 
 
 #*******************************************************************************
@@ -72,10 +90,15 @@ if IS_arg > 5: print('- ' + rrr_Vmu_ncf)
 #*******************************************************************************
 #Check if files exist 
 #*******************************************************************************
+BS_m3r_zar=rrr_m3r_ncf.rstrip('/').endswith('.zarr')
+
 try:
-     with open(rrr_m3r_ncf) as file:
-          pass
-except IOError as e:
+     if BS_m3r_zar:
+          rrr_lib_zar.zar_opn(rrr_m3r_ncf,'r')
+     else:
+          with open(rrr_m3r_ncf) as file:
+               pass
+except (IOError,ValueError) as e:
      print('ERROR - Unable to open '+rrr_m3r_ncf)
      raise SystemExit(22) 
 
@@ -106,6 +129,7 @@ if IS_arg > 5:
 #Reading connectivity file
 #*******************************************************************************
 print('Reading connectivity file')
+rrr_lib_prf.prf_sec('Reading connectivity file')
 
 IV_riv_tot_id=[]
 IV_riv_tot_dn=[]
@@ -123,6 +147,7 @@ print('- Number of river reaches in rrr_con_csv: '+str(IS_riv_tot))
 #Reading basin file
 #*******************************************************************************
 print('Reading basin file')
+rrr_lib_prf.prf_sec('Reading basin file')
 
 IV_riv_bas_id=[]
 with open(rrr_bas_csv,'r') as csvfile:
@@ -138,6 +163,7 @@ print('- Number of river reaches in rrr_bas_csv: '+str(IS_riv_bas))
 #Creating hash tables
 #*******************************************************************************
 print('Creating hash tables')
+rrr_lib_prf.prf_sec('Creating hash tables')
 
 IM_hsh_tot={}
 for JS_riv_tot in range(IS_riv_tot):
@@ -161,6 +187,7 @@ print('- Hash tables created')
 #Creating network matrix
 #*******************************************************************************
 print('Creating network matrix')
+rrr_lib_prf.prf_sec('Creating network matrix')
 
 IV_row=[]
 IV_col=[]
@@ -183,6 +210,7 @@ print('  . Total number of connections: '+str(len(IV_val)))
 #Creating identity matrix
 #*******************************************************************************
 print('Creating identity matrix')
+rrr_lib_prf.prf_sec('Creating identity matrix')
 
 IV_row=range(IS_riv_bas)
 IV_col=range(IS_riv_bas)
@@ -196,19 +224,29 @@ print('- Done')
 #Creating Qout netCDF file
 #*******************************************************************************
 print('Creating Qout netCDF file')
+rrr_lib_prf.prf_sec('Creating Qout netCDF file')
 
 #-------------------------------------------------------------------------------
 #Creating structure
 #-------------------------------------------------------------------------------
 print('- Creating structure')
-g = netCDF4.Dataset(rrr_Qou_ncf, "w", format="NETCDF4")
+BS_Qou_zar=rrr_Qou_ncf.rstrip('/').endswith('.zarr')
+if BS_Qou_zar:
+     rrr_lib_zar.zar_imp()
+     g = netCDF4.Dataset(rrr_Qou_ncf, "w", format="NETCDF4", diskless=True,    \
+                         persist=False)
+     #The structure of Zarr stores is first made in memory
+else:
+     g = netCDF4.Dataset(rrr_Qou_ncf, "w", format="NETCDF4")
 
 time = g.createDimension("time", None)
 rivid = g.createDimension("rivid", IS_riv_tot)
 nv = g.createDimension("nv", 2)
 
 Qout = g.createVariable("Qout","f4",("time","rivid",),                         \
-                        fill_value=float(1e20))
+                        fill_value=float(1e20),                                \
+                        zlib=IS_cmp>0,complevel=max(IS_cmp,1),                 \
+                        shuffle=BS_shf,chunksizes=IV_chk)
 rivid = g.createVariable("rivid","i4",("rivid",))
 time = g.createVariable("time","i4",("time",))
 time_bnds = g.createVariable("time_bnds","i4",("time","nv",))
@@ -279,53 +317,63 @@ crs.inverse_flattening=''
 #Reading rrr_m3r_ncf and computing lumped discharge
 #*******************************************************************************
 print('Reading rrr_m3r_ncf and computing lumped discharge')
+rrr_lib_prf.prf_sec('Reading rrr_m3r_ncf and computing lumped discharge')
 
-f=netCDF4.Dataset(rrr_m3r_ncf, 'r')
+if BS_m3r_zar:
+     f=rrr_lib_zar.zar_opn(rrr_m3r_ncf,'r')
+     IM_m3r_dim=rrr_lib_zar.zar_dim(f)
+     YM_m3r_var={YS_var:f[YS_var] for YS_var in f.array_keys()}
+else:
+     f=netCDF4.Dataset(rrr_m3r_ncf, 'r')
+     IM_m3r_dim={YS_dim:len(dim) for YS_dim,dim in f.dimensions.items()}
+     YM_m3r_var=f.variables
+#Dimension sizes and variables are given in the same way for both netCDF files
+#and Zarr stores
 
 #-------------------------------------------------------------------------------
 #Dimensions
 #-------------------------------------------------------------------------------
-if 'COMID' in f.dimensions:
+if 'COMID' in IM_m3r_dim:
      YS_rivid='COMID'
-elif 'rivid' in f.dimensions:
+elif 'rivid' in IM_m3r_dim:
      YS_rivid='rivid'
 else:
      print('ERROR - Neither COMID nor rivid exist in '+rrr_m3r_ncf)
      raise SystemExit(22) 
 
-IS_m3r_tot=len(f.dimensions[YS_rivid])
+IS_m3r_tot=IM_m3r_dim[YS_rivid]
 print('- The number of river reaches is: '+str(IS_m3r_tot))
 
-if 'Time' in f.dimensions:
+if 'Time' in IM_m3r_dim:
      YS_time='Time'
-elif 'time' in f.dimensions:
+elif 'time' in IM_m3r_dim:
      YS_time='time'
 else:
      print('ERROR - Neither Time nor time exist in '+rrr_m3r_ncf)
      raise SystemExit(22) 
 
-IS_m3r_tim=len(f.dimensions[YS_time])
+IS_m3r_tim=IM_m3r_dim[YS_time]
 print('- The number of time steps is: '+str(IS_m3r_tim))
 
 #-------------------------------------------------------------------------------
 #Variables
 #-------------------------------------------------------------------------------
-if 'm3_riv' in f.variables:
+if 'm3_riv' in YM_m3r_var:
      YS_var='m3_riv'
 else:
      print('ERROR - m3_riv does not exist in '+rrr_m3r_ncf)
      raise SystemExit(22) 
 
-if YS_rivid in f.variables:
-     IV_m3r_tot_id=list(f.variables[YS_rivid])
+if YS_rivid in YM_m3r_var:
+     IV_m3r_tot_id=list(YM_m3r_var[YS_rivid][:])
      if IV_m3r_tot_id==IV_riv_tot_id:
           print('- The river IDs in rrr_m3r_ncf and rrr_con_csv are the same')
      else:
           print('ERROR - The river IDs in rrr_m3r_ncf and rrr_con_csv differ')
           raise SystemExit(22) 
 
-if YS_time in f.variables:
-     ZS_TaR=f.variables[YS_time][1]-f.variables[YS_time][0]
+if YS_time in YM_m3r_var:
+     ZS_TaR=YM_m3r_var[YS_time][1]-YM_m3r_var[YS_time][0]
      print('- The time step in rrr_m3r_ncf was determined as: '+str(ZS_TaR)+   \
            ' seconds')
 else:
@@ -333,35 +381,65 @@ else:
      print('- No time variables in rrr_m3r_ncf, using default of : '           \
             +str(ZS_TaR)+' seconds')
 
+#-------------------------------------------------------------------------------
+#Populating static data
+#-------------------------------------------------------------------------------
+print('- Populating static data')
+
+rivid[:]=YM_m3r_var[YS_rivid][:][IV_riv_ix2]
+lon[:]=YM_m3r_var['lon'][:][IV_riv_ix2]
+lat[:]=YM_m3r_var['lat'][:][IV_riv_ix2]
+time[:]=YM_m3r_var['time'][:]
+time_bnds[:]=YM_m3r_var['time_bnds'][:]
+
+if BS_Qou_zar:
+     print('- Creating Zarr store')
+     g_zar=rrr_lib_zar.zar_new(g,rrr_Qou_ncf,['Qout'],IS_m3r_tim,              \
+                               {'chunksizes':IV_chk})
+     print(' . The chunk sizes of Qout are: '+str(g_zar['Qout'].chunks))
+     IS_blk=g_zar['Qout'].chunks[0]
+     ZM_Qou_blk=numpy.empty((IS_blk,IS_riv_tot),dtype=numpy.float32)
+     #Block of time steps written at once, made of whole chunks
+
 #-------------------------------------------------------------------------------
 #Computing matrix-based lumped routing
 #-------------------------------------------------------------------------------
 print('- Computing matrix-based lumped routing')
 
+if BS_m3r_zar:
+     ZM_m3r=YM_m3r_var[YS_var]
+     IS_m3r_blk=ZM_m3r.chunks[0]
+     print(' . Reading '+YS_var+' by blocks of '+str(IS_m3r_blk)+' time steps')
+     #Each chunk is decompressed only once
+else:
+     ZM_m3r,BS_mmp=rrr_lib_mmp.mmp_var(rrr_m3r_ncf,f,YS_var)
+     if BS_mmp: print(' . Reading '+YS_var+' from the cache of '+rrr_m3r_ncf)
+     IS_m3r_blk=1
+
 for JS_m3r_tim in range(IS_m3r_tim):
-     ZV_m3r_ttt=f.variables[YS_var][JS_m3r_tim,:]
+     if JS_m3r_tim%IS_m3r_blk==0:
+          ZM_m3r_blk=ZM_m3r[JS_m3r_tim:JS_m3r_tim+IS_m3r_blk,:]
+          rrr_lib_prf.prf_byt('read',ZM_m3r_blk.nbytes)
+     ZV_m3r_ttt=ZM_m3r_blk[JS_m3r_tim%IS_m3r_blk,:]
      ZV_m3r_tmp=ZV_m3r_ttt[IV_riv_ix2]
      ZV_Qex_tmp=ZV_m3r_tmp/ZS_TaR
      ZV_Qou_lum=spsolve(ZM_I-ZM_Net,ZV_Qex_tmp)
-     Qout[JS_m3r_tim,:]=ZV_Qou_lum
+     if BS_Qou_zar:
+          JS_blk=JS_m3r_tim%IS_blk
+          ZM_Qou_blk[JS_blk,:]=ZV_Qou_lum
+          if JS_blk==IS_blk-1 or JS_m3r_tim==IS_m3r_tim-1:
+               rrr_lib_zar.zar_wri(rrr_Qou_ncf,'Qout',JS_m3r_tim-JS_blk,       \
+                                   ZM_Qou_blk[:JS_blk+1,:])
+     else:
+          Qout[JS_m3r_tim,:]=ZV_Qou_lum
+     rrr_lib_prf.prf_byt('write',ZV_Qou_lum.size*Qout.dtype.itemsize)
 
 print(' . Done')
 
-#-------------------------------------------------------------------------------
-#Populating static data
-#-------------------------------------------------------------------------------
-print('- Populating static data')
-
-rivid[:]=f.variables[YS_rivid][IV_riv_ix2]
-lon[:]=f.variables['lon'][IV_riv_ix2]
-lat[:]=f.variables['lat'][IV_riv_ix2]
-time[:]=f.variables['time'][:]
-time_bnds[:]=f.variables['time_bnds'][:]
-
 #-------------------------------------------------------------------------------
 #Closing all netCDF files
 #-------------------------------------------------------------------------------
-f.close()
+if not BS_m3r_zar: f.close()
 g.close()
 
 
@@ -370,6 +448,7 @@ g.close()
 #*******************************************************************************
 if IS_arg >5:
      print('Reading rrr_kmu_csv')
+     rrr_lib_prf.prf_sec('Reading rrr_kmu_csv')
 
      ZV_kmu_tmp=[]
      with open(rrr_kmu_csv,'r') as csvfile:
@@ -386,19 +465,29 @@ if IS_arg >5:
 #*******************************************************************************
 if IS_arg >5:
      print('Creating V netCDF file')
+     rrr_lib_prf.prf_sec('Creating V netCDF file')
 
      #--------------------------------------------------------------------------
      #Creating structure
      #--------------------------------------------------------------------------
      print('- Creating structure')
-     h = netCDF4.Dataset(rrr_Vmu_ncf, "w", format="NETCDF4")
+     BS_Vmu_zar=rrr_Vmu_ncf.rstrip('/').endswith('.zarr')
+     if BS_Vmu_zar:
+          rrr_lib_zar.zar_imp()
+          h = netCDF4.Dataset(rrr_Vmu_ncf, "w", format="NETCDF4",              \
+                              diskless=True, persist=False)
+          #The structure of Zarr stores is first made in memory
+     else:
+          h = netCDF4.Dataset(rrr_Vmu_ncf, "w", format="NETCDF4")
 
      time = h.createDimension("time", None)
      rivid = h.createDimension("rivid", IS_riv_tot)
      nv = h.createDimension("nv", 2)
 
      V = h.createVariable("V","f4",("time","rivid",),                          \
-                             fill_value=float(1e20))
+                             fill_value=float(1e20),                           \
+                             zlib=IS_cmp>0,complevel=max(IS_cmp,1),            \
+                             shuffle=BS_shf,chunksizes=IV_chk)
      rivid = h.createVariable("rivid","i4",("rivid",))
      time = h.createVariable("time","i4",("time",))
      time_bnds = h.createVariable("time_bnds","i4",("time","nv",))
@@ -472,38 +561,59 @@ if IS_arg >5:
 #*******************************************************************************
 if IS_arg >5:
      print('Reading rrr_Qou_ncf and computing storage')
+     rrr_lib_prf.prf_sec('Reading rrr_Qou_ncf and computing storage')
+
+     if BS_Qou_zar:
+          g=rrr_lib_zar.zar_opn(rrr_Qou_ncf,'r')
+     else:
+          g=netCDF4.Dataset(rrr_Qou_ncf, 'r')
+     #Variables are given by g[...] for both netCDF files and Zarr stores
 
-     g=netCDF4.Dataset(rrr_Qou_ncf, 'r')
+     IS_Qou_tim=g['time'].shape[0]
+
+     #--------------------------------------------------------------------------
+     #Populating static data
+     #--------------------------------------------------------------------------
+     print('- Populating static data')
 
-     IS_Qou_tim=len(g.dimensions['time'])
+     rivid[:]=g['rivid'][:]
+     lon[:]=g['lon'][:]
+     lat[:]=g['lat'][:]
+     time[:]=g['time'][:]
+     time_bnds[:]=g['time_bnds'][:]
+
+     if BS_Vmu_zar:
+          print('- Creating Zarr store')
+          h_zar=rrr_lib_zar.zar_new(h,rrr_Vmu_ncf,['V'],IS_Qou_tim,            \
+                                    {'chunksizes':IV_chk})
+          print(' . The chunk sizes of V are: '+str(h_zar['V'].chunks))
+          IS_blk=h_zar['V'].chunks[0]
+          #Blocks of time steps written at once, made of whole chunks
+     else:
+          IS_blk=1
 
      #--------------------------------------------------------------------------
      #Computing storage
      #-------------------------------------------------------------------------
      print('- Computing storage')
 
-     for JS_Qou_tim in range(IS_Qou_tim):
-          ZV_Vmu_tmp=g.variables['Qout'][JS_Qou_tim,:]
-          ZV_Vmu_tmp=ZV_Vmu_tmp*ZV_kmu
-          V[JS_Qou_tim,:]=ZV_Vmu_tmp
+     for JS_Qou_tim in range(0,IS_Qou_tim,IS_blk):
+          JS_Qou_end=min(JS_Qou_tim+IS_blk,IS_Qou_tim)
+          ZM_Vmu_tmp=g['Qout'][JS_Qou_tim:JS_Qou_end,:]
+          rrr_lib_prf.prf_byt('read',ZM_Vmu_tmp.nbytes)
+          ZM_Vmu_tmp=ZM_Vmu_tmp*ZV_kmu
+          if BS_Vmu_zar:
+               rrr_lib_zar.zar_wri(rrr_Vmu_ncf,'V',JS_Qou_tim,ZM_Vmu_tmp)
+          else:
+               V[JS_Qou_tim:JS_Qou_end,:]=ZM_Vmu_tmp
+          rrr_lib_prf.prf_byt('write',ZM_Vmu_tmp.size*V.dtype.itemsize)
 
      print(' . Done')
 
-     #--------------------------------------------------------------------------
-     #Populating static data
-     #--------------------------------------------------------------------------
-     print('- Populating static data')
-
-     rivid[:]=g.variables['rivid'][:]
-     lon[:]=g.variables['lon'][:]
-     lat[:]=g.variables['lat'][:]
-     time[:]=g.variables['time'][:]
-     time_bnds[:]=g.variables['time_bnds'][:]
-
      #--------------------------------------------------------------------------
      #Closing all netCDF files
      #--------------------------------------------------------------------------
-     g.close()
+     if not BS_Qou_zar: g.close()
      h.close()
 
 
@@ -17,6 +17,9 @@
 #   . crs
 #Note that the runoff file is assumed to have units of mm. That is, it contains
 #an equivalent water height accumulated over the runoff time step.
+#If the name of the inflow file ends with .zarr, a Zarr store with the same
+#variables and attributes is created instead, and m3_riv is written by blocks of
+#time steps that are aligned with its chunks, possibly by several processes.
 #Author:
 #Cedric H. David, 2011-2023
 
@@ -32,6 +35,18 @@ import calendar
 import os.path
 import subprocess
 import numpy
+import multiprocessing
+import rrr_lib_prf
+import rrr_lib_zar
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IV_chk=None     # chunk sizes (time,rivid) of m3_riv, None for the defaults
+IS_cmp=0        # compression level of m3_riv (0 for no compression)
+BS_shf=False    # use the shuffle filter for m3_riv
+IS_cpu=1        # number of processes writing m3_riv to Zarr stores
 
 
 #*******************************************************************************
@@ -106,6 +121,7 @@ except IOError as e:
 #Read inputs
 #*******************************************************************************
 print('Read inputs')
+rrr_lib_prf.prf_sec('Read inputs')
 
 #-------------------------------------------------------------------------------
 #Read connectivity file
@@ -254,12 +270,20 @@ print(' . IDs are the same')
 #Process data
 #*******************************************************************************
 print('Process data')
+rrr_lib_prf.prf_sec('Process data')
 
 #-------------------------------------------------------------------------------
 #Create netCDF file
 #-------------------------------------------------------------------------------
 print('- Create netCDF file')
-g = netCDF4.Dataset(rrr_vol_file, "w", format="NETCDF4")
+BS_zar=rrr_vol_file.rstrip('/').endswith('.zarr')
+if BS_zar:
+     rrr_lib_zar.zar_imp()
+     g = netCDF4.Dataset(rrr_vol_file, "w", format="NETCDF4", diskless=True,   \
+                         persist=False)
+     #The structure of Zarr stores is first made in memory
+else:
+     g = netCDF4.Dataset(rrr_vol_file, "w", format="NETCDF4")
 
 ZS_fill_m3_riv=float(1e20)
 
@@ -268,7 +292,9 @@ rivid = g.createDimension("rivid", IS_riv_tot)
 nv = g.createDimension("nv", 2)
 
 m3_riv = g.createVariable("m3_riv","f4",("time","rivid",),                     \
-                         fill_value=ZS_fill_m3_riv)
+                         fill_value=ZS_fill_m3_riv,                            \
+                         zlib=IS_cmp>0,complevel=max(IS_cmp,1),                \
+                         shuffle=BS_shf,chunksizes=IV_chk)
 rivid = g.createVariable("rivid","i4",("rivid",))
 time = g.createVariable("time","i4",("time",))
 time_bnds = g.createVariable("time_bnds","i4",("time","nv",))
@@ -346,6 +372,15 @@ rivid[:]=IV_riv_tot_id[:]
 lon[:]=ZV_lon[:]
 lat[:]=ZV_lat[:]
 #from the coordinate file
+time[:]=f.variables['time'][:]
+time_bnds[:]=f.variables['time_bnds'][:]
+#From the LSM netCDF file
+
+if BS_zar:
+     print('- Create Zarr store')
+     h=rrr_lib_zar.zar_new(g,rrr_vol_file,['m3_riv'],IS_lsm_time,              \
+                           {'chunksizes':IV_chk})
+     print('  . The chunk sizes of m3_riv are: '+str(h['m3_riv'].chunks))
 
 #-------------------------------------------------------------------------------
 #Read through LSM data to compute/populate dynamic data
@@ -362,13 +397,9 @@ IV_riv_j_index=[j-1 for j in IV_riv_j_index]
 #Shift from 1-based to 0-based indexing, places with new index -1 have already 
 #been checked for null area anyway
 
-for JS_lsm_time in range(IS_lsm_time):
-     if IS_lsm_time >=100:
-          IS_lsm_percent=int(IS_lsm_time/100)+(IS_lsm_time%100>0)
-          #rounds UP the value of IS_lsm_time/100
-          if JS_lsm_time % IS_lsm_percent == 0:
-               print(' . Completed '+str(int(JS_lsm_time/IS_lsm_percent))+'%')
-               #show progress in percent
+def vol_stp(JS_lsm_time):
+     #Returns the volumes of all river reaches at one time step, and the number
+     #of bytes read.
      ZM_lsm_runsf=f.variables['RUNSF'][JS_lsm_time][:][:]
      ZM_lsm_runsb=f.variables['RUNSB'][JS_lsm_time][:][:]
      #The netCDF data are stored following: f.variables[var][time][lat][lon]
@@ -383,19 +414,69 @@ for JS_lsm_time in range(IS_lsm_time):
      if isinstance(ZV_riv_vol,numpy.ma.MaskedArray):
           ZV_riv_vol=ZV_riv_vol.filled(0)
      #Make sure the masked values are replaced by 0
-     m3_riv[JS_lsm_time,:]=ZV_riv_vol[:]
-     #The netCDF data are stored following: g.variables[m3_riv][time][rivid]
-print(' . Completed 100%')
-
-time[:]=f.variables['time'][:]
-time_bnds[:]=f.variables['time_bnds'][:]
-#From the LSM netCDF file
+     return ZV_riv_vol,ZM_lsm_runsf.nbytes+ZM_lsm_runsb.nbytes
+
+def vol_ini():
+     #Opens the LSM file in each process, as netCDF handles cannot be shared
+     #between processes.
+     global f
+     f=netCDF4.Dataset(rrr_lsm_file,'r')
+
+def vol_blk(JS_time):
+     #Writes the block of time steps starting at JS_time to the Zarr store, and
+     #returns the number of bytes read.
+     JS_tend=min(JS_time+IS_blk,IS_lsm_time)
+     ZM_blk=numpy.empty((JS_tend-JS_time,IS_riv_tot),dtype=numpy.float32)
+     IS_byt=0
+     for JS_lsm_time in range(JS_time,JS_tend):
+          ZM_blk[JS_lsm_time-JS_time,:],IS_red=vol_stp(JS_lsm_time)
+          IS_byt=IS_byt+IS_red
+     rrr_lib_zar.zar_wri(rrr_vol_file,'m3_riv',JS_time,ZM_blk)
+     return IS_byt
+
+if not BS_zar:
+     for JS_lsm_time in range(IS_lsm_time):
+          if IS_lsm_time >=100:
+               IS_lsm_percent=int(IS_lsm_time/100)+(IS_lsm_time%100>0)
+               #rounds UP the value of IS_lsm_time/100
+               if JS_lsm_time % IS_lsm_percent == 0:
+                    print(' . Completed '                                      \
+                          +str(int(JS_lsm_time/IS_lsm_percent))+'%')
+                    #show progress in percent
+          ZV_riv_vol,IS_red=vol_stp(JS_lsm_time)
+          rrr_lib_prf.prf_byt('read',IS_red)
+          m3_riv[JS_lsm_time,:]=ZV_riv_vol[:]
+          rrr_lib_prf.prf_byt('write',ZV_riv_vol.size*m3_riv.dtype.itemsize)
+          #The netCDF data are stored following: m3_riv[time][rivid]
+     print(' . Completed 100%')
+else:
+     IS_blk=h['m3_riv'].chunks[0]
+     #Each block is made of whole chunks so that blocks are written separately
+     IV_blk=range(0,IS_lsm_time,IS_blk)
+     if IS_cpu==1:
+          YV_red=map(vol_blk,IV_blk)
+     else:
+          print(' . Writing blocks with '+str(IS_cpu)+' processes')
+          f.close()
+          pool=multiprocessing.get_context('fork').Pool(IS_cpu,vol_ini)
+          YV_red=pool.imap(vol_blk,IV_blk)
+     for JS_blk,IS_red in enumerate(YV_red):
+          JS_tend=min((JS_blk+1)*IS_blk,IS_lsm_time)
+          print(' . Completed '+str(int(100*JS_tend/IS_lsm_time))+'%')
+          rrr_lib_prf.prf_byt('read',IS_red)
+          rrr_lib_prf.prf_byt('write',(JS_tend-JS_blk*IS_blk)*IS_riv_tot       \
+                                     *h['m3_riv'].dtype.itemsize)
+     if IS_cpu!=1:
+          pool.close()
+          pool.join()
+          vol_ini()
 
 
 #*******************************************************************************
 #Close the netCDF file
 #*******************************************************************************
 print('Close all netCDF files')
+rrr_lib_prf.prf_sec('Close all netCDF files')
 
 f.close()
 #Not sure if that does anything
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#rrr_cpl_riv_lsm_zar.py
+#*******************************************************************************
+
+#Purpose:
+#Given a netCDF file with a variable referenced to a time dimension and a rivid
+#dimension (m3_riv, Qout, or V), the name of a new Zarr store (ending in .zarr),
+#and optionally the chunk sizes along time and rivid, this program creates a
+#Zarr store with the same dimensions, variables and attributes. The conversion
+#also works the other way when the first argument is a Zarr store and the
+#second one is a netCDF file, in which case the chunk sizes of the store are
+#kept unless others are given. The variable is copied by blocks of time steps
+#that are aligned with the chunks so that memory use is bounded, and blocks
+#can be written to Zarr stores by several processes at the same time. If the
+#chunk sizes are not given, they are recommended by rrr_lib_zar.zar_rec().
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import math
+import multiprocessing
+import netCDF4
+import rrr_lib_zar
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_cmp=1        # compression level (0 for no compression)
+BS_shf=True     # use the shuffle filter
+IS_mem=2**29    # maximum size of the blocks of time steps copied (bytes)
+IS_cpu=1        # number of processes writing blocks to Zarr stores
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - rrr_cnv_in
+# 2 - rrr_cnv_out
+#(3)- IS_tim_chk
+#(4)- IS_riv_chk
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 3 and IS_arg != 5:
+     print('ERROR - 2 or 4 arguments must be used')
+     raise SystemExit(22)
+
+rrr_cnv_in=sys.argv[1]
+rrr_cnv_out=sys.argv[2]
+if IS_arg==5:
+     IS_tim_chk=int(sys.argv[3])
+     IS_riv_chk=int(sys.argv[4])
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+rrr_cnv_in)
+print('- '+rrr_cnv_out)
+if IS_arg==5:
+     print('- '+str(IS_tim_chk))
+     print('- '+str(IS_riv_chk))
+
+
+#*******************************************************************************
+#Check if files exist
+#*******************************************************************************
+BS_zar=rrr_cnv_in.rstrip('/').endswith('.zarr')
+#The input is a Zarr store and the output a netCDF file
+
+if BS_zar==rrr_cnv_out.rstrip('/').endswith('.zarr'):
+     print('ERROR - Exactly one of the two names must end with .zarr')
+     raise SystemExit(22)
+
+rrr_lib_zar.zar_imp()
+
+try:
+     if BS_zar:
+          f=rrr_lib_zar.zar_opn(rrr_cnv_in,'r')
+     else:
+          f=netCDF4.Dataset(rrr_cnv_in,'r')
+except (IOError,ValueError) as e:
+     print('ERROR - Unable to open '+rrr_cnv_in)
+     raise SystemExit(22)
+
+
+#*******************************************************************************
+#Reading input
+#*******************************************************************************
+print('Reading input')
+
+#-------------------------------------------------------------------------------
+#Get variables
+#-------------------------------------------------------------------------------
+YV_var=list(f.array_keys()) if BS_zar else list(f.variables)
+
+if 'm3_riv' in YV_var:
+     YS_var='m3_riv'
+elif 'Qout' in YV_var:
+     YS_var='Qout'
+elif 'V' in YV_var:
+     YS_var='V'
+else:
+     print('ERROR - m3_riv, Qout, or V are not variables in: '+rrr_cnv_in)
+     raise SystemExit(22)
+
+var=f[YS_var] if BS_zar else f.variables[YS_var]
+if BS_zar:
+     YV_dim=tuple(var.attrs[rrr_lib_zar.YS_zar_dim])
+     YV_chk=var.chunks
+else:
+     YV_dim=var.dimensions
+     YV_chk=var.chunking()
+
+#-------------------------------------------------------------------------------
+#Get dimension sizes
+#-------------------------------------------------------------------------------
+if len(YV_dim)!=2 or YV_dim[0] not in ('Time','time')                          \
+                  or YV_dim[1] not in ('COMID','rivid'):
+     print('ERROR - The dimensions of '+YS_var+' are not (time,rivid)')
+     raise SystemExit(22)
+
+IS_time,IS_riv_tot=var.shape
+IS_siz=var.dtype.itemsize
+print('- The number of river reaches is: '+str(IS_riv_tot))
+print('- The number of time steps is: '+str(IS_time))
+print('- The variable that will be converted is: '+YS_var)
+print('- The current chunk sizes are: '+str(YV_chk))
+
+
+#*******************************************************************************
+#Determining chunk sizes
+#*******************************************************************************
+print('Determining chunk sizes')
+
+if IS_arg==5:
+     print('- Using the chunk sizes given')
+elif BS_zar:
+     print('- Keeping the chunk sizes of the Zarr store')
+     IS_tim_chk,IS_riv_chk=YV_chk
+else:
+     print('- Recommending chunk sizes')
+     IS_tim_chk,IS_riv_chk=rrr_lib_zar.zar_rec(IS_time,IS_riv_tot,IS_siz)
+
+IS_tim_chk=max(min(IS_tim_chk,IS_time),1)
+IS_riv_chk=max(min(IS_riv_chk,IS_riv_tot),1)
+print('- The new chunk sizes are: '+str([IS_tim_chk,IS_riv_chk]))
+
+
+#*******************************************************************************
+#Creating output
+#*******************************************************************************
+print('Creating output')
+
+IM_new={'chunksizes':(IS_tim_chk,IS_riv_chk),'zlib':IS_cmp>0,                  \
+        'complevel':max(IS_cmp,1),'shuffle':BS_shf}
+if BS_zar:
+     g=rrr_lib_zar.zar_ncf(f,rrr_cnv_out,[YS_var],IM_new)
+else:
+     g=rrr_lib_zar.zar_new(f,rrr_cnv_out,[YS_var],IS_time,IM_new)
+
+print('- Done')
+
+
+#*******************************************************************************
+#Copying variable by blocks of time steps
+#*******************************************************************************
+print('Copying variable by blocks of time steps')
+
+IS_blk=IS_tim_chk
+if YV_chk!='contiguous':
+     IS_blk=IS_blk*YV_chk[0]//math.gcd(IS_blk,YV_chk[0])
+#Blocks are aligned with both the old and the new chunks along time
+IS_blk=max(IS_mem//(IS_blk*IS_riv_tot*IS_siz),1)*IS_blk
+print('- The number of time steps copied at once is: '+str(IS_blk))
+
+#-------------------------------------------------------------------------------
+#Copy functions
+#-------------------------------------------------------------------------------
+def cnv_ini():
+     #Opens the netCDF file in each process, as netCDF handles cannot be shared
+     #between processes.
+     global f
+     f=netCDF4.Dataset(rrr_cnv_in,'r')
+
+def cnv_blk(JS_time):
+     #Copies the block of time steps starting at JS_time to the Zarr store.
+     JS_tend=min(JS_time+IS_blk,IS_time)
+     ZM_blk=f.variables[YS_var][JS_time:JS_tend,:]
+     rrr_lib_zar.zar_wri(rrr_cnv_out,YS_var,JS_time,ZM_blk)
+
+#-------------------------------------------------------------------------------
+#Zarr store to netCDF file
+#-------------------------------------------------------------------------------
+if BS_zar:
+     for JS_time in range(0,IS_time,IS_blk):
+          JS_tend=min(JS_time+IS_blk,IS_time)
+          g.variables[YS_var][JS_time:JS_tend,:]=f[YS_var][JS_time:JS_tend,:]
+     g.close()
+
+#-------------------------------------------------------------------------------
+#netCDF file to Zarr store
+#-------------------------------------------------------------------------------
+if not BS_zar:
+     f.close()
+     IV_blk=range(0,IS_time,IS_blk)
+     if IS_cpu==1:
+          cnv_ini()
+          for JS_time in IV_blk:
+               cnv_blk(JS_time)
+          f.close()
+     else:
+          print('- Copying blocks with '+str(IS_cpu)+' processes')
+          with multiprocessing.get_context('fork').Pool(IS_cpu,cnv_ini) as pool:
+               pool.map(cnv_blk,IV_blk)
+
+print('- Done')
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -0,0 +1,199 @@
+#*******************************************************************************
+#rrr_lib_ens.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the ensemble computations shared by the programs that
+#combine any number of netCDF files with the same structure (members) into a
+#new netCDF file. The new file is created from scratch with the dimensions,
+#variables and attributes of the first member, the values of all variables but
+#those of interest being copied. Blocks of time steps are then read from one
+#member after the other for the variables of interest, and the ensemble
+#average, the ensemble spread (population standard deviation, using Welford's
+#algorithm), and optionally the ensemble minimum and maximum are obtained in a
+#single pass. Single variables can also be copied by blocks of time steps.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import netCDF4
+import numpy
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+YV_ens_sfx=['_std','_min','_max']
+#Suffixes of the names of the spread, minimum and maximum variables
+
+
+#*******************************************************************************
+#Check consistency of members
+#*******************************************************************************
+def ens_chk(YV_f,YV_var):
+     #Given a list of open netCDF datasets, checks that all members have the
+     #same dimension sizes, the same variables of interest, and the same values
+     #for all coordinate variables (e.g., lon, lat, rivid, time).
+     f1=YV_f[0]
+     for JS_ens in range(1,len(YV_f)):
+          f=YV_f[JS_ens]
+          for YS_dim in f1.dimensions:
+               if YS_dim not in f.dimensions or                                \
+                  len(f.dimensions[YS_dim])!=len(f1.dimensions[YS_dim]):
+                    print('ERROR - The sizes of '+YS_dim+' differ for member ' \
+                          +str(JS_ens+1))
+                    raise SystemExit(22)
+          for YS_var in YV_var:
+               if YS_var not in f.variables or                                 \
+                  f.variables[YS_var].dimensions!=                             \
+                  f1.variables[YS_var].dimensions:
+                    print('ERROR - '+YS_var+' differs for member '             \
+                          +str(JS_ens+1))
+                    raise SystemExit(22)
+          for YS_var in f1.variables:
+               if YS_var in YV_var: continue
+               var=f1.variables[YS_var]
+               if len(var.dimensions)!=1 or (YS_var not in f1.dimensions):
+                    continue
+               if YS_var not in f.variables or                                 \
+                  not numpy.array_equal(numpy.ma.getdata(var[:]),              \
+                                  numpy.ma.getdata(f.variables[YS_var][:])):
+                    print('ERROR - The values of '+YS_var+' differ for member '\
+                          +str(JS_ens+1))
+                    raise SystemExit(22)
+     print('- The structure of all '+str(len(YV_f))+' members is the same')
+
+
+#*******************************************************************************
+#Create new file from structure of first member
+#*******************************************************************************
+def ens_new(f1,rrr_ens_out,YV_var,BS_spr,BS_ext,YS_skp=None,IM_new=None):
+     #Creates a new netCDF file with the structure of f1, copying the values of
+     #all variables but those of interest (e.g., lon, lat, rivid, time). Extra
+     #variables for the spread and the minimum/maximum of each variable of
+     #interest are added if requested. If YS_skp is given, that dimension and
+     #all variables along it are left out, which allows creating small sidecar
+     #files that only hold the coordinates of f1 (e.g., without time). If IM_new
+     #is given, its storage options (e.g., chunksizes, zlib, complevel, shuffle)
+     #replace those of f1 for the variables of interest.
+     g=netCDF4.Dataset(rrr_ens_out,'w',format=f1.data_model)
+
+     for YS_dim,dim in f1.dimensions.items():
+          if YS_dim==YS_skp: continue
+          g.createDimension(YS_dim,None if dim.isunlimited() else len(dim))
+
+     g.setncatts({att:f1.getncattr(att) for att in f1.ncattrs()})
+
+     YV_sfx=['']
+     if BS_spr: YV_sfx=YV_sfx+YV_ens_sfx[0:1]
+     if BS_ext: YV_sfx=YV_sfx+YV_ens_sfx[1:3]
+
+     for YS_var,var in f1.variables.items():
+          if YS_skp in var.dimensions: continue
+          IM_opt={}
+          if '_FillValue' in var.ncattrs(): IM_opt['fill_value']=var._FillValue
+          if f1.data_model.startswith('NETCDF4'):
+               IM_flt=var.filters()
+               if IM_flt is not None and IM_flt.get('zlib'):
+                    IM_opt['zlib']=True
+                    IM_opt['complevel']=IM_flt['complevel']
+                    IM_opt['shuffle']=IM_flt['shuffle']
+               if var.chunking()!='contiguous' and var.chunking() is not None:
+                    IM_opt['chunksizes']=var.chunking()
+          if YS_var in YV_var and IM_new is not None: IM_opt.update(IM_new)
+          YV_att={att:var.getncattr(att) for att in var.ncattrs()              \
+                                         if att!='_FillValue'}
+          for YS_sfx in (YV_sfx if YS_var in YV_var else ['']):
+               var_new=g.createVariable(YS_var+YS_sfx,var.datatype,            \
+                                        var.dimensions,**IM_opt)
+               var_new.setncatts(YV_att)
+               if YS_sfx!='' and 'long_name' in YV_att:
+                    var_new.long_name=YV_att['long_name']+' (ensemble '        \
+                                     +{'_std':'spread','_min':'minimum',       \
+                                       '_max':'maximum'}[YS_sfx]+')'
+          if YS_var in YV_var: continue
+          if var.shape==():
+               ZS_val=var.getValue()
+               if not numpy.ma.is_masked(ZS_val):
+                    g.variables[YS_var].assignValue(ZS_val)
+          else:
+               g.variables[YS_var][:]=var[:]
+     return g
+
+
+#*******************************************************************************
+#Copy a variable one block of time steps at a time
+#*******************************************************************************
+def ens_cpy(f1,g,YS_var,YS_time,IS_blk,ZV_fac):
+     #Copies YS_var from f1 into g by blocks of time steps, IS_blk being rounded
+     #to the chunk size of f1 along time. The values are multiplied by ZV_fac
+     #(e.g., a factor for each river reach) unless ZV_fac is None.
+     var=f1.variables[YS_var]
+     YV_chk=var.chunking()
+     if YV_chk is not None and YV_chk!='contiguous':
+          IS_blk=max(IS_blk//YV_chk[0],1)*YV_chk[0]
+     IS_time=len(f1.dimensions[YS_time])
+     for JS_time in range(0,IS_time,IS_blk):
+          JS_tend=min(JS_time+IS_blk,IS_time)
+          if ZV_fac is None:
+               g.variables[YS_var][JS_time:JS_tend]=var[JS_time:JS_tend]
+          else:
+               g.variables[YS_var][JS_time:JS_tend]=var[JS_time:JS_tend]*ZV_fac
+
+
+#*******************************************************************************
+#Compute ensemble statistics one block of time steps at a time
+#*******************************************************************************
+def ens_blk(YV_f,g,YV_var,YS_time,IS_blk,BS_spr,BS_ext):
+     #Streams blocks of IS_blk time steps from all members for each variable of
+     #interest and writes the ensemble statistics in g. The average is computed
+     #by adding members one after the other and dividing by their number, in the
+     #precision of the inputs. Returns, for each variable of interest, a list
+     #with the time-averaged field of each member followed by that of the
+     #ensemble average, for diagnostic purposes.
+     IS_ens=len(YV_f)
+     IS_time=len(YV_f[0].dimensions[YS_time])
+     IM_avg={}
+     for YS_var in YV_var:
+          IM_avg[YS_var]=[0]*(IS_ens+1)
+          for JS_time in range(0,IS_time,IS_blk):
+               JS_tend=min(JS_time+IS_blk,IS_time)
+               for JS_ens in range(IS_ens):
+                    ZM_blk=YV_f[JS_ens].variables[YS_var][JS_time:JS_tend]
+                    IM_avg[YS_var][JS_ens]=IM_avg[YS_var][JS_ens]              \
+                                          +ZM_blk.sum(axis=0)
+                    if JS_ens==0:
+                         ZM_sum=ZM_blk
+                         ZM_mea=numpy.ma.zeros(ZM_blk.shape)
+                         ZM_M2=numpy.ma.zeros(ZM_blk.shape)
+                         if BS_ext:
+                              ZM_min=ZM_blk.copy()
+                              ZM_max=ZM_blk.copy()
+                    else:
+                         ZM_sum=ZM_sum+ZM_blk
+                         if BS_ext:
+                              ZM_min=numpy.ma.minimum(ZM_min,ZM_blk)
+                              ZM_max=numpy.ma.maximum(ZM_max,ZM_blk)
+                    if BS_spr:
+                         ZM_dlt=ZM_blk-ZM_mea
+                         ZM_mea=ZM_mea+ZM_dlt/(JS_ens+1)
+                         ZM_M2=ZM_M2+ZM_dlt*(ZM_blk-ZM_mea)
+               ZM_avg=ZM_sum/IS_ens
+               IM_avg[YS_var][IS_ens]=IM_avg[YS_var][IS_ens]+ZM_avg.sum(axis=0)
+               g.variables[YS_var][JS_time:JS_tend]=ZM_avg
+               if BS_spr:
+                    g.variables[YS_var+'_std'][JS_time:JS_tend]=               \
+                                                  numpy.ma.sqrt(ZM_M2/IS_ens)
+               if BS_ext:
+                    g.variables[YS_var+'_min'][JS_time:JS_tend]=ZM_min
+                    g.variables[YS_var+'_max'][JS_time:JS_tend]=ZM_max
+          IM_avg[YS_var]=[ZM_avg/IS_time for ZM_avg in IM_avg[YS_var]]
+     return IM_avg
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -0,0 +1,196 @@
+#*******************************************************************************
+#rrr_lib_geo.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the geometric computations shared by the programs that
+#create catchment files or that compare river reaches with other features. The
+#vertices of all features are stored in one flat array of coordinates along
+#with offsets, following the ragged array layout of Shapely 2: the offsets of
+#the first vertex of each part (ring or line), then of the first ring of each
+#polygon (for polygons only), then of the first polygon or line of each
+#feature, each of them ending with the total count.
+#Areas and centroids are then obtained for all parts at once with segment
+#reductions, and reduced to features in a second step.
+#For formulas used here, see:
+#https://en.wikipedia.org/wiki/Centroid#Centroid_of_polygon
+#Author:
+#Cedric H. David, 2007-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import numpy
+import shapely
+
+
+#*******************************************************************************
+#Flat coordinates from geometries
+#*******************************************************************************
+def geo_crd(YV_geo):
+     #Given an iterable of GeoJSON-like geometries such as those of fiona, that
+     #are either all (Multi)Polygons or all (Multi)LineStrings, this function
+     #returns the geometry type ('Polygon' or 'LineString'), the flat array of
+     #coordinates of size (vertex x 2), and the tuple of offsets.
+     YS_typ=''
+     ZV_xy=[]
+     IV_prt=[0]
+     IV_pol=[0]
+     IV_ftr=[0]
+     for geo in YV_geo:
+          if geo['type']=='Polygon':
+               YV_pol=[geo['coordinates']]
+          elif geo['type']=='MultiPolygon':
+               YV_pol=geo['coordinates']
+          elif geo['type']=='LineString':
+               YV_pol=[[geo['coordinates']]]
+          elif geo['type']=='MultiLineString':
+               YV_pol=[[lin] for lin in geo['coordinates']]
+          else:
+               print('ERROR - Unsupported geometry type: '+geo['type'])
+               raise SystemExit(22)
+          if YS_typ=='':
+               YS_typ=geo['type'].replace('Multi','')
+          elif YS_typ!=geo['type'].replace('Multi',''):
+               print('ERROR - Polygons and lines cannot be mixed')
+               raise SystemExit(22)
+          for pol in YV_pol:
+               for prt in pol:
+                    ZV_xy.extend(prt)
+                    IV_prt.append(len(ZV_xy))
+               IV_pol.append(len(IV_prt)-1)
+          IV_ftr.append(len(IV_pol)-1)
+
+     ZM_xy=numpy.array([crd[0:2] for crd in ZV_xy],dtype=numpy.float64)        \
+                .reshape(-1,2)
+     #Only the first two dimensions are kept in case z values exist
+     IV_prt=numpy.array(IV_prt,dtype=numpy.int64)
+     IV_pol=numpy.array(IV_pol,dtype=numpy.int64)
+     IV_ftr=numpy.array(IV_ftr,dtype=numpy.int64)
+     if YS_typ=='LineString':
+          return YS_typ,ZM_xy,(IV_prt,IV_ftr)
+     else:
+          return 'Polygon',ZM_xy,(IV_prt,IV_pol,IV_ftr)
+
+
+#*******************************************************************************
+#Flat coordinates from Shapely geometries
+#*******************************************************************************
+def geo_rag(YV_geo):
+     #Same as geo_crd() but for an array of Shapely geometries such as those of
+     #rrr_lib_vec.vec_rea(), the flat arrays being obtained by Shapely at once.
+     geo_typ,ZM_xy,IV_off=shapely.to_ragged_array(YV_geo,include_z=False)
+     IV_one=numpy.arange(len(YV_geo)+1,dtype=numpy.int64)
+     #Offsets of features that have only one part
+     IV_off=tuple(numpy.asarray(IV,dtype=numpy.int64) for IV in IV_off)
+     if geo_typ==shapely.GeometryType.LINESTRING:
+          return 'LineString',ZM_xy,(IV_off[0],IV_one)
+     elif geo_typ==shapely.GeometryType.MULTILINESTRING:
+          return 'LineString',ZM_xy,IV_off
+     elif geo_typ==shapely.GeometryType.POLYGON:
+          return 'Polygon',ZM_xy,(IV_off[0],IV_off[1],IV_one)
+     elif geo_typ==shapely.GeometryType.MULTIPOLYGON:
+          return 'Polygon',ZM_xy,IV_off
+     else:
+          print('ERROR - Unsupported geometry type: '+geo_typ.name)
+          raise SystemExit(22)
+
+
+#*******************************************************************************
+#Segments of the lines or boundaries of a geometry
+#*******************************************************************************
+def geo_seg(geo):
+     #Returns an array with one two-point LineString per segment of the lines
+     #of geo, or of the boundaries of geo for polygons. Small segments are much
+     #better suited to a spatial index than one large geometry made of many
+     #points.
+     if shapely.get_dimensions(geo)==2:
+          geo=shapely.boundary(geo)
+     ZM_xy,IV_prt=shapely.get_coordinates(shapely.get_parts(geo),              \
+                                          return_index=True)
+     BV_seg=IV_prt[:-1]==IV_prt[1:]
+     #Segments link consecutive vertices of the same part
+     return shapely.linestrings(numpy.stack([ZM_xy[:-1][BV_seg],               \
+                                             ZM_xy[1:][BV_seg]],axis=1))
+
+
+#*******************************************************************************
+#Segment sums
+#*******************************************************************************
+def geo_sum(ZV_val,IV_off):
+     #Returns the sum of ZV_val[IV_off[i]:IV_off[i+1]] for each segment i. The
+     #values are added one after the other within each segment, as in a Python
+     #loop, so that results are identical to those of such a loop. Segments are
+     #sorted by decreasing length so that those still being added come first.
+     IV_len=numpy.diff(IV_off)
+     IV_srt=numpy.argsort(-IV_len,kind='stable')
+     IV_str=IV_off[:-1][IV_srt]
+     IS_max=int(IV_len.max()) if len(IV_len)>0 else 0
+     IV_act=numpy.searchsorted(-IV_len[IV_srt],-numpy.arange(IS_max),'left')
+     #IV_act[JS_val] is the number of segments longer than JS_val
+     ZV_sum=numpy.zeros(len(IV_len))
+     for JS_val in range(IS_max):
+          IS_act=IV_act[JS_val]
+          ZV_sum[:IS_act]+=ZV_val[IV_str[:IS_act]+JS_val]
+     ZV_out=numpy.empty(len(IV_len))
+     ZV_out[IV_srt]=ZV_sum
+     return ZV_out
+
+
+#*******************************************************************************
+#Area and centroid of rings
+#*******************************************************************************
+def geo_pol(ZV_x,ZV_y,IV_prt):
+     #Returns the signed area and the centroid of each ring, the ring being
+     #closed between its last and first vertices. Exterior rings and holes have
+     #opposite signs so that holes are removed when reducing to features.
+     if numpy.any(numpy.diff(IV_prt)<=0):
+          print('ERROR - Each ring must have at least one vertex')
+          raise SystemExit(22)
+     IV_nxt=numpy.arange(1,len(ZV_x)+1,dtype=numpy.int64)
+     IV_nxt[IV_prt[1:]-1]=IV_prt[:-1]
+     #Index of the vertex following each vertex within its ring
+     ZV_crs=ZV_x*ZV_y[IV_nxt]-ZV_x[IV_nxt]*ZV_y
+     with numpy.errstate(divide='ignore',invalid='ignore'):
+          ZV_prt_area=geo_sum(ZV_crs,IV_prt)/2
+          ZV_prt_x_cen=geo_sum((ZV_x+ZV_x[IV_nxt])*ZV_crs,IV_prt)              \
+                      /(ZV_prt_area*6.0)
+          ZV_prt_y_cen=geo_sum((ZV_y+ZV_y[IV_nxt])*ZV_crs,IV_prt)              \
+                      /(ZV_prt_area*6.0)
+     return ZV_prt_area,ZV_prt_x_cen,ZV_prt_y_cen
+
+
+#*******************************************************************************
+#Reduction of rings to features
+#*******************************************************************************
+def geo_ftr(ZV_prt_area,ZV_prt_x_cen,ZV_prt_y_cen,IV_ftr):
+     #Returns the area and the centroid of each feature as the average of the
+     #centroids of its rings weighted by their signed area, IV_ftr being the
+     #offsets of the first ring of each feature.
+     with numpy.errstate(divide='ignore',invalid='ignore'):
+          ZV_ftr_area=geo_sum(ZV_prt_area,IV_ftr)
+          ZV_ftr_x_cen=geo_sum(ZV_prt_area*ZV_prt_x_cen,IV_ftr)/ZV_ftr_area
+          ZV_ftr_y_cen=geo_sum(ZV_prt_area*ZV_prt_y_cen,IV_ftr)/ZV_ftr_area
+     return ZV_ftr_area,ZV_ftr_x_cen,ZV_ftr_y_cen
+
+
+#*******************************************************************************
+#Centroids computed by GEOS
+#*******************************************************************************
+def geo_cen(YS_typ,ZM_xy,IV_off):
+     #Returns the centroid of each feature as computed by GEOS, the geometries
+     #being all created at once from the flat arrays made by geo_crd(). This
+     #gives the same values as the centroid property of each Shapely geometry.
+     if YS_typ=='Polygon':
+          geo_typ=shapely.GeometryType.MULTIPOLYGON
+     else:
+          geo_typ=shapely.GeometryType.MULTILINESTRING
+     YV_geo=shapely.from_ragged_array(geo_typ,ZM_xy,IV_off)
+     YV_cen=shapely.centroid(YV_geo)
+     return shapely.get_x(YV_cen),shapely.get_y(YV_cen)
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -0,0 +1,158 @@
+#*******************************************************************************
+#rrr_lib_mmp.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the tools used to cache a variable of size (time x rivid)
+#such as m3_riv, Qout, or V in uncompressed little-endian raw files that are
+#read through memory maps, so that programs that read the same netCDF file many
+#times do not decompress its chunks again. The cache of a netCDF file is made
+#of three files next to it:
+# - <file>.mmp.json: a small header with the name, type, shape and attributes of
+#   the variable, the values of rivid and time, and the size and modification
+#   time of the netCDF file when the cache was made
+# - <file>.mmp.tim: the values in time-major order (time x rivid), for maps
+# - <file>.mmp.riv: the values in reach-major order (rivid x time), for time
+#   series
+#The header is written last, and a cache is only used when the netCDF file has
+#not changed since. Fill values are kept as they are in the raw files.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import os
+import json
+import numpy
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+YV_mmp_ext=['.mmp.json','.mmp.tim','.mmp.riv']
+#Extensions added to the name of the netCDF file for the header and raw files
+
+
+#*******************************************************************************
+#Names of cache files
+#*******************************************************************************
+def mmp_fil(rrr_ncf_fil):
+     #Returns the names of the header, time-major, and reach-major files of the
+     #cache of a netCDF file.
+     return [rrr_ncf_fil+YS_ext for YS_ext in YV_mmp_ext]
+
+
+#*******************************************************************************
+#Source of a cache
+#*******************************************************************************
+def mmp_src(rrr_ncf_fil):
+     #Returns the size and modification time (ns) of a netCDF file, which are
+     #used to know if its cache is still valid.
+     sta=os.stat(rrr_ncf_fil)
+     return [sta.st_size,sta.st_mtime_ns]
+
+
+#*******************************************************************************
+#Write a cache
+#*******************************************************************************
+def mmp_wri(f,rrr_ncf_fil,YS_var,YS_rivid,YS_time,IS_mem):
+     #Writes the cache of the variable YS_var of the netCDF dataset f opened
+     #from rrr_ncf_fil. The variable is read by blocks of time steps of at most
+     #IS_mem bytes, which are written in both orders.
+     var=f.variables[YS_var]
+     IS_time,IS_riv_tot=var.shape
+     YS_typ=var.dtype.newbyteorder('<').str
+     rrr_hdr_fil,rrr_tim_fil,rrr_riv_fil=mmp_fil(rrr_ncf_fil)
+
+     if os.path.isfile(rrr_hdr_fil): os.remove(rrr_hdr_fil)
+     #An older cache is never used while the raw files are being written
+     ZM_tim=numpy.memmap(rrr_tim_fil,dtype=YS_typ,mode='w+',                   \
+                         shape=(max(IS_time,1),max(IS_riv_tot,1)))
+     ZM_riv=numpy.memmap(rrr_riv_fil,dtype=YS_typ,mode='w+',                   \
+                         shape=(max(IS_riv_tot,1),max(IS_time,1)))
+
+     IS_blk=max(IS_mem//max(IS_riv_tot*var.dtype.itemsize,1),1)
+     for JS_time in range(0,IS_time,IS_blk):
+          JS_tend=min(JS_time+IS_blk,IS_time)
+          ZM_blk=numpy.ma.getdata(var[JS_time:JS_tend,:])
+          ZM_tim[JS_time:JS_tend,:]=ZM_blk
+          ZM_riv[:,JS_time:JS_tend]=ZM_blk.T
+     ZM_tim.flush()
+     ZM_riv.flush()
+     del ZM_tim,ZM_riv
+
+     IM_hdr={'variable':YS_var,                                                \
+             'dtype':YS_typ,                                                   \
+             'shape':[IS_time,IS_riv_tot],                                     \
+             'attrs':{att:mmp_att(var.getncattr(att))                          \
+                      for att in var.ncattrs()},                               \
+             'rivid':None,                                                     \
+             'time':None,                                                      \
+             'source':mmp_src(rrr_ncf_fil)}
+     if YS_rivid in f.variables:
+          IM_hdr['rivid']=numpy.ma.getdata(f.variables[YS_rivid][:]).tolist()
+     if YS_time in f.variables:
+          IM_hdr['time']=numpy.ma.getdata(f.variables[YS_time][:]).tolist()
+     with open(rrr_hdr_fil,'w') as jsnfile:
+          json.dump(IM_hdr,jsnfile)
+
+
+#*******************************************************************************
+#Attribute values
+#*******************************************************************************
+def mmp_att(att):
+     #Returns the value of a netCDF attribute in a form that can be saved in
+     #JSON.
+     if isinstance(att,(numpy.ndarray,numpy.generic)):
+          return att.tolist()
+     return att
+
+
+#*******************************************************************************
+#Open a cache
+#*******************************************************************************
+def mmp_opn(rrr_ncf_fil,YS_var):
+     #Returns the header and the time-major and reach-major memory maps of the
+     #cache of YS_var in a netCDF file, or three None if there is no valid
+     #cache.
+     rrr_hdr_fil,rrr_tim_fil,rrr_riv_fil=mmp_fil(rrr_ncf_fil)
+     try:
+          with open(rrr_hdr_fil) as jsnfile:
+               IM_hdr=json.load(jsnfile)
+     except (IOError,ValueError):
+          return None,None,None
+     if IM_hdr['variable']!=YS_var or                                          \
+        IM_hdr['source']!=mmp_src(rrr_ncf_fil):
+          return None,None,None
+     IS_time,IS_riv_tot=IM_hdr['shape']
+     if IS_time==0 or IS_riv_tot==0:
+          return None,None,None
+     ZM_tim=numpy.memmap(rrr_tim_fil,dtype=IM_hdr['dtype'],mode='r',           \
+                         shape=(IS_time,IS_riv_tot))
+     ZM_riv=numpy.memmap(rrr_riv_fil,dtype=IM_hdr['dtype'],mode='r',           \
+                         shape=(IS_riv_tot,IS_time))
+     return IM_hdr,ZM_tim,ZM_riv
+
+
+#*******************************************************************************
+#Variable from a cache or from a netCDF file
+#*******************************************************************************
+def mmp_var(rrr_ncf_fil,f,YS_var,BS_riv=False):
+     #Returns an array of size (time x rivid) for YS_var, and True if it comes
+     #from the cache. The array is the time-major memory map, or the transposed
+     #reach-major one if BS_riv is True (for reading time series), so that both
+     #are sliced like the netCDF variable without copying. The netCDF variable
+     #of the dataset f is returned if there is no valid cache.
+     IM_hdr,ZM_tim,ZM_riv=mmp_opn(rrr_ncf_fil,YS_var)
+     if IM_hdr is None:
+          return f.variables[YS_var],False
+     if BS_riv:
+          return ZM_riv.T,True
+     return ZM_tim,True
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
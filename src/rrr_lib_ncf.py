@@ -0,0 +1,126 @@
+#*******************************************************************************
+#rrr_lib_ncf.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the tools used to choose the storage layout of netCDF
+#variables of size (time x rivid) such as m3_riv, Qout, and V. The duration of
+#one read operation is modeled as the number of chunks accessed multiplied by
+#the sum of a fixed overhead per chunk and of the cost of reading all values of
+#a chunk. These two costs are estimated from the read benchmarks of
+#tst_prf_ncf.py (all river reaches for a given time, and all times for a given
+#river reach) performed on a small sample of the data that is written with two
+#very different chunk shapes. The chunk shape that balances the two types of
+#reads is then recommended.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import os
+import time
+import math
+import netCDF4
+import numpy
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+ZS_ovh=1e-4
+#Default overhead for accessing one chunk (s)
+ZS_val=2e-9
+#Default cost of reading one value (s)
+IS_byt=4194304
+#Maximum size of one chunk (bytes)
+
+
+#*******************************************************************************
+#Read benchmarks
+#*******************************************************************************
+def ncf_prf(var,IS_read):
+     #Returns the average duration of reading all river reaches for a given time
+     #and that of reading all times for a given river reach, over IS_read read
+     #operations. The chunk cache is disabled so that each read is measured.
+     var.set_var_chunk_cache(size=0)
+     ZS_beg=time.time()
+     for JS_read in range(IS_read):
+          var[JS_read%var.shape[0],:]
+     ZS_row=(time.time()-ZS_beg)/IS_read
+     ZS_beg=time.time()
+     for JS_read in range(IS_read):
+          var[:,JS_read%var.shape[1]]
+     ZS_col=(time.time()-ZS_beg)/IS_read
+     return ZS_row,ZS_col
+
+
+#*******************************************************************************
+#Calibration of costs
+#*******************************************************************************
+def ncf_cal(ZM_smp,rrr_tmp_ncf,IS_cmp,BS_shf,IS_read):
+     #Given a sample of values of size (time x rivid), writes it into a
+     #temporary netCDF file with one chunk per time and with one chunk per river
+     #reach, and uses the read benchmarks to estimate the overhead per chunk and
+     #the cost per value. The default costs are returned if the estimates are
+     #not positive.
+     IS_tim,IS_riv=ZM_smp.shape
+     g=netCDF4.Dataset(rrr_tmp_ncf,'w',format='NETCDF4')
+     g.createDimension('time',IS_tim)
+     g.createDimension('rivid',IS_riv)
+     for YS_var,IV_chk in [('row',(1,IS_riv)),('col',(IS_tim,1))]:
+          var=g.createVariable(YS_var,'f4',('time','rivid',),                  \
+                               zlib=IS_cmp>0,complevel=max(IS_cmp,1),          \
+                               shuffle=BS_shf,chunksizes=IV_chk)
+          var[:]=ZM_smp
+     g.close()
+
+     g=netCDF4.Dataset(rrr_tmp_ncf,'r')
+     ZS_row1,ZS_col1=ncf_prf(g.variables['row'],IS_read)
+     ZS_row2,ZS_col2=ncf_prf(g.variables['col'],IS_read)
+     g.close()
+     os.remove(rrr_tmp_ncf)
+
+     ZM_sys=numpy.array([[1,IS_riv],                                           \
+                         [IS_tim,IS_tim*IS_riv],                               \
+                         [IS_riv,IS_riv*IS_tim],                               \
+                         [1,IS_tim]],dtype=numpy.float64)
+     ZV_dur=numpy.array([ZS_row1,ZS_col1,ZS_row2,ZS_col2])
+     #Number of chunks and of values accessed for each of the four benchmarks
+     ZV_cst=numpy.linalg.lstsq(ZM_sys,ZV_dur,rcond=None)[0]
+     if ZV_cst[0]>0 and ZV_cst[1]>0:
+          return ZV_cst[0],ZV_cst[1]
+     else:
+          return ZS_ovh,ZS_val
+
+
+#*******************************************************************************
+#Recommendation of chunk shape
+#*******************************************************************************
+def ncf_rec(IS_tim,IS_riv,IS_siz,ZS_ovh,ZS_val,ZS_mix):
+     #Returns the chunk shape (time, rivid) that minimizes the weighted average
+     #of the durations of reading all river reaches for a given time (weight
+     #ZS_mix) and of reading all times for a given river reach (weight
+     #1-ZS_mix), each duration being relative to the best one possible. Chunks
+     #are limited to IS_byt bytes, IS_siz being the size of one value.
+     IV_tim=sorted(set([2**JS for JS in range(int(math.log2(IS_tim))+1)]       \
+                       +[IS_tim]))
+     IV_riv=sorted(set([2**JS for JS in range(int(math.log2(IS_riv))+1)]       \
+                       +[IS_riv]))
+     IM_cst={}
+     for IS_ct in IV_tim:
+          for IS_cr in IV_riv:
+               if IS_ct*IS_cr*IS_siz>IS_byt and (IS_ct,IS_cr)!=(1,1): continue
+               ZS_chk=ZS_ovh+IS_ct*IS_cr*ZS_val
+               IM_cst[(IS_ct,IS_cr)]=(math.ceil(IS_riv/IS_cr)*ZS_chk,          \
+                                      math.ceil(IS_tim/IS_ct)*ZS_chk)
+     ZS_row=min(cst[0] for cst in IM_cst.values())
+     ZS_col=min(cst[1] for cst in IM_cst.values())
+     return min(IM_cst,key=lambda chk: ZS_mix*IM_cst[chk][0]/ZS_row            \
+                                      +(1-ZS_mix)*IM_cst[chk][1]/ZS_col)
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
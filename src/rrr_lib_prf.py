@@ -0,0 +1,154 @@
+#*******************************************************************************
+#rrr_lib_prf.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the tools used to profile RRR programs. A program opts in
+#by importing this module and by calling prf_sec() at the beginning of each of
+#its main sections (e.g., 'Reading connectivity file'), each call ending the
+#previous section. The wall time, the peak resident set size (RSS), and the
+#numbers of bytes of netCDF data read and written (given to prf_byt()) are then
+#recorded for each section. If the RRR_PRF_DIR environment variable is set, a
+#JSON trace named after the program and its process ID is written in that
+#directory when the program exits, which allows drivers that run several
+#programs to gather all traces into one profile with prf_agg(). Nothing is
+#written otherwise.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import os
+import sys
+import glob
+import json
+import time
+import atexit
+import resource
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+YS_prf_env='RRR_PRF_DIR'
+#Name of the environment variable with the directory of the JSON traces
+ZS_prf_beg=time.time()
+#Time at which the program started
+YV_prf_sec=[]
+#Sections that are finished
+IM_prf_sec=None
+#Section that is ongoing
+
+
+#*******************************************************************************
+#Peak resident set size
+#*******************************************************************************
+def prf_hwm(BS_rst):
+     #Returns the peak RSS (MB) since the last reset, and resets it if BS_rst is
+     #True. The Linux /proc interface allows resetting the peak so that it is
+     #known for each section. Elsewhere, the peak since the start of the program
+     #is returned.
+     ZS_hwm=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+     if sys.platform=='darwin': ZS_hwm=ZS_hwm/1024
+     #ru_maxrss is in kilobytes on Linux and in bytes on macOS
+     try:
+          with open('/proc/self/status') as file:
+               for line in file:
+                    if line.startswith('VmHWM:'):
+                         ZS_hwm=int(line.split()[1])/1024
+          if BS_rst:
+               with open('/proc/self/clear_refs','w') as file:
+                    file.write('5')
+     except IOError:
+          pass
+     return ZS_hwm
+
+
+#*******************************************************************************
+#Timed sections
+#*******************************************************************************
+def prf_sec(YS_sec):
+     #Ends the ongoing section, if any, and starts a new one named YS_sec. The
+     #program ends when YS_sec is None.
+     global IM_prf_sec
+     if IM_prf_sec is not None:
+          IM_prf_sec['seconds']=time.time()-IM_prf_sec['seconds']
+          IM_prf_sec['peak_RSS_MB']=prf_hwm(YS_sec is not None)
+          YV_prf_sec.append(IM_prf_sec)
+     elif YS_sec is not None:
+          prf_hwm(True)
+     if YS_sec is not None:
+          IM_prf_sec={'section':YS_sec,'seconds':time.time(),                  \
+                      'read_MB':0.0,'write_MB':0.0}
+     else:
+          IM_prf_sec=None
+
+
+#*******************************************************************************
+#Bytes of netCDF data
+#*******************************************************************************
+def prf_byt(YS_dir,IS_byt):
+     #Adds IS_byt to the number of bytes read (YS_dir is 'read') or written
+     #(YS_dir is 'write') in the ongoing section.
+     if IM_prf_sec is not None:
+          IM_prf_sec[YS_dir+'_MB']=IM_prf_sec[YS_dir+'_MB']+IS_byt/1e6
+
+
+#*******************************************************************************
+#JSON trace
+#*******************************************************************************
+def prf_end():
+     #Ends the ongoing section and writes the JSON trace if RRR_PRF_DIR is set.
+     #This is called automatically when the program exits, including on errors.
+     prf_sec(None)
+     if YS_prf_env not in os.environ: return
+     rrr_prf_dir=os.environ[YS_prf_env]
+     YS_prg=os.path.splitext(os.path.basename(sys.argv[0]))[0]
+     IM_trc={'program':YS_prg,                                                 \
+             'arguments':sys.argv[1:],                                         \
+             'pid':os.getpid(),                                                \
+             'seconds':time.time()-ZS_prf_beg,                                 \
+             'peak_RSS_MB':max([IM_sec['peak_RSS_MB'] for IM_sec in YV_prf_sec]\
+                               +[0]),                                          \
+             'read_MB':sum([IM_sec['read_MB'] for IM_sec in YV_prf_sec]),      \
+             'write_MB':sum([IM_sec['write_MB'] for IM_sec in YV_prf_sec]),    \
+             'sections':YV_prf_sec}
+     os.makedirs(rrr_prf_dir,exist_ok=True)
+     with open(os.path.join(rrr_prf_dir,YS_prg+'_'+str(os.getpid())+'.json'),  \
+               'w') as jsnfile:
+          json.dump(IM_trc,jsnfile,indent=1)
+
+atexit.register(prf_end)
+
+
+#*******************************************************************************
+#Profile of several programs
+#*******************************************************************************
+def prf_agg(rrr_prf_dir):
+     #Returns the profile of all programs whose JSON traces are in rrr_prf_dir
+     #or in its subdirectories, the name of the subdirectory being used as the
+     #stage of each trace. The times and numbers of bytes are summed, and the
+     #peak RSS is the largest of all programs as they run one after the other.
+     YV_trc=[]
+     for rrr_trc_jsn in sorted(glob.glob(os.path.join(rrr_prf_dir,'**',        \
+                                                      '*.json'),               \
+                                         recursive=True),                      \
+                               key=os.path.getmtime):
+          with open(rrr_trc_jsn) as jsnfile:
+               IM_trc=json.load(jsnfile)
+          IM_trc['stage']=os.path.relpath(os.path.dirname(rrr_trc_jsn),        \
+                                          rrr_prf_dir)
+          YV_trc.append(IM_trc)
+     return {'seconds':sum([IM_trc['seconds'] for IM_trc in YV_trc]),          \
+             'peak_RSS_MB':max([IM_trc['peak_RSS_MB'] for IM_trc in YV_trc]    \
+                               +[0]),                                          \
+             'read_MB':sum([IM_trc['read_MB'] for IM_trc in YV_trc]),          \
+             'write_MB':sum([IM_trc['write_MB'] for IM_trc in YV_trc]),        \
+             'traces':YV_trc}
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
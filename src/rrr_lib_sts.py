@@ -0,0 +1,118 @@
+#*******************************************************************************
+#rrr_lib_sts.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the statistics used to compare observed and modeled
+#hydrographs. All stations are processed at once from aligned 2-D arrays of
+#size (time x station) in which missing observations are given as NaN, and the
+#statistics are obtained from masked reductions along the time axis.
+#The following statistics are computed: mean observed and modeled values, root
+#mean square error (RMSE), absolute value of the bias, standard deviation of
+#the error (STDE), Nash-Sutcliffe efficiency (Nash), correlation coefficient
+#(Correl), Kling-Gupta efficiency (KGE, Gupta et al. 2009), and Nash-Sutcliffe
+#efficiency of the logarithm of values (lNash).
+#Author:
+#Cedric H. David, 2011-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import numpy
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+YV_sts=['Qobsbar','Qmodbar','RMSE','Bias','STDE','Nash','Correl','KGE','lNash']
+#Names of the statistics, in the order they are returned by sts_hyd()
+
+ZS_eps=0.01
+#Fraction of the mean observed value added to all values prior to taking the
+#logarithm in lNash, so that zero values remain usable (Pushpalatha et al.
+#2012).
+
+
+#*******************************************************************************
+#Hydrograph statistics
+#*******************************************************************************
+def sts_hyd(ZM_obs,ZM_mod):
+     #Given two arrays of size (time x station) for observations and model, this
+     #function returns a tuple with one array of size (station) for each of the
+     #statistics in YV_sts. Pairs are only discarded when the observation is
+     #NaN. A NaN is returned wherever a statistic is undefined.
+
+     ZM_obs=numpy.asarray(ZM_obs,dtype=numpy.float64)
+     ZM_mod=numpy.asarray(ZM_mod,dtype=numpy.float64)
+     if ZM_obs.shape!=ZM_mod.shape:
+          print('ERROR - Different shapes for observations and model: '        \
+                +str(ZM_obs.shape)+' <> '+str(ZM_mod.shape))
+          raise SystemExit(22)
+
+     with numpy.errstate(divide='ignore',invalid='ignore'):
+
+#-------------------------------------------------------------------------------
+#Mask of valid pairs
+#-------------------------------------------------------------------------------
+          BM_val=~numpy.isnan(ZM_obs)
+          ZV_M=BM_val.sum(axis=0).astype(numpy.float64)
+          ZM_obs=numpy.where(BM_val,ZM_obs,0.)
+          ZM_mod=numpy.where(BM_val,ZM_mod,0.)
+          #NaNs in the model are kept where the observations are valid
+
+#-------------------------------------------------------------------------------
+#Means and deviations
+#-------------------------------------------------------------------------------
+          ZV_obsbar=ZM_obs.sum(axis=0)/ZV_M
+          ZV_modbar=ZM_mod.sum(axis=0)/ZV_M
+          ZV_modBIA=numpy.abs(ZV_obsbar-ZV_modbar)
+
+          ZM_odv=numpy.where(BM_val,ZM_obs-ZV_obsbar,0.)
+          ZM_mdv=numpy.where(BM_val,ZM_mod-ZV_modbar,0.)
+
+#-------------------------------------------------------------------------------
+#Sums of squares and products
+#-------------------------------------------------------------------------------
+          ZV_num=numpy.square(ZM_mod-ZM_obs).sum(axis=0)
+          ZV_std=numpy.square(ZM_mdv-ZM_odv).sum(axis=0)
+          ZV_cov=(ZM_mdv*ZM_odv).sum(axis=0)
+          ZV_den=numpy.square(ZM_odv).sum(axis=0)
+          ZV_den2=numpy.square(ZM_mdv).sum(axis=0)
+
+#-------------------------------------------------------------------------------
+#Error statistics, Nash and correlation
+#-------------------------------------------------------------------------------
+          ZV_modRMS=numpy.sqrt(ZV_num/ZV_M)
+          ZV_modSTD=numpy.sqrt(ZV_std/ZV_M)
+          ZV_modNash=numpy.where(ZV_den!=0,1-ZV_num/ZV_den,numpy.nan)
+          ZV_modCor=numpy.where((ZV_den!=0)&(ZV_den2!=0),                      \
+                                ZV_cov/numpy.sqrt(ZV_den*ZV_den2),numpy.nan)
+
+#-------------------------------------------------------------------------------
+#Kling-Gupta efficiency
+#-------------------------------------------------------------------------------
+          ZV_alp=numpy.sqrt(ZV_den2/ZV_den)
+          ZV_bet=ZV_modbar/ZV_obsbar
+          ZV_modKGE=1-numpy.sqrt(numpy.square(ZV_modCor-1)                     \
+                                +numpy.square(ZV_alp-1)                        \
+                                +numpy.square(ZV_bet-1))
+
+#-------------------------------------------------------------------------------
+#Nash-Sutcliffe efficiency of logarithms
+#-------------------------------------------------------------------------------
+          ZV_add=ZS_eps*ZV_obsbar
+          ZM_obl=numpy.where(BM_val,numpy.log(ZM_obs+ZV_add),0.)
+          ZM_mol=numpy.where(BM_val,numpy.log(ZM_mod+ZV_add),0.)
+          ZV_olb=ZM_obl.sum(axis=0)/ZV_M
+          ZV_lnm=numpy.square(ZM_mol-ZM_obl).sum(axis=0)
+          ZV_lnd=numpy.square(numpy.where(BM_val,ZM_obl-ZV_olb,0.)).sum(axis=0)
+          ZV_modLNS=numpy.where(ZV_lnd!=0,1-ZV_lnm/ZV_lnd,numpy.nan)
+
+     return (ZV_obsbar,ZV_modbar,ZV_modRMS,ZV_modBIA,ZV_modSTD,ZV_modNash,     \
+             ZV_modCor,ZV_modKGE,ZV_modLNS)
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
@@ -0,0 +1,176 @@
+#*******************************************************************************
+#rrr_lib_vec.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the tools used to read and write vector files (e.g.,
+#shapefiles) in bulk. All attributes of a layer are read as one numpy array per
+#field, and all geometries are read as one numpy array of Shapely 2 geometries,
+#instead of one dictionary per feature. The pyogrio package is used when it is
+#available, in which case the whole layer is read by GDAL in one call.
+#Otherwise, fiona is used and the layer is read sequentially only once, which
+#avoids the costly random access to features (e.g., lay[JS]). The metadata
+#returned (coordinate system and fiona schema, with the widths and precisions
+#of fields) allow writing layers back with the same structure. Layers are
+#written by fiona so that these widths and precisions are kept, pyogrio being
+#only used for fields that have none.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import numpy
+import shapely
+import shapely.geometry
+import fiona
+try:
+     import pyogrio.raw
+except ImportError:
+     pyogrio=None
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+IM_vec_typ={'int':numpy.int64,'float':numpy.float64,'str':object}
+#numpy types of the fiona field types, widths and precisions being ignored
+
+
+#*******************************************************************************
+#Read a layer
+#*******************************************************************************
+def vec_rea(rrr_vec_fil,YV_fld=None,BS_geo=True,IV_fid=None):
+     #Returns a dictionary with one array per field (all fields unless the names
+     #of fields are given in YV_fld), the array of geometries (None unless
+     #BS_geo is True), and a dictionary with the number of features read
+     #(count), the coordinate system (crs_wkt) and the fiona schema of the
+     #layer. All features are read unless their sorted indices (starting at 0)
+     #are given in IV_fid, e.g. after a selection made on a few fields only.
+     if pyogrio is not None:
+          IM_met,IV_out,YV_wkb,YV_dat=pyogrio.raw.read(rrr_vec_fil,            \
+                                                       columns=YV_fld,         \
+                                                       read_geometry=BS_geo,   \
+                                                       fids=IV_fid)
+          IM_fld=dict(zip(IM_met['fields'],YV_dat))
+          YV_geo=shapely.from_wkb(YV_wkb) if BS_geo else None
+          with fiona.open(rrr_vec_fil,'r') as lay:
+               IM_sch=lay.schema
+               YS_crs=lay.crs_wkt
+          #The schema of pyogrio does not have the widths and precisions, and
+          #its coordinate system is not always given as full WKT
+          IM_prp={YS_fld:IM_sch['properties'][YS_fld] for YS_fld in IM_fld}
+          if IV_fid is None:
+               IS_ftr=pyogrio.read_info(rrr_vec_fil)['features']
+          else:
+               IS_ftr=len(IV_fid)
+          return IM_fld,YV_geo,{'count':IS_ftr,                                \
+                                'crs_wkt':YS_crs,                              \
+                                'schema':{'geometry':IM_sch['geometry'],       \
+                                          'properties':IM_prp}}
+
+     with fiona.open(rrr_vec_fil,'r') as lay:
+          IM_sch=lay.schema
+          IM_prp={YS_fld:YS_typ for YS_fld,YS_typ in                           \
+                  IM_sch['properties'].items()                                 \
+                  if YV_fld is None or YS_fld in YV_fld}
+          YM_val={YS_fld:[] for YS_fld in IM_prp}
+          YV_geo=[]
+          if IV_fid is None:
+               BV_fid=numpy.ones(len(lay),dtype=bool)
+          else:
+               BV_fid=numpy.zeros(len(lay),dtype=bool)
+               BV_fid[IV_fid]=True
+          for JS_ftr,ftr in enumerate(lay):
+               if not BV_fid[JS_ftr]: continue
+               for YS_fld in IM_prp:
+                    YM_val[YS_fld].append(ftr['properties'][YS_fld])
+               if BS_geo:
+                    YV_geo.append(ftr['geometry'])
+          IS_ftr=int(BV_fid.sum())
+          YS_crs=lay.crs_wkt
+     IM_fld={}
+     for YS_fld,YS_typ in IM_prp.items():
+          YS_typ=YS_typ.split(':')[0]
+          if None in YM_val[YS_fld] or YS_typ not in IM_vec_typ:
+               IM_fld[YS_fld]=numpy.array(YM_val[YS_fld],dtype=object)
+          else:
+               IM_fld[YS_fld]=numpy.array(YM_val[YS_fld],                      \
+                                          dtype=IM_vec_typ[YS_typ])
+     #Missing values are kept as None in arrays of objects
+     if BS_geo:
+          YV_geo=numpy.array([None if geo is None else                         \
+                              shapely.geometry.shape(geo) for geo in YV_geo],  \
+                             dtype=object)
+     else:
+          YV_geo=None
+     return IM_fld,YV_geo,{'count':IS_ftr,                                     \
+                           'crs_wkt':YS_crs,                                   \
+                           'schema':{'geometry':IM_sch['geometry'],            \
+                                     'properties':IM_prp}}
+
+
+#*******************************************************************************
+#Names of fields
+#*******************************************************************************
+def vec_fld(rrr_vec_fil):
+     #Returns the list of the names of the fields of a layer without reading its
+     #features, which allows reading only the fields needed with vec_rea().
+     if pyogrio is not None:
+          return list(pyogrio.read_info(rrr_vec_fil)['fields'])
+
+     with fiona.open(rrr_vec_fil,'r') as lay:
+          return list(lay.schema['properties'])
+
+
+#*******************************************************************************
+#Schema type of an array
+#*******************************************************************************
+def vec_sch(ZV_fld):
+     #Returns the fiona field type corresponding to the type of an array.
+     if numpy.issubdtype(ZV_fld.dtype,numpy.integer):
+          return 'int'
+     elif numpy.issubdtype(ZV_fld.dtype,numpy.floating):
+          return 'float'
+     else:
+          return 'str'
+
+
+#*******************************************************************************
+#Write a layer
+#*******************************************************************************
+def vec_wri(rrr_vec_fil,IM_fld,YV_geo,IM_met,YS_drv='ESRI Shapefile'):
+     #Writes a layer with one feature per geometry of YV_geo, the attributes
+     #being the arrays in IM_fld, and the coordinate system and schema being
+     #those of IM_met (as returned by vec_rea). Fields missing from the schema
+     #get the type of their array. The layer is written by fiona if the schema
+     #has widths or precisions, which pyogrio would replace by its defaults.
+     IM_prp={YS_fld:IM_met['schema']['properties'][YS_fld]                     \
+             if YS_fld in IM_met['schema']['properties']                       \
+             else vec_sch(numpy.asarray(IM_fld[YS_fld])) for YS_fld in IM_fld}
+
+     if pyogrio is not None and                                                \
+        all(':' not in YS_typ for YS_typ in IM_prp.values()):
+          YV_dat=[numpy.asarray(IM_fld[YS_fld]) for YS_fld in IM_fld]
+          pyogrio.raw.write(rrr_vec_fil,shapely.to_wkb(YV_geo),YV_dat,         \
+                            fields=list(IM_fld),crs=IM_met['crs_wkt'],         \
+                            geometry_type=IM_met['schema']['geometry'],        \
+                            driver=YS_drv)
+          return
+
+     YV_fld=list(IM_fld)
+     YV_val=[numpy.asarray(IM_fld[YS_fld]).tolist() for YS_fld in YV_fld]
+     #Python values are needed by fiona
+     with fiona.open(rrr_vec_fil,'w',driver=YS_drv,crs_wkt=IM_met['crs_wkt'],  \
+                     schema={'geometry':IM_met['schema']['geometry'],          \
+                             'properties':IM_prp}) as lay:
+          lay.writerecords({'geometry':shapely.geometry.mapping(geo),          \
+                            'properties':{YV_fld[JS_fld]:YV_val[JS_fld][JS_ftr]\
+                                          for JS_fld in range(len(YV_fld))}}   \
+                           for JS_ftr,geo in enumerate(YV_geo))
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
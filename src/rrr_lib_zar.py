@@ -0,0 +1,231 @@
+#*******************************************************************************
+#rrr_lib_zar.py
+#*******************************************************************************
+
+#Purpose:
+#This module gathers the tools used to store variables of size (time x rivid)
+#such as m3_riv, Qout, and V in Zarr stores instead of netCDF files. A Zarr
+#store holds the same dimensions, variables, and attributes as the netCDF file
+#it replaces, the names of the dimensions of each array being saved in its
+#_ARRAY_DIMENSIONS attribute so that the store can be read by xarray. The
+#unlimited time dimension of netCDF files is given its final size when a store
+#is created, after which independent processes can write disjoint blocks of
+#time steps at the same time as long as each block is made of whole chunks.
+#The zarr package is optional and only needed by programs that use Zarr stores.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import netCDF4
+import numpy
+import rrr_lib_ncf
+try:
+     import zarr
+     import numcodecs
+except ImportError:
+     zarr=None
+
+
+#*******************************************************************************
+#Declaration of variables
+#*******************************************************************************
+YS_zar_dim='_ARRAY_DIMENSIONS'
+#Name of the attribute with the names of the dimensions of each array
+YV_zar_unl=['time','Time']
+#Names of the dimensions that are unlimited in netCDF files
+ZS_zar_mix=0.5
+#Weight of map reads versus time series reads for the default chunk sizes
+
+
+#*******************************************************************************
+#Check availability of zarr
+#*******************************************************************************
+def zar_imp():
+     #Stops the program if the zarr package is not available.
+     if zarr is None:
+          print('ERROR - The zarr package is needed to use Zarr stores')
+          raise SystemExit(22)
+
+
+#*******************************************************************************
+#Default chunk sizes
+#*******************************************************************************
+def zar_rec(IS_tim,IS_riv,IS_siz):
+     #Returns the chunk shape (time, rivid) recommended by rrr_lib_ncf.ncf_rec()
+     #with the default costs, which balances the reading of all river reaches
+     #for a given time (maps) and that of all times for a given river reach
+     #(time series).
+     return rrr_lib_ncf.ncf_rec(max(IS_tim,1),max(IS_riv,1),IS_siz,            \
+                                rrr_lib_ncf.ZS_ovh,rrr_lib_ncf.ZS_val,         \
+                                ZS_zar_mix)
+
+
+#*******************************************************************************
+#Storage options
+#*******************************************************************************
+def zar_opt(IM_opt,IS_siz):
+     #Returns the Zarr compressor and filters that are equivalent to the netCDF
+     #storage options in IM_opt (zlib, complevel, shuffle).
+     if not IM_opt.get('zlib'):
+          return None,None
+     YV_flt=None
+     if IM_opt.get('shuffle'):
+          YV_flt=[numcodecs.Shuffle(elementsize=IS_siz)]
+     return numcodecs.Zlib(level=IM_opt.get('complevel',4)),YV_flt
+
+
+#*******************************************************************************
+#Attribute values
+#*******************************************************************************
+def zar_att(att):
+     #Returns the value of a netCDF attribute in a form that can be saved in the
+     #JSON metadata of Zarr stores.
+     if isinstance(att,(numpy.ndarray,numpy.generic)):
+          return att.tolist()
+     return att
+
+
+#*******************************************************************************
+#Create a Zarr store from a netCDF dataset
+#*******************************************************************************
+def zar_new(f1,rrr_zar_dir,YV_var,IS_time,IM_new=None):
+     #Creates a new Zarr store with the dimensions, variables and attributes of
+     #the netCDF dataset f1, copying the values of all variables but those of
+     #interest (e.g., lon, lat, rivid, time). The unlimited dimension is given
+     #IS_time, and the values of the variables along it are copied only if f1
+     #already has IS_time values. The storage options of IM_new (chunksizes,
+     #zlib, complevel, shuffle) replace those of f1 for the variables of
+     #interest, and their chunk sizes are recommended by zar_rec() otherwise.
+     #Other variables are stored in one chunk each. Returns the Zarr group.
+     zar_imp()
+     g=zarr.open_group(rrr_zar_dir,mode='w')
+     g.attrs.update({att:zar_att(f1.getncattr(att)) for att in f1.ncattrs()})
+
+     IM_dim={YS_dim:IS_time if dim.isunlimited() else len(dim)                 \
+             for YS_dim,dim in f1.dimensions.items()}
+
+     for YS_var,var in f1.variables.items():
+          IV_shp=tuple(IM_dim[YS_dim] for YS_dim in var.dimensions)
+          IV_chk=IV_shp
+          IM_opt={}
+          if YS_var in YV_var:
+               if f1.data_model.startswith('NETCDF4'):
+                    IM_flt=var.filters()
+                    if IM_flt is not None and IM_flt.get('zlib'):
+                         IM_opt['zlib']=True
+                         IM_opt['complevel']=IM_flt['complevel']
+                         IM_opt['shuffle']=IM_flt['shuffle']
+               if IM_new is not None: IM_opt.update(IM_new)
+               if IM_opt.get('chunksizes') is not None:
+                    IV_chk=tuple(IM_opt['chunksizes'])
+               elif len(IV_shp)==2:
+                    IV_chk=zar_rec(IV_shp[0],IV_shp[1],var.dtype.itemsize)
+          IV_chk=tuple(max(min(IS_chk,IS_shp),1)                               \
+                       for IS_chk,IS_shp in zip(IV_chk,IV_shp))
+          cmp,YV_flt=zar_opt(IM_opt,var.dtype.itemsize)
+          ZS_fil=var._FillValue if '_FillValue' in var.ncattrs() else None
+          arr=g.create_dataset(YS_var,shape=IV_shp,chunks=IV_chk,              \
+                               dtype=var.dtype,fill_value=ZS_fil,              \
+                               compressor=cmp,filters=YV_flt)
+          YM_att={att:zar_att(var.getncattr(att)) for att in var.ncattrs()     \
+                                                  if att!='_FillValue'}
+          YM_att[YS_zar_dim]=list(var.dimensions)
+          arr.attrs.update(YM_att)
+
+          if YS_var in YV_var or var.shape!=IV_shp: continue
+          ZM_val=var[...]
+          if numpy.ma.getmaskarray(ZM_val).all(): continue
+          #Values that were never written (e.g., crs) are left out
+          if ZS_fil is not None:
+               ZM_val=numpy.ma.filled(ZM_val,ZS_fil)
+          arr[...]=numpy.ma.getdata(ZM_val)
+
+     zarr.consolidate_metadata(rrr_zar_dir)
+     #All metadata in one object, which is faster to read
+     return g
+
+
+#*******************************************************************************
+#Create a netCDF file from a Zarr store
+#*******************************************************************************
+def zar_ncf(g1,rrr_ncf_out,YV_var,IM_new=None):
+     #Creates a new netCDF file with the dimensions, variables and attributes of
+     #the Zarr group g1, copying the values of all variables but those of
+     #interest, which keep the chunk sizes and compression of g1 unless they are
+     #given in IM_new. Returns the netCDF dataset.
+     zar_imp()
+     h=netCDF4.Dataset(rrr_ncf_out,'w',format='NETCDF4')
+
+     IM_dim=zar_dim(g1)
+     for YS_dim,IS_dim in IM_dim.items():
+          h.createDimension(YS_dim,None if YS_dim in YV_zar_unl else IS_dim)
+
+     h.setncatts(g1.attrs.asdict())
+
+     for YS_var,arr in g1.arrays():
+          IM_opt={}
+          if arr.fill_value is not None: IM_opt['fill_value']=arr.fill_value
+          if YS_var in YV_var:
+               IM_opt['chunksizes']=arr.chunks
+               if isinstance(arr.compressor,numcodecs.Zlib):
+                    IM_opt['zlib']=True
+                    IM_opt['complevel']=arr.compressor.level
+                    IM_opt['shuffle']=arr.filters is not None
+               if IM_new is not None: IM_opt.update(IM_new)
+          var=h.createVariable(YS_var,arr.dtype,tuple(arr.attrs[YS_zar_dim]),  \
+                               **IM_opt)
+          var.setncatts({att:val for att,val in arr.attrs.items()              \
+                                 if att!=YS_zar_dim})
+
+          if YS_var in YV_var: continue
+          YV_key=arr.store.listdir(arr.path)
+          if all(YS_key.startswith('.') for YS_key in YV_key): continue
+          #Arrays without any chunk were never written (e.g., crs)
+          if arr.shape==():
+               var.assignValue(arr[()])
+          else:
+               var[:]=arr[...]
+     return h
+
+
+#*******************************************************************************
+#Open a Zarr store
+#*******************************************************************************
+def zar_opn(rrr_zar_dir,YS_mod):
+     #Returns the Zarr group of an existing store, opened in mode YS_mod ('r'
+     #for reading, 'r+' for writing blocks of values).
+     zar_imp()
+     return zarr.open_group(rrr_zar_dir,mode=YS_mod)
+
+
+#*******************************************************************************
+#Dimensions of a Zarr store
+#*******************************************************************************
+def zar_dim(g1):
+     #Returns a dictionary with the size of each dimension of the Zarr group
+     #g1, as given by the _ARRAY_DIMENSIONS attribute of its arrays.
+     IM_dim={}
+     for YS_var,arr in g1.arrays():
+          IM_dim.update(zip(arr.attrs[YS_zar_dim],arr.shape))
+     return IM_dim
+
+
+#*******************************************************************************
+#Write a block of time steps
+#*******************************************************************************
+def zar_wri(rrr_zar_dir,YS_var,JS_time,ZM_blk):
+     #Writes the block ZM_blk of YS_var starting at time step JS_time. This can
+     #be done by several processes at the same time if their blocks are made of
+     #different whole chunks. Masked values are given the fill value.
+     arr=zar_opn(rrr_zar_dir,'r+')[YS_var]
+     if arr.fill_value is not None:
+          ZM_blk=numpy.ma.filled(ZM_blk,arr.fill_value)
+     arr[JS_time:JS_time+ZM_blk.shape[0]]=numpy.ma.getdata(ZM_blk)
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
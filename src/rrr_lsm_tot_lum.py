@@ -7,12 +7,15 @@
 #Given surface and subsurface runoff in a netCDF file, a value allowing for the
 #conversion between runoff units and kg m-2 (as accumulated over the time step
 #duration), and a shapefile referenced on a Geographic Coordinate System (i.e.
-#longitude, latitude), this script creates an intermediate shapefile with points
-#representative of the grid cell, computes the total discharge (accumulated
-#within the shapefile boundaries) for every time step of the runoff data, and
-#writes the associated time series in a CSV file. If the shapefile touches grid
-#cells that have NoData (e.g. coastal grid cells), these points are ignored in
-#the computations. Additional diagnostic quantities are also printed in stdout.
+#longitude, latitude), this script finds the grid cells whose centers are within
+#the shapefile boundaries, computes the total discharge (accumulated within the
+#shapefile boundaries) for every time step of the runoff data, and writes the
+#associated time series in a CSV file. If the shapefile touches grid cells that
+#have NoData (e.g. coastal grid cells), these points are ignored in the
+#computations. Additional diagnostic quantities are also printed in stdout.
+#The grid cell centers are tested for containment all at once using a spatial
+#index (STRtree), and the runoff is read in blocks of time steps limited to the
+#bounding box of the selected grid cells.
 #Author:
 #Cedric H. David, 2018-2023
 
@@ -25,38 +28,42 @@ import netCDF4
 import numpy
 import datetime
 import fiona
+import shapely
 import shapely.geometry
-import shapely.prepared
-import rtree
-import math
 import csv
 
 
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_val_blk=50000000
+#The number of runoff values read from the netCDF file at once, which determines
+#the number of time steps processed in each block (200 MB for float32)
+
+
 #*******************************************************************************
 #Declaration of variables (given as command line arguments)
 #*******************************************************************************
 # 1 - rrr_lsm_ncf
 # 2 - ZS_conv
 # 3 - rrr_pol_shp
-# 4 - rrr_pnt_shp
-# 5 - YS_riv_id
-# 6 - rrr_var_csv
+# 4 - YS_riv_id
+# 5 - rrr_var_csv
 
 
 #*******************************************************************************
 #Get command line arguments
 #*******************************************************************************
 IS_arg=len(sys.argv)
-if IS_arg != 7:
-     print('ERROR - 6 and only 6 arguments can be used')
+if IS_arg != 6:
+     print('ERROR - 5 and only 5 arguments can be used')
      raise SystemExit(22) 
 
 rrr_lsm_ncf=sys.argv[1]
 ZS_conv=eval(sys.argv[2])
 rrr_pol_shp=sys.argv[3]
-rrr_pnt_shp=sys.argv[4]
-YS_riv_id=sys.argv[5]
-rrr_var_csv=sys.argv[6]
+YS_riv_id=sys.argv[4]
+rrr_var_csv=sys.argv[5]
 
 
 #*******************************************************************************
@@ -66,7 +73,6 @@ print('Command line inputs')
 print(' - '+rrr_lsm_ncf)
 print(' - '+str(ZS_conv))
 print(' - '+rrr_pol_shp)
-print(' - '+rrr_pnt_shp)
 print(' - '+YS_riv_id)
 print(' - '+rrr_var_csv)
 
@@ -114,8 +120,8 @@ print(' - The number of time steps is: '+str(IS_lsm_time))
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 #Get values of dimension arrays
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-ZV_lsm_lon=f.variables['lon']
-ZV_lsm_lat=f.variables['lat']
+ZV_lsm_lon=numpy.asarray(f.variables['lon'][:],dtype=numpy.float64)
+ZV_lsm_lat=numpy.asarray(f.variables['lat'][:],dtype=numpy.float64)
 ZV_lsm_time=f.variables['time']
 ZV_lsm_tbds=f.variables['time_bnds']
 
@@ -196,36 +202,20 @@ print(' - The number of polygon features is: '+str(IS_pol_tot))
 
 
 #*******************************************************************************
-#Create a point shapefile with all the LSM grid cells
+#Create points for all the LSM grid cells
 #*******************************************************************************
-print('Create a point shapefile with all the LSM grid cells')
-
-rrr_pol_drv=rrr_pol_lay.driver
-rrr_pnt_drv=rrr_pol_drv
+print('Create points for all the LSM grid cells')
 
-rrr_pol_crs=rrr_pol_lay.crs
-rrr_pnt_crs=rrr_pol_crs.copy()
+IM_lsm_lon,IM_lsm_lat=numpy.meshgrid(numpy.arange(IS_lsm_lon),                 \
+                                     numpy.arange(IS_lsm_lat),indexing='ij')
+IV_pnt_lon=IM_lsm_lon.ravel()
+IV_pnt_lat=IM_lsm_lat.ravel()
+#The indices of all grid cells, looping on latitudes within longitudes
 
-rrr_pnt_sch={'geometry': 'Point',                                              \
-             'properties': {'JS_lsm_lon': 'int:4',                             \
-                            'JS_lsm_lat': 'int:4'}}
+rrr_pnt_shy=shapely.points(ZV_lsm_lon[IV_pnt_lon],ZV_lsm_lat[IV_pnt_lat])
+#An array of shapely points at the centers of all grid cells
 
-with fiona.open(rrr_pnt_shp,'w',driver=rrr_pnt_drv,                            \
-                                crs=rrr_pnt_crs,                               \
-                                schema=rrr_pnt_sch) as rrr_pnt_lay:
-     for JS_lsm_lon in range(IS_lsm_lon):
-          ZS_lsm_lon=ZV_lsm_lon[JS_lsm_lon]
-          for JS_lsm_lat in range(IS_lsm_lat):
-               ZS_lsm_lat=ZV_lsm_lat[JS_lsm_lat]
-               rrr_pnt_prp={'JS_lsm_lon': JS_lsm_lon, 'JS_lsm_lat': JS_lsm_lat}
-               rrr_pnt_geo=shapely.geometry.mapping(                           \
-                                shapely.geometry.Point((ZS_lsm_lon,ZS_lsm_lat)))
-               rrr_pnt_lay.write({                                             \
-                                  'properties': rrr_pnt_prp,                   \
-                                  'geometry': rrr_pnt_geo,                     \
-                                  })
-
-print(' - New shapefile created')
+print(' - The number of points created is: '+str(len(rrr_pnt_shy)))
 
 
 #*******************************************************************************
@@ -233,15 +223,7 @@ print(' - New shapefile created')
 #*******************************************************************************
 print('Create spatial index for the bounds of each point feature')
 
-rrr_pnt_lay=fiona.open(rrr_pnt_shp, 'r')
-
-index=rtree.index.Index()
-for rrr_pnt_fea in rrr_pnt_lay:
-     rrr_pnt_fid=int(rrr_pnt_fea['id'])
-     #the first argument of index.insert has to be 'int', not 'long' or 'str'
-     rrr_pnt_shy=shapely.geometry.shape(rrr_pnt_fea['geometry'])
-     index.insert(rrr_pnt_fid, rrr_pnt_shy.bounds)
-     #creates an index between the feature ID and the bounds of that feature
+rrr_pnt_tre=shapely.STRtree(rrr_pnt_shy)
 
 print(' - Spatial index created')
 
@@ -251,24 +233,18 @@ print(' - Spatial index created')
 #*******************************************************************************
 print('Find LSM grid cells that intersect with the polygon')
 
-IS_dom_tot=0
-IV_dom_lon=[]
-IV_dom_lat=[]
-
-for rrr_pol_fea in rrr_pol_lay:
-     rrr_pol_shy=shapely.geometry.shape(rrr_pol_fea['geometry'])
-     rrr_pol_pre=shapely.prepared.prep(rrr_pol_shy)
-     #a 'prepared' geometry allows for faster processing after
-     for rrr_pnt_fid in [int(x) for x in                                       \
-                                  list(index.intersection(rrr_pol_shy.bounds))]:
-          rrr_pnt_fea=rrr_pnt_lay[rrr_pnt_fid]
-          rrr_pnt_shy=shapely.geometry.shape(rrr_pnt_fea['geometry'])
-          if rrr_pol_pre.contains(rrr_pnt_shy):
-               JS_dom_lon=rrr_pnt_fea['properties']['JS_lsm_lon']
-               JS_dom_lat=rrr_pnt_fea['properties']['JS_lsm_lat']
-               IV_dom_lon.append(JS_dom_lon)
-               IV_dom_lat.append(JS_dom_lat)
-               IS_dom_tot=IS_dom_tot+1
+rrr_pol_shy=numpy.array([shapely.geometry.shape(rrr_pol_fea['geometry'])       \
+                         for rrr_pol_fea in rrr_pol_lay])
+
+IV_pai_pol,IV_pai_pnt=rrr_pnt_tre.query(rrr_pol_shy,predicate='contains')
+#All pairs of polygons and points where the polygon contains the point, the
+#predicate is evaluated on prepared polygons
+IV_pai_srt=numpy.lexsort((IV_pai_pnt,IV_pai_pol))
+IV_pai_pnt=IV_pai_pnt[IV_pai_srt]
+
+IV_dom_lon=IV_pnt_lon[IV_pai_pnt]
+IV_dom_lat=IV_pnt_lat[IV_pai_pnt]
+IS_dom_tot=len(IV_pai_pnt)
  
 print(' - The number of grid cells found is: '+str(IS_dom_tot))
 
@@ -279,14 +255,15 @@ print(' - The number of grid cells found is: '+str(IS_dom_tot))
 #Geospatial operations can be very computationally demanding unless some tricks
 #are used. My experience has indicated that:
 # - One should build the spatial index on the features that are the most 
-#   numerous. That is because the index.intersection() function is very fast and
+#   numerous. That is because the STRtree.query() function is very fast and
 #   hence allows for a near instantaneous subselection of only those out of many 
 #   features that are potentially within the desired spatial scope.
 # - For the features that are relatively less numerous (not the ones above), one
 #   should 'prepare' the geometry before performing the desired geospatial
 #   operation and use the prepared objects in the operation. This step is
 #   particularly key when the geometry is made of many points because it 
-#   dramatically speeds up the geospatial operations.
+#   dramatically speeds up the geospatial operations. STRtree.query() does so
+#   for its input geometries when a predicate is given.
 
 
 #*******************************************************************************
@@ -294,16 +271,12 @@ print(' - The number of grid cells found is: '+str(IS_dom_tot))
 #*******************************************************************************
 print('Compute surface area of intersecting grid cells')
 
-ZV_dom_sqm=[0]*IS_dom_tot
-for JS_dom_tot in range(IS_dom_tot):
-     JS_lsm_lat=IV_dom_lat[JS_dom_tot]
-     ZS_lsm_lat=ZV_lsm_lat[JS_lsm_lat]
-     ZV_dom_sqm[JS_dom_tot]=6371000*math.radians(ZS_lsm_lat_stp)               \
-                           *6371000*math.radians(ZS_lsm_lon_stp)               \
-                           *math.cos(math.radians(ZS_lsm_lat))
+ZV_dom_sqm=6371000*numpy.radians(ZS_lsm_lat_stp)                               \
+          *6371000*numpy.radians(ZS_lsm_lon_stp)                               \
+          *numpy.cos(numpy.radians(ZV_lsm_lat[IV_dom_lat]))
 
 print(' - The total area covered by all grid cells that intersect the river'   \
-      +' basin is: '+str(sum(ZV_dom_sqm))+' m^2')
+      +' basin is: '+str(ZV_dom_sqm.sum())+' m^2')
 
 
 #*******************************************************************************
@@ -323,16 +296,10 @@ if (not numpy.ma.is_masked(ZM_rsb_var)):
 #a masked array. The conversion to a mask array with no masked values allows
 #simplifying the code below.
 
-IS_dom_msk=0
-ZS_sqm=0
-for JS_dom_tot in range(IS_dom_tot):
-     JS_lsm_lon=IV_dom_lon[JS_dom_tot]
-     JS_lsm_lat=IV_dom_lat[JS_dom_tot]
-     if (ZM_rsf_var.mask[JS_lsm_lat,JS_lsm_lon] or                             \
-         ZM_rsb_var.mask[JS_lsm_lat,JS_lsm_lon]):
-          IS_dom_msk=IS_dom_msk+1
-     else:
-          ZS_sqm=ZS_sqm+ZV_dom_sqm[JS_dom_tot]
+BV_dom_msk=numpy.ma.getmaskarray(ZM_rsf_var)[IV_dom_lat,IV_dom_lon]           \
+          |numpy.ma.getmaskarray(ZM_rsb_var)[IV_dom_lat,IV_dom_lon]
+IS_dom_msk=int(BV_dom_msk.sum())
+ZS_sqm=ZV_dom_sqm[~BV_dom_msk].sum()
 
 print(' - The number of NoData points found is: '+str(IS_dom_msk))
 print(' - The total area of the river basin (after removing NoData points)'    \
@@ -344,31 +311,33 @@ print(' - The total area of the river basin (after removing NoData points)'    \
 #*******************************************************************************
 print('Compute spatially integrated total runoff')
 
-ZV_var=[]
-for JS_lsm_time in range(IS_lsm_time):
-     ZM_rsf_var=f.variables[YS_rsf_nam][JS_lsm_time,:,:]
-     ZM_rsb_var=f.variables[YS_rsb_nam][JS_lsm_time,:,:]
-     if (not numpy.ma.is_masked(ZM_rsf_var)):
-          ZM_rsf_var=numpy.ma.masked_array(ZM_rsf_var, mask=ZM_rsf_var*0)
-     if (not numpy.ma.is_masked(ZM_rsb_var)):
-          ZM_rsb_var=numpy.ma.masked_array(ZM_rsb_var, mask=ZM_rsb_var*0)
-     ZS_var=0
-     ZV_rsf_var=ZM_rsf_var[IV_dom_lat,IV_dom_lon]
-     ZV_rsb_var=ZM_rsb_var[IV_dom_lat,IV_dom_lon]
-     #Accessing all values at once using multidimensional list-of-locations 
-     #indexing is much faster that looping through the values individually.
-     ZV_rsf_var=numpy.ma.filled(ZV_rsf_var,fill_value=0)
-     ZV_rsb_var=numpy.ma.filled(ZV_rsb_var,fill_value=0)
-     #Replacing masked (fill) values by 0
-     ZV_rsf_var=ZS_conv*ZV_rsf_var*0.001
-     ZV_rsb_var=ZS_conv*ZV_rsb_var*0.001
-     #Conversion into kg m-2 and then conversion into m
-     ZV_dom_var=(ZV_rsf_var+ZV_rsb_var)*ZV_dom_sqm
-     #Elementwise addition and multiplication
-     ZS_var=sum(ZV_dom_var)
-     #Spatial accumulation
-     ZV_var.append(ZS_var)
-     #Update time series
+ZV_var=numpy.zeros(IS_lsm_time)
+if IS_dom_tot>0:
+     IS_lat_min=IV_dom_lat.min()
+     IS_lat_max=IV_dom_lat.max()+1
+     IS_lon_min=IV_dom_lon.min()
+     IS_lon_max=IV_dom_lon.max()+1
+     #The bounding box of the grid cells within the domain
+     IS_blk=max(1,IS_val_blk//((IS_lat_max-IS_lat_min)*(IS_lon_max-IS_lon_min)))
+     for JS_lsm_time in range(0,IS_lsm_time,IS_blk):
+          JS_lsm_tend=min(JS_lsm_time+IS_blk,IS_lsm_time)
+          ZM_rsf_var=f.variables[YS_rsf_nam][JS_lsm_time:JS_lsm_tend,          \
+                                             IS_lat_min:IS_lat_max,            \
+                                             IS_lon_min:IS_lon_max]
+          ZM_rsb_var=f.variables[YS_rsb_nam][JS_lsm_time:JS_lsm_tend,          \
+                                             IS_lat_min:IS_lat_max,            \
+                                             IS_lon_min:IS_lon_max]
+          ZM_rsf_var=ZM_rsf_var[:,IV_dom_lat-IS_lat_min,IV_dom_lon-IS_lon_min]
+          ZM_rsb_var=ZM_rsb_var[:,IV_dom_lat-IS_lat_min,IV_dom_lon-IS_lon_min]
+          #Accessing all values at once using multidimensional list-of-locations
+          #indexing is much faster that looping through the values individually.
+          ZM_dom_var=numpy.ma.filled(ZM_rsf_var,fill_value=0)                  \
+                    .astype(numpy.float64)                                     \
+                    +numpy.ma.filled(ZM_rsb_var,fill_value=0)
+          #Replacing masked (fill) values by 0
+          ZV_var[JS_lsm_time:JS_lsm_tend]=ZS_conv*0.001*(ZM_dom_var@ZV_dom_sqm)
+          #Conversion into kg m-2 and then conversion into m, and spatial
+          #accumulation for all time steps of the block
 #At this point, ZV_var is a timeseries with the total accumulated volume at each
 #time step, in m3.
 
@@ -410,7 +379,8 @@ with open(rrr_var_csv, 'w') as csvfile:
      csvwriter = csv.writer(csvfile, dialect='excel')
      csvwriter.writerow(['Lumped',YS_riv_id])
      for JS_lsm_time in range(IS_lsm_time):
-          IV_line=[YV_lsm_time[JS_lsm_time],ZV_var[JS_lsm_time]/ZS_lsm_time_stp]
+          IV_line=[YV_lsm_time[JS_lsm_time],                                   \
+                   float(ZV_var[JS_lsm_time]/ZS_lsm_time_stp)]
           csvwriter.writerow(IV_line)
 
 
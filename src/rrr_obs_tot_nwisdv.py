@@ -25,6 +25,13 @@
 #     - value n
 #     - qualifier
 #     - method
+#Several gauges are requested at once, and several of these requests are sent
+#concurrently through a pooled HTTP session, with exponential backoff on
+#failures. The XML responses are parsed incrementally, one timeSeries at a time.
+#If a cache directory is given, the raw timeSeries of each gauge is stored
+#there in a file named after the gauge code and the date range, and gauges that
+#are already in the cache are not requested again. The web service URL can be
+#changed with the RRR_NWIS_URL environment variable (e.g. for a local server).
 #Author:
 #Cedric H. David, 2013-2023
 
@@ -33,12 +40,32 @@
 #Import Python modules
 #*******************************************************************************
 import sys
+import os
+import time
 import fiona
 import shapely.geometry
 import requests
 from lxml import etree
 import datetime
 import csv
+import concurrent.futures
+
+
+#*******************************************************************************
+#Domain specific hard-coded variables
+#*******************************************************************************
+url=os.environ.get('RRR_NWIS_URL','http://waterservices.usgs.gov/nwis/dv/')
+#The NWIS daily values web service
+
+IS_bat=50
+#The number of gauges requested at once
+IS_thr=4
+#The number of requests sent concurrently
+IS_try=10
+#The number of times a failed request is repeated
+ZS_bck=1.0
+#The duration (s) of the first wait before repeating a request, doubled after
+#each failure
 
 
 #*******************************************************************************
@@ -50,14 +77,15 @@ import csv
 # 4 - rrr_obs_csv
 # 5 - rrr_flw_csv
 # 6 - rrr_ful_shp
+#(7)- rrr_cch_dir
 
 
 #*******************************************************************************
 #Get command line arguments
 #*******************************************************************************
 IS_arg=len(sys.argv)
-if IS_arg != 7:
-     print('ERROR - 6 and only 6 arguments can be used')
+if IS_arg < 7 or IS_arg > 8:
+     print('ERROR - A minimum of 6 and a maximum of 7 arguments can be used')
      raise SystemExit(22) 
 
 rrr_obs_shp=sys.argv[1]
@@ -66,6 +94,8 @@ rrr_end_dat=sys.argv[3]
 rrr_obs_csv=sys.argv[4]
 rrr_flw_csv=sys.argv[5]
 rrr_ful_shp=sys.argv[6]
+if IS_arg > 7:
+     rrr_cch_dir=sys.argv[7]
 
 
 #*******************************************************************************
@@ -78,6 +108,7 @@ print('- '+rrr_end_dat)
 print('- '+rrr_obs_csv)
 print('- '+rrr_flw_csv)
 print('- '+rrr_ful_shp)
+if IS_arg > 7: print('- '+rrr_cch_dir)
 
 
 #*******************************************************************************
@@ -90,6 +121,10 @@ except IOError as e:
      print('ERROR - Unable to open '+rrr_obs_shp)
      raise SystemExit(22) 
 
+if 'rrr_cch_dir' in locals() and not os.path.isdir(rrr_cch_dir):
+     print('ERROR - Unable to find directory '+rrr_cch_dir)
+     raise SystemExit(22) 
+
 
 #*******************************************************************************
 #Open rrr_obs_shp
@@ -120,10 +155,107 @@ else:
 
 IV_obs_all_id=[]
 IV_obs_all_code=[]
-for JS_obs_all in range(IS_obs_all):
-     IV_obs_all_id.append(int(rrr_obs_lay[JS_obs_all]['properties'][YV_obs_id]))
-     IV_obs_all_code.append(                                                   \
-                        str(rrr_obs_lay[JS_obs_all]['properties'][YV_obs_code]))
+for rrr_obs_fea in rrr_obs_lay:
+     IV_obs_all_id.append(int(rrr_obs_fea['properties'][YV_obs_id]))
+     IV_obs_all_code.append(str(rrr_obs_fea['properties'][YV_obs_code]))
+
+
+#*******************************************************************************
+#Functions for retrieving and parsing data from the web service
+#*******************************************************************************
+nws_ses=requests.Session()
+nws_ses.mount('http://',requests.adapters.HTTPAdapter(pool_connections=1,      \
+                                                      pool_maxsize=IS_thr))
+nws_ses.mount('https://',requests.adapters.HTTPAdapter(pool_connections=1,     \
+                                                       pool_maxsize=IS_thr))
+#A session reuses its connections across requests, one per concurrent request
+
+def nws_get(payload):
+     #Requests data from the web service and returns the response with its
+     #content not yet downloaded. The request is repeated, waiting longer each
+     #time, only if the connection fails or if the status code is 429 (too many
+     #requests) or 5xx (server error). Other status codes are errors that would
+     #be the same if repeated. A 404 status code means that none of the sites
+     #has data.
+     for JS_try in range(IS_try+1):
+          try:
+               data=nws_ses.get(url,params=payload,stream=True,timeout=300)
+          except (requests.exceptions.ConnectionError,                         \
+                  requests.exceptions.Timeout) as e:
+               YS_err=type(e).__name__
+          except requests.exceptions.RequestException as e:
+               print('ERROR - '+type(e).__name__+' raised for '                \
+                     +str(payload['sites']))
+               raise SystemExit(22)
+          else:
+               if data.status_code==200 or data.status_code==404:
+                    return data
+               YS_err='Status code '+str(data.status_code)
+               data.close()
+               if data.status_code!=429 and data.status_code<500:
+                    print('ERROR - '+YS_err+' returned for '                   \
+                          +str(payload['sites']))
+                    raise SystemExit(22)
+          if JS_try<IS_try:
+               time.sleep(ZS_bck*2**JS_try)
+     print('ERROR - '+YS_err+' raised for '+str(payload['sites']))
+     raise SystemExit(22) 
+
+def nws_prs(src):
+     #Parses the XML data from a file-like object one timeSeries at a time, and
+     #returns a dictionary associating each site code with its raw timeSeries
+     #(only the first timeSeries of each site is kept)
+     YH_raw={}
+     for event,elem in etree.iterparse(src,events=('end',),tag='{*}timeSeries'):
+          YS_cod=elem.find('{*}sourceInfo/{*}siteCode').text
+          if YS_cod not in YH_raw:
+               YH_raw[YS_cod]=etree.tostring(elem)
+          elem.clear()
+          while elem.getprevious() is not None:
+               del elem.getparent()[0]
+          #Releasing the memory used by the timeSeries already processed
+     return YH_raw
+
+def nws_val(YS_raw):
+     #Returns the list of values in the first 'values' element of a raw
+     #timeSeries, or None if there is no timeSeries
+     if not YS_raw:
+          return None
+     elem=etree.fromstring(YS_raw)
+     val=elem.find('{*}values')
+     if val is None:
+          print('ERROR - Unexpected XML structure for '+                       \
+                 elem.find('{*}sourceInfo/{*}siteCode').text)
+          raise SystemExit(22) 
+     return [x.text for x in val.iterfind('{*}value')]
+
+def nws_cch(YS_cod):
+     #Returns the name of the cache file for a given site code and date range
+     return os.path.join(rrr_cch_dir,                                          \
+                         YS_cod+'_'+rrr_str_dat+'_'+rrr_end_dat+'.xml')
+
+def nws_bat(YV_cod):
+     #Downloads the data for a batch of site codes, caches the raw timeSeries
+     #of each site if requested, and returns the values of each site
+     bat_pay=payload.copy()
+     bat_pay['sites']=','.join(YV_cod)
+     data=nws_get(bat_pay)
+     if data.status_code==404:
+          YH_raw={}
+     else:
+          data.raw.decode_content=True
+          YH_raw=nws_prs(data.raw)
+     data.close()
+     ZH_val={}
+     for YS_cod in YV_cod:
+          YS_raw=YH_raw.get(YS_cod,b'')
+          if 'rrr_cch_dir' in globals():
+               with open(nws_cch(YS_cod)+'.tmp','wb') as cch_fil:
+                    cch_fil.write(YS_raw)
+               os.replace(nws_cch(YS_cod)+'.tmp',nws_cch(YS_cod))
+               #An empty cache file means that the site has no data
+          ZH_val[YS_cod]=nws_val(YS_raw)
+     return ZH_val
 
 
 #*******************************************************************************
@@ -131,8 +263,6 @@ for JS_obs_all in range(IS_obs_all):
 #*******************************************************************************
 print('Check that service works for one known value')
 
-url='http://waterservices.usgs.gov/nwis/dv/'
-
 payload={}
 payload['format']='waterml'
 payload['sites']='08176500'
@@ -146,10 +276,12 @@ payload['statCd']='00003'
 #                                        &endDT=2004-01-01&statCd=00003
 #Note: payload = {'key1': 'value1', 'key2': 'value2'}
 
-data=requests.get(url,payload)
-tree = etree.fromstring(data.content)
+data=nws_get(payload)
+data.raw.decode_content=True
+YH_raw=nws_prs(data.raw)
+data.close()
 
-if tree[1][2][0].text=='1060':
+if (nws_val(YH_raw.get('08176500',b'')) or [])[:1]==['1060']:
      print('- Successfully checked value for Guadalupe River at Victoria, TX,'+\
           ' for 2004-01-01')
 else:
@@ -169,67 +301,50 @@ IS_time=( datetime.datetime.strptime(rrr_end_dat,'%Y-%m-%d')                   \
          -datetime.datetime.strptime(rrr_str_dat,'%Y-%m-%d')).days+1
 print('- A full data record would have '+str(IS_time)+' daily data points')
 
+#-------------------------------------------------------------------------------
+#Obtain data from cache or webservice
+#-------------------------------------------------------------------------------
+ZH_obs_all_val={}
+YV_obs_req=[]
+for YS_cod in IV_obs_all_code:
+     if YS_cod in ZH_obs_all_val or YS_cod in YV_obs_req:
+          continue
+     if 'rrr_cch_dir' in locals() and os.path.isfile(nws_cch(YS_cod)):
+          with open(nws_cch(YS_cod),'rb') as cch_fil:
+               ZH_obs_all_val[YS_cod]=nws_val(cch_fil.read())
+     else:
+          YV_obs_req.append(YS_cod)
+print('- The number of gauges found in cache is: '+str(len(ZH_obs_all_val)))
+
 print('- Downloading data for the requested interval')
+YM_obs_bat=[YV_obs_req[JS_bat:JS_bat+IS_bat]                                   \
+            for JS_bat in range(0,len(YV_obs_req),IS_bat)]
+print('- The number of requests is: '+str(len(YM_obs_bat)))
+with concurrent.futures.ThreadPoolExecutor(max_workers=IS_thr) as executor:
+     for ZH_val in executor.map(nws_bat,YM_obs_bat):
+          ZH_obs_all_val.update(ZH_val)
+
+#-------------------------------------------------------------------------------
+#Store information for full sites only
+#-------------------------------------------------------------------------------
 IV_obs_ful_id=[]
 IV_obs_ful_code=[]
 ZM_obs_ful_data={}
 for JS_obs_all in range(IS_obs_all):
-     #--------------------------------------------------------------------------
-     #Obtain XML data from webservice
-     #--------------------------------------------------------------------------
-     payload['sites']=IV_obs_all_code[JS_obs_all]
-     #Update station code 
-     data=requests.get(url,payload)
-     #Request data
-     for JS_try in range(10):
-          if data.status_code!=200:
-               data=requests.get(url,payload)
-     #Repeat the request another 10 times if the status code is not 'OK' (200)
-     if data.status_code!=200:
-          print('ERROR - Status code '+str(data.status_code)+' raised for '+   \
-                str(payload['sites']))
-          raise SystemExit(22) 
-     #Make sure request did not fail
-
-     #--------------------------------------------------------------------------
-     #Process XML data
-     #--------------------------------------------------------------------------
-     tree = etree.fromstring(data.content)
-     if len(tree) < 2:
+     YV_val=ZH_obs_all_val[IV_obs_all_code[JS_obs_all]]
+     if YV_val is None:
           print('   . '+str(JS_obs_all+1)+'/'+str(IS_obs_all)+' '              \
                        +str(IV_obs_all_code[JS_obs_all])+' has no data')
-     else: 
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          #Check that XML structure is as expected
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          if tree[1].tag[-10:]!='timeSeries' or tree[1][2].tag[-6:]!='values':
-               print('ERROR - Unexpected XML structure for '+                  \
-                      str(payload['sites']))
-               raise SystemExit(22) 
-
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          #Count the number of data points 
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          IS_data=0
-          for JS_values in range(len(tree[1][2])):
-               if tree[1][2][JS_values].tag[-5:]=='value':
-                    IS_data=IS_data+1
-
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          #Store information for full sites only
-          #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-          if IS_data!=IS_time:
-               print('   . '+str(JS_obs_all+1)+'/'+str(IS_obs_all)+' '         \
-                            +str(IV_obs_all_code[JS_obs_all])+' has some data')
-          else:
-               print('   . '+str(JS_obs_all+1)+'/'+str(IS_obs_all)+' '         \
-                            +str(IV_obs_all_code[JS_obs_all])+' has full data')
-               IV_obs_ful_id.append(IV_obs_all_id[JS_obs_all])
-               IV_obs_ful_code.append(IV_obs_all_code[JS_obs_all])
-               ZM_obs_ful_data[IV_obs_all_code[JS_obs_all]]=[]
-               for JS_time in range(IS_time):
-                    ZM_obs_ful_data[IV_obs_all_code[JS_obs_all]].append(       \
-                                                float(tree[1][2][JS_time].text))
+     elif len(YV_val)!=IS_time:
+          print('   . '+str(JS_obs_all+1)+'/'+str(IS_obs_all)+' '              \
+                       +str(IV_obs_all_code[JS_obs_all])+' has some data')
+     else:
+          print('   . '+str(JS_obs_all+1)+'/'+str(IS_obs_all)+' '              \
+                       +str(IV_obs_all_code[JS_obs_all])+' has full data')
+          IV_obs_ful_id.append(IV_obs_all_id[JS_obs_all])
+          IV_obs_ful_code.append(IV_obs_all_code[JS_obs_all])
+          ZM_obs_ful_data[IV_obs_all_code[JS_obs_all]]=                        \
+                                                  [float(x) for x in YV_val]
 
 IS_obs_ful=len(IV_obs_ful_id)
 print('- The number of gauges with full data record is: '+str(IS_obs_ful))
@@ -303,8 +418,7 @@ rrr_ful_lay=fiona.open(rrr_ful_shp, 'w',                                       \
                        )
 print('- New shapefile created')
 
-for JS_obs_all in range(IS_obs_all):
-     rrr_obs_fea=rrr_obs_lay[JS_obs_all]
+for rrr_obs_fea in rrr_obs_lay:
      rrr_obs_prp=rrr_obs_fea['properties']
      if rrr_obs_prp[YV_obs_code] in IV_obs_tot_code:
           rrr_obs_geo=rrr_obs_fea['geometry']
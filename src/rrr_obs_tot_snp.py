@@ -12,7 +12,10 @@
 #within the buffer around each gauge. Magnitude is checked by ensuring that
 #gauge_discharge is within [1/factor, factor]*river_discharge. Potential
 #duplicate gauges on any given river reach are also filtered by distance, name,
-#and magnitude.
+#and magnitude. Geometries are loaded once into arrays of shapely geometries,
+#the buffers of all gauges are queried in bulk against a spatial index (STRtree)
+#of the river reaches, and the distances of all gauge/reach pairs are computed
+#at once.
 #Author:
 #Cedric H. David, 2022-2023
 
@@ -22,9 +25,9 @@
 #*******************************************************************************
 import sys
 import fiona
+import numpy
+import shapely
 import shapely.geometry
-import shapely.prepared
-import rtree
 
 
 #*******************************************************************************
@@ -103,6 +106,13 @@ else:
 IS_obs_shp=len(rrr_obs_lay)
 print(' - The number of gauge features is: '+str(IS_obs_shp))
 
+rrr_obs_fea=[fea for fea in rrr_obs_lay]
+#All gauge features are read in one sequential pass
+YV_obs_nm=[fea['properties'][YS_obs_nm] for fea in rrr_obs_fea]
+ZV_obs_av=[fea['properties'][YS_obs_av] for fea in rrr_obs_fea]
+obs_shy=numpy.array([shapely.geometry.shape(fea['geometry'])                   \
+                     for fea in rrr_obs_fea])
+
 
 #*******************************************************************************
 #Read river shapefile
@@ -130,19 +140,23 @@ else:
 IS_riv_shp=len(rrr_riv_lay)
 print(' - The number of river features is: '+str(IS_riv_shp))
 
+IV_riv_id=[]
+ZV_riv_av=[]
+riv_shy=[]
+for rrr_riv_fea in rrr_riv_lay:
+     IV_riv_id.append(rrr_riv_fea['properties'][YS_riv_id])
+     ZV_riv_av.append(rrr_riv_fea['properties'][YS_riv_av])
+     riv_shy.append(shapely.geometry.shape(rrr_riv_fea['geometry']))
+riv_shy=numpy.array(riv_shy)
+#All river features are read in one sequential pass
+
 
 #*******************************************************************************
 #Create spatial index for the bounds of each river feature
 #*******************************************************************************
 print('Create spatial index for the bounds of each river feature')
 
-index=rtree.index.Index()
-for rrr_riv_fea in rrr_riv_lay:
-     rrr_riv_fid=int(rrr_riv_fea['id'])
-     #the first argument of index.insert has to be 'int', not 'long' or 'str'
-     rrr_riv_shy=shapely.geometry.shape(rrr_riv_fea['geometry'])
-     index.insert(rrr_riv_fid, rrr_riv_shy.bounds)
-     #creates an index between the feature ID and the bounds of that feature
+riv_tre=shapely.STRtree(riv_shy)
 
 print(' - Spatial index created')
 
@@ -152,59 +166,60 @@ print(' - Spatial index created')
 #*******************************************************************************
 print('Snap river IDs onto appropriate gauges')
 
+#-------------------------------------------------------------------------------
+#Find all gauge/reach pairs within buffer
+#-------------------------------------------------------------------------------
+buf_shy=shapely.buffer(obs_shy,ZS_buf)
+#shapely geometric objects for discs buffered around each gauge
+IV_pai_obs,IV_pai_riv=riv_tre.query(buf_shy,predicate='intersects')
+#All pairs of gauge and reach where the reach is actually within the buffer of
+#the gauge, the predicate is evaluated on prepared buffers
+ZV_pai_dst=shapely.distance(riv_shy[IV_pai_riv],obs_shy[IV_pai_obs])
+#The distance between the gauge and the reach for all pairs
+
+#-------------------------------------------------------------------------------
+#Find the closest reach with acceptable magnitude for each gauge
+#-------------------------------------------------------------------------------
+ZV_pai_obs_av=numpy.array(ZV_obs_av,dtype=numpy.float64)[IV_pai_obs]
+ZV_pai_riv_av=numpy.array(ZV_riv_av,dtype=numpy.float64)[IV_pai_riv]
+BV_pai_bad=(ZV_pai_obs_av>=  ZS_mag*ZV_pai_riv_av)|                            \
+           (ZV_pai_obs_av<=1/ZS_mag*ZV_pai_riv_av)
+#BV_pai_bad in case want to check for magnitude along with distance
+BV_pai_ok=(ZV_pai_dst<=ZS_buf)&(~BV_pai_bad)
+
+IV_pai_srt=numpy.lexsort((ZV_pai_dst,IV_pai_obs))
+IV_pai_srt=IV_pai_srt[BV_pai_ok[IV_pai_srt]]
+#Acceptable pairs sorted by gauge and then by increasing distance
+IV_obs_uni,IV_obs_fst=numpy.unique(IV_pai_obs[IV_pai_srt],return_index=True)
+IV_obs_bst=numpy.full(IS_obs_shp,-1)
+IV_obs_bst[IV_obs_uni]=IV_pai_srt[IV_obs_fst]
+#The closest acceptable pair for each gauge (-1 if none)
+IV_obs_cnt=numpy.bincount(IV_pai_obs,minlength=IS_obs_shp)
+#The number of reaches within buffer for each gauge
+
+#-------------------------------------------------------------------------------
+#Gather snapped gauges
+#-------------------------------------------------------------------------------
 HM_snp={}
 IS_buf=0
 
-for rrr_obs_fea in rrr_obs_lay:
-     rrr_obs_shy=shapely.geometry.shape(rrr_obs_fea['geometry'])
-     #shapely geometric object for each gauge
-     rrr_buf_shy=rrr_obs_shy.buffer(ZS_buf)
-     #shapefly geometric object for a disc buffered around each gauge
-     rrr_buf_pre=shapely.prepared.prep(rrr_buf_shy)
-     #a 'prepared' geometric object allows for faster processing after
-     IV_riv_fid=[int(x) for x in list(index.intersection(rrr_buf_shy.bounds))]
-     #List of feature IDs where reach bounds intersect with buffer bounds
-
-     BS_buf=False
-     #Boolean to be updated if a river reach is within buffer for this gauge
-     ZS_cls=ZS_buf
-     #The closest distance between this gauge and all potential reaches
-
-     for IS_riv_fid in IV_riv_fid:
+for JS_obs_shp in range(IS_obs_shp):
+     obs_nm=YV_obs_nm[JS_obs_shp]
+     JS_pai=IV_obs_bst[JS_obs_shp]
+     if JS_pai>=0:
           #---------------------------------------------------------------------
-          #current reach might be within buffer of current gauge
+          #Closest reach that is within buffer and has acceptable magnitude
           #---------------------------------------------------------------------
-          rrr_riv_fea=rrr_riv_lay[IS_riv_fid]
-          rrr_riv_shy=shapely.geometry.shape(rrr_riv_fea['geometry'])
-          if rrr_buf_pre.intersects(rrr_riv_shy):
-               #----------------------------------------------------------------
-               #Current reach is actually within buffer of current gauge
-               #----------------------------------------------------------------
-               BS_buf=BS_buf or True
-               ZS_dst=rrr_riv_shy.distance(rrr_obs_shy)
-               obs_nm=rrr_obs_fea['properties'][YS_obs_nm]
-               obs_av=rrr_obs_fea['properties'][YS_obs_av]
-               riv_id=rrr_riv_fea['properties'][YS_riv_id]
-               riv_av=rrr_riv_fea['properties'][YS_riv_av]
-               BS_bad=obs_av>=  ZS_mag*riv_av or                               \
-                      obs_av<=1/ZS_mag*riv_av
-               #BS_bad in case want to check for magnitude along with distance
-               #if ZS_dst<=ZS_cls:
-               if ZS_dst<=ZS_cls and not BS_bad:
-                    #-----------------------------------------------------------
-                    #Current reach is within buffer, (magnitude), and closer
-                    #-----------------------------------------------------------
-                    ZS_cls=ZS_dst
-                    HM_snp[obs_nm]={'obs_av':obs_av,                           \
-                                    'riv_id':riv_id,                           \
-                                    'riv_av':riv_av,                           \
-                                    'ZS_dst':ZS_dst }
-     if BS_buf:
+          JS_riv_shp=IV_pai_riv[JS_pai]
+          HM_snp[obs_nm]={'obs_av':ZV_obs_av[JS_obs_shp],                      \
+                          'riv_id':IV_riv_id[JS_riv_shp],                      \
+                          'riv_av':ZV_riv_av[JS_riv_shp],                      \
+                          'ZS_dst':float(ZV_pai_dst[JS_pai]) }
+     if IV_obs_cnt[JS_obs_shp]>0:
           #---------------------------------------------------------------------
           #current gauge has at least one reach in buffer
           #---------------------------------------------------------------------
           IS_buf=IS_buf+1
-          obs_nm=rrr_obs_fea['properties'][YS_obs_nm]
           if obs_nm in HM_snp and                                              \
             (HM_snp[obs_nm]['obs_av']>=  ZS_mag*HM_snp[obs_nm]['riv_av'] or    \
              HM_snp[obs_nm]['obs_av']<=1/ZS_mag*HM_snp[obs_nm]['riv_av']):
@@ -231,14 +246,17 @@ print(' - Number of gauges within buffer of a reach and acceptable magnitude: '\
 #Geospatial operations can be very computationally demanding unless some tricks
 #are used. My experience has indicated that:
 # - One should build the spatial index on the features that are the most
-#   numerous. That is because the index.intersection() function is very fast and
+#   numerous. That is because the STRtree.query() function is very fast and
 #   hence allows for a near instantaneous subselection of only those out of many
 #   features that are potentially within the desired spatial scope.
 # - For the features that are relatively less numerous (not the ones above), one
 #   should 'prepare' the geometry before performing the desired geospatial
 #   operation and use the prepared objects in the operation. This step is
 #   particularly key when the geometry is made of many points because it
-#   dramatically speeds up the geospatial operations.
+#   dramatically speeds up the geospatial operations. STRtree.query() does so
+#   for its input geometries when a predicate is given.
+# - Querying all geometries at once with arrays of shapely geometries avoids
+#   creating Python objects one feature at a time.
 
 
 #*******************************************************************************
@@ -413,13 +431,12 @@ rrr_snp_lay=fiona.open(rrr_snp_shp, 'w',                                       \
 print('- New shapefile created')
 
 for JS_obs_shp in range(IS_obs_shp):
-     rrr_obs_fea=rrr_obs_lay[JS_obs_shp]
-     rrr_obs_prp=rrr_obs_fea['properties']
-     rrr_obs_geo=rrr_obs_fea['geometry']
+     rrr_obs_prp=rrr_obs_fea[JS_obs_shp]['properties']
+     rrr_obs_geo=rrr_obs_fea[JS_obs_shp]['geometry']
      if rrr_obs_prp[YS_obs_nm] in HM_snp:
 
-          rrr_snp_prp=rrr_obs_prp.copy()
-          rrr_snp_geo=rrr_obs_geo.copy()
+          rrr_snp_prp=dict(rrr_obs_prp)
+          rrr_snp_geo=rrr_obs_geo
 
           rrr_snp_prp['rivid']=HM_snp[rrr_obs_prp[YS_obs_nm]]['riv_id']
 
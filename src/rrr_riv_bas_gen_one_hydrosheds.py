@@ -17,8 +17,8 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import csv
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -88,20 +88,17 @@ print('Reading input files')
 #-------------------------------------------------------------------------------
 print('- Reading river shapefile')
 
-hsd_riv_lay=fiona.open(hsd_riv_shp, 'r')
-IS_riv_bas=len(hsd_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(hsd_riv_shp,None,False)
+IS_riv_bas=IM_riv_met['count']
 print(' . Number of river reaches in rrr_riv_shp: '+str(IS_riv_bas))
 
-if 'ARCID' in hsd_riv_lay[0]['properties']:
+if 'ARCID' in IM_riv_fld:
      YV_riv_id='ARCID'
 else:
      print('ERROR - ARCID does not exist in '+hsd_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_bas_id=[]
-for JS_riv_bas in range(IS_riv_bas):
-     hsd_riv_prp=hsd_riv_lay[JS_riv_bas]['properties']
-     IV_riv_bas_id.append(int(hsd_riv_prp[YV_riv_id]))
+IV_riv_bas_id=[int(IS_riv_id) for IS_riv_id in IM_riv_fld[YV_riv_id]]
 
 #-------------------------------------------------------------------------------
 #Reading connectivity file
@@ -17,8 +17,9 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import csv
+import rrr_lib_prf
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -82,26 +83,24 @@ except IOError as e:
 #Reading input files
 #*******************************************************************************
 print('Reading input files')
+rrr_lib_prf.prf_sec('Reading input files')
 
 #-------------------------------------------------------------------------------
 #Reading river shapefile
 #-------------------------------------------------------------------------------
 print('- Reading river shapefile')
 
-mer_riv_lay=fiona.open(mer_riv_shp, 'r')
-IS_riv_bas=len(mer_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(mer_riv_shp,None,False)
+IS_riv_bas=IM_riv_met['count']
 print(' . Number of river reaches in rrr_riv_shp: '+str(IS_riv_bas))
 
-if 'COMID' in mer_riv_lay[0]['properties']:
+if 'COMID' in IM_riv_fld:
      YV_riv_id='COMID'
 else:
      print('ERROR - COMID does not exist in '+mer_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_bas_id=[]
-for JS_riv_bas in range(IS_riv_bas):
-     mer_riv_prp=mer_riv_lay[JS_riv_bas]['properties']
-     IV_riv_bas_id.append(int(mer_riv_prp[YV_riv_id]))
+IV_riv_bas_id=[int(IS_riv_id) for IS_riv_id in IM_riv_fld[YV_riv_id]]
 
 #-------------------------------------------------------------------------------
 #Reading connectivity file
@@ -161,6 +160,7 @@ for JS_riv_bas in range(IS_riv_bas):
 #Sort files
 #*******************************************************************************
 print('Sorting')
+rrr_lib_prf.prf_sec('Sorting')
 z=zip(*sorted(zip(IV_riv_bas_sort,IV_riv_bas_id), reverse=True,                \
               key=lambda x: x[0])    )
 IV_riv_bas_sort2, IV_riv_bas_id2=z
@@ -173,6 +173,7 @@ IV_riv_bas_sort2, IV_riv_bas_id2=z
 #Write outputs
 #*******************************************************************************
 print('Writing file')
+rrr_lib_prf.prf_sec('Writing file')
 
 with open(rrr_riv_csv, 'w') as csvfile:
      csvwriter = csv.writer(csvfile, dialect='excel')
@@ -10,6 +10,9 @@
 #mismatches are found, the program can check against known distant nodes that
 #occur at the U.S. political boundaries. 
 #If unexpected distant nodes are found, the Node IDs are reported. 
+#All attributes and coordinates are handled as arrays: the occurrences of nodes
+#at the ends of all reaches are sorted by Node ID, and the coordinates of each
+#occurrence are compared with those of the first occurrence of the same node.
 #
 #Author:
 #Cedric H. David, 2017-2023
@@ -19,7 +22,16 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
+import numpy
+import shapely
+import rrr_lib_vec
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+ZS_tol=0.000001 # tolerance (degrees) on the coordinates of a same node
+#1m is approx. 0.000009 degrees
 
 
 #*******************************************************************************
@@ -89,28 +101,31 @@ print('Reading input files')
 #-------------------------------------------------------------------------------
 print('- Reading nhd_riv_shp')
 
-nhd_riv_lay=fiona.open(nhd_riv_shp, 'r')
-IS_riv_all=len(nhd_riv_lay)
-print(' . The number of river reaches is: '+str(IS_riv_all))
+YV_riv_fld=rrr_lib_vec.vec_fld(nhd_riv_shp)
 
-if 'COMID' in nhd_riv_lay[0]['properties']:
+if 'COMID' in YV_riv_fld:
      YV_riv_id='COMID'
-elif 'ComID' in nhd_riv_lay[0]['properties']:
+elif 'ComID' in YV_riv_fld:
      YV_riv_id='ComID'
 else:
      print('ERROR - COMID and ComID do not exist in '+nhd_riv_shp)
      raise SystemExit(22) 
 
-if 'FLOWDIR' in nhd_riv_lay[0]['properties']:
+if 'FLOWDIR' in YV_riv_fld:
      YV_riv_fdr='FLOWDIR'
 else:
      print('ERROR - FLOWDIR does not exist in '+nhd_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_tot_id=[]
-for nhd_riv_fea in nhd_riv_lay:
-     if (str(nhd_riv_fea['properties'][YV_riv_fdr]).strip()=='With Digitized'):
-          IV_riv_tot_id.append(int(nhd_riv_fea['properties'][YV_riv_id]))
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(nhd_riv_shp,              \
+                                                     [YV_riv_id,YV_riv_fdr])
+IS_riv_all=IM_riv_met['count']
+print(' . The number of river reaches is: '+str(IS_riv_all))
+
+BV_riv_all_dig=numpy.char.strip(IM_riv_fld[YV_riv_fdr].astype(str))            \
+               =='With Digitized'
+IV_riv_tot_id=IM_riv_fld[YV_riv_id][BV_riv_all_dig].astype(numpy.int64)
+YV_riv_tot_geo=YV_riv_geo[BV_riv_all_dig]
 
 IS_riv_tot=len(IV_riv_tot_id)
 print(' . The number of river reaches with known direction is: '               \
@@ -121,43 +136,41 @@ print(' . The number of river reaches with known direction is: '               \
 #-------------------------------------------------------------------------------
 print('- Reading nhd_VAA_dbf')
 
-nhd_VAA_lay=fiona.open(nhd_VAA_dbf, 'r')
-IS_VAA_all=len(nhd_VAA_lay)
-print(' . The number of attributes is: '+str(IS_VAA_all))
+YV_VAA_fld=rrr_lib_vec.vec_fld(nhd_VAA_dbf)
 
-if 'COMID' in nhd_VAA_lay[0]['properties']:
+if 'COMID' in YV_VAA_fld:
      YV_VAA_id='COMID'
-elif 'ComID' in nhd_VAA_lay[0]['properties']:
+elif 'ComID' in YV_VAA_fld:
      YV_VAA_id='ComID'
 else:
      print('ERROR - COMID and ComID do not exist in '+nhd_VAA_dbf)
      raise SystemExit(22) 
 
-if 'FROMNODE' in nhd_VAA_lay[0]['properties']:
+if 'FROMNODE' in YV_VAA_fld:
      YV_VAA_fnd='FROMNODE'
-elif 'FromNode' in nhd_VAA_lay[0]['properties']:
+elif 'FromNode' in YV_VAA_fld:
      YV_VAA_fnd='FromNode'
 else:
      print('ERROR - FROMNODE and FromNode do not exist in '+nhd_VAA_dbf)
      raise SystemExit(22) 
 
-if 'TONODE' in nhd_VAA_lay[0]['properties']:
+if 'TONODE' in YV_VAA_fld:
      YV_VAA_tnd='TONODE'
-elif 'ToNode' in nhd_VAA_lay[0]['properties']:
+elif 'ToNode' in YV_VAA_fld:
      YV_VAA_tnd='ToNode'
 else:
      print('ERROR - TONODE and ToNode do not exist in '+nhd_VAA_dbf)
      raise SystemExit(22) 
 
-IV_VAA_all_id=[0]*IS_VAA_all
-IV_VAA_all_fnd=[0]*IS_VAA_all
-IV_VAA_all_tnd=[0]*IS_VAA_all
-JS_VAA_all=0
-for nhd_VAA_fea in nhd_VAA_lay: 
-     IV_VAA_all_id[JS_VAA_all]=int(nhd_VAA_fea['properties'][YV_VAA_id])
-     IV_VAA_all_fnd[JS_VAA_all]=int(nhd_VAA_fea['properties'][YV_VAA_fnd])
-     IV_VAA_all_tnd[JS_VAA_all]=int(nhd_VAA_fea['properties'][YV_VAA_tnd])
-     JS_VAA_all=JS_VAA_all+1
+IM_VAA_fld,YV_VAA_geo,IM_VAA_met=rrr_lib_vec.vec_rea(nhd_VAA_dbf,              \
+                                                     [YV_VAA_id,YV_VAA_fnd,    \
+                                                      YV_VAA_tnd],False)
+IS_VAA_all=IM_VAA_met['count']
+print(' . The number of attributes is: '+str(IS_VAA_all))
+
+IV_VAA_all_id=IM_VAA_fld[YV_VAA_id].astype(numpy.int64)
+IV_VAA_all_fnd=IM_VAA_fld[YV_VAA_fnd].astype(numpy.int64)
+IV_VAA_all_tnd=IM_VAA_fld[YV_VAA_tnd].astype(numpy.int64)
 
 #-------------------------------------------------------------------------------
 #Reading nhd_flw_dbf
@@ -166,30 +179,30 @@ if IS_arg==4:
 
      print('- Reading nhd_flw_dbf')
 
-     nhd_flw_lay=fiona.open(nhd_flw_dbf, 'r')
-     IS_flw_all=len(nhd_flw_lay)
-     print(' . The number of attributes is: '+str(IS_flw_all))
+     YV_flw_fld=rrr_lib_vec.vec_fld(nhd_flw_dbf)
 
-     if 'NODENUMBER' in nhd_flw_lay[0]['properties']:
+     if 'NODENUMBER' in YV_flw_fld:
           YV_flw_ndn='NODENUMBER'
      else:
           print('ERROR - NODENUMBER does not exist in '+nhd_flw_dbf)
           raise SystemExit(22) 
 
-     if 'HasGeo' in nhd_flw_lay[0]['properties']:
+     if 'HasGeo' in YV_flw_fld:
           YV_flw_hsg='HasGeo'
      else:
           print('ERROR - HasGeo does not exist in '+nhd_flw_dbf)
           raise SystemExit(22) 
 
-     IM_nod_dst={}
-     for nhd_flw_fea in nhd_flw_lay:
-          if (str(nhd_flw_fea['properties'][YV_flw_hsg]).strip()=='N'):
-               IS_flw_all_ndn=int(nhd_flw_fea['properties'][YV_flw_ndn])
-               if IS_flw_all_ndn in IM_nod_dst:
-                    IM_nod_dst[IS_flw_all_ndn]=IM_nod_dst[IS_flw_all_ndn]+1
-               else:
-                    IM_nod_dst[IS_flw_all_ndn]=1
+     IM_flw_fld,YV_flw_geo,IM_flw_met=rrr_lib_vec.vec_rea(nhd_flw_dbf,         \
+                                                          [YV_flw_ndn,         \
+                                                           YV_flw_hsg],False)
+     IS_flw_all=IM_flw_met['count']
+     print(' . The number of attributes is: '+str(IS_flw_all))
+
+     BV_flw_all_dst=numpy.char.strip(IM_flw_fld[YV_flw_hsg].astype(str))=='N'
+     IV_nod_dst=numpy.unique(IM_flw_fld[YV_flw_ndn][BV_flw_all_dst]            \
+                             .astype(numpy.int64))
+     #Nodes that are known to be distant (e.g., at the U.S. boundaries)
 
 #-------------------------------------------------------------------------------
 #Checking names used
@@ -206,126 +219,109 @@ if IS_arg==4:
 
 
 #*******************************************************************************
-#Building hash table relating COMID to index in IV_VAA_all_id
+#Finding FromNode and ToNode for each river reach
 #*******************************************************************************
-print('Building hash table relating COMID to index in IV_VAA_all_id')
+print('Finding FromNode and ToNode for each river reach')
+
+IV_VAA_srt=numpy.argsort(IV_VAA_all_id,kind='stable')
+IV_riv_tot_ix=numpy.searchsorted(IV_VAA_all_id,IV_riv_tot_id,sorter=IV_VAA_srt)
+IV_riv_tot_ix=IV_VAA_srt[numpy.minimum(IV_riv_tot_ix,IS_VAA_all-1)]
+#Sort-based join: index in IV_VAA_all_id of each reach, if it exists
+BV_riv_tot_mis=IV_VAA_all_id[IV_riv_tot_ix]!=IV_riv_tot_id
+if BV_riv_tot_mis.any():
+     print('ERROR - The following river reaches are missing from '             \
+           +nhd_VAA_dbf+':')
+     print(IV_riv_tot_id[BV_riv_tot_mis].tolist())
+     raise SystemExit(22) 
 
-IM_hsh={}
-for JS_VAA_all in range(IS_VAA_all):
-     IM_hsh[IV_VAA_all_id[JS_VAA_all]]=JS_VAA_all
+IV_riv_tot_fnd=IV_VAA_all_fnd[IV_riv_tot_ix]
+IV_riv_tot_tnd=IV_VAA_all_tnd[IV_riv_tot_ix]
 
 
 #*******************************************************************************
-#Finding FromNode and ToNode for each river reach
+#Extracting coordinates of nodes for each reach
 #*******************************************************************************
-print('Finding FromNode and ToNode for each river reach')
+print('Extracting coordinates of nodes for each reach')
+
+ZM_riv_crd,IV_riv_crd=shapely.get_coordinates(YV_riv_tot_geo,return_index=True)
+IV_riv_str=numpy.searchsorted(IV_riv_crd,numpy.arange(IS_riv_tot),'left')
+IV_riv_end=numpy.searchsorted(IV_riv_crd,numpy.arange(IS_riv_tot),'right')-1
+#First and last vertices of each reach, the parts of multi-part polylines
+#following each other
+if (IV_riv_end<IV_riv_str).any():
+     print('ERROR - Some river reaches have no vertices')
+     raise SystemExit(22) 
 
-IV_riv_tot_fnd=[0]*IS_riv_tot
-IV_riv_tot_tnd=[0]*IS_riv_tot
-for JS_riv_tot in range(IS_riv_tot):
-     IV_riv_tot_fnd[JS_riv_tot]=IV_VAA_all_fnd[IM_hsh[IV_riv_tot_id[JS_riv_tot]]]
-     IV_riv_tot_tnd[JS_riv_tot]=IV_VAA_all_tnd[IM_hsh[IV_riv_tot_id[JS_riv_tot]]]
+ZM_str_xy=ZM_riv_crd[IV_riv_str]
+ZM_end_xy=ZM_riv_crd[IV_riv_end]
 
 
 #*******************************************************************************
-#Extracting and assigning coordinates of nodes for each reach
+#Grouping coordinates by node
 #*******************************************************************************
-print('Extracting and assigning coordinates of nodes for each reach')
-
-IM_hsh2={}
-IM_nod_err={}
-
-JS_riv_tot=0
-for nhd_riv_fea in nhd_riv_lay:
-     if (str(nhd_riv_fea['properties'][YV_riv_fdr]).strip()=='With Digitized'):
-          #---------------------------------------------------------------------
-          #Determining the FromNode and ToNode values
-          #---------------------------------------------------------------------
-          IS_riv_tot_id=IV_riv_tot_id[JS_riv_tot]
-          IS_riv_tot_fnd=IV_riv_tot_fnd[JS_riv_tot]
-          IS_riv_tot_tnd=IV_riv_tot_tnd[JS_riv_tot]
-          JS_riv_tot=JS_riv_tot+1
-
-          #---------------------------------------------------------------------
-          #Extracting coordinates for upstream and downstream nodes
-          #---------------------------------------------------------------------
-          if (str(nhd_riv_fea['geometry']['type']).strip()=='LineString'):
-               nhd_riv_crd=nhd_riv_fea['geometry']['coordinates']
-               IS_point=len(nhd_riv_crd)
-               ZS_str_x=nhd_riv_crd[0][0]
-               ZS_str_y=nhd_riv_crd[0][1]
-               ZS_end_x=nhd_riv_crd[IS_point-1][0]
-               ZS_end_y=nhd_riv_crd[IS_point-1][1]
-               #This is for single-part polylines
-
-          if (str(nhd_riv_fea['geometry']['type']).strip()=='MultiLineString'):
-               nhd_riv_crd=nhd_riv_fea['geometry']['coordinates']
-               IS_part=len(nhd_riv_crd)
-               IS_point=len(nhd_riv_crd[IS_part-1])
-               ZS_str_x=nhd_riv_crd[0][0][0]
-               ZS_str_y=nhd_riv_crd[0][0][1]
-               ZS_end_x=nhd_riv_crd[IS_part-1][IS_point-1][0]
-               ZS_end_y=nhd_riv_crd[IS_part-1][IS_point-1][1]
-               #This is for multi-part polylines
-
-          #---------------------------------------------------------------------
-          #Rounding values (1m is approx. 0.000009 degrees: keeping 6 decimals)
-          #---------------------------------------------------------------------
-          ZS_str_x=round(float(ZS_str_x),6)
-          ZS_str_y=round(float(ZS_str_y),6)
-          ZS_end_x=round(float(ZS_end_x),6)
-          ZS_end_y=round(float(ZS_end_y),6)
-
-          #---------------------------------------------------------------------
-          #Populating the hash table with upstream element
-          #---------------------------------------------------------------------
-          if (IS_riv_tot_fnd!=0 and IS_riv_tot_fnd in IM_hsh2):
-               if IM_hsh2[IS_riv_tot_fnd]!=(ZS_str_x,ZS_str_y):
-                    if IS_riv_tot_fnd in IM_nod_err:
-                         IM_nod_err[IS_riv_tot_fnd]=IM_nod_err[IS_riv_tot_fnd]+1
-                    else:
-                         IM_nod_err[IS_riv_tot_fnd]=1
-          if (IS_riv_tot_fnd!=0 and IS_riv_tot_fnd not in IM_hsh2):
-               IM_hsh2[IS_riv_tot_fnd]=(ZS_str_x,ZS_str_y)
-
-          #---------------------------------------------------------------------
-          #Populating the hash table with downstream element
-          #---------------------------------------------------------------------
-          if (IS_riv_tot_tnd!=0 and IS_riv_tot_tnd in IM_hsh2):
-               if IM_hsh2[IS_riv_tot_tnd]!=(ZS_end_x,ZS_end_y):
-                    if IS_riv_tot_tnd in IM_nod_err:
-                         IM_nod_err[IS_riv_tot_tnd]=IM_nod_err[IS_riv_tot_tnd]+1
-                    else:
-                         IM_nod_err[IS_riv_tot_tnd]=1
-          if (IS_riv_tot_tnd!=0 and IS_riv_tot_tnd not in IM_hsh2):
-               IM_hsh2[IS_riv_tot_tnd]=(ZS_end_x,ZS_end_y)
+print('Grouping coordinates by node')
+
+IV_nod_all=numpy.stack([IV_riv_tot_fnd,IV_riv_tot_tnd],axis=1).ravel()
+ZM_nod_all=numpy.stack([ZM_str_xy,ZM_end_xy],axis=1).reshape(-1,2)
+#Upstream and downstream nodes of each reach, one reach after the other
+BV_nod_all=IV_nod_all!=0
+IV_nod_all=IV_nod_all[BV_nod_all]
+ZM_nod_all=ZM_nod_all[BV_nod_all]
+
+IV_nod_srt=numpy.argsort(IV_nod_all,kind='stable')
+IV_nod_all=IV_nod_all[IV_nod_srt]
+ZM_nod_all=ZM_nod_all[IV_nod_srt]
+IV_nod_fst=numpy.flatnonzero(numpy.r_[True,IV_nod_all[1:]!=IV_nod_all[:-1]])
+#The stable sort keeps the first occurrence of each node at the beginning of
+#its group
+IV_nod_uni=IV_nod_all[IV_nod_fst]
+IV_nod_cnt=numpy.diff(numpy.r_[IV_nod_fst,len(IV_nod_all)])
+print('- The number of nodes is: '+str(len(IV_nod_uni)))
+print('- The number of node occurrences is: '+str(len(IV_nod_all)))
+
+
+#*******************************************************************************
+#Comparing coordinates of all occurrences of each node
+#*******************************************************************************
+print('Comparing coordinates of all occurrences of each node')
+
+ZM_nod_ref=numpy.repeat(ZM_nod_all[IV_nod_fst],IV_nod_cnt,axis=0)
+ZV_nod_dif=numpy.abs(ZM_nod_all-ZM_nod_ref).max(axis=1)
+BV_nod_err=ZV_nod_dif>ZS_tol
+#Each occurrence is compared with the first occurrence of the same node
+
+IV_nod_err_cnt=numpy.add.reduceat(BV_nod_err.astype(numpy.int64),IV_nod_fst)   \
+               if len(IV_nod_fst)>0 else numpy.zeros(0,dtype=numpy.int64)
+IV_nod_err=IV_nod_uni[IV_nod_err_cnt>0]
+print('- The number of mismatched occurrences is: '+str(BV_nod_err.sum()))
+if len(IV_nod_err)>0:
+     print('- The largest coordinate difference is: '                          \
+           +str(ZV_nod_dif.max()))
+
 
 #*******************************************************************************
 #Checking node/coordinates mismatch 
 #*******************************************************************************
 print('Checking node/coordinates mismatch')
 
-if (len(IM_nod_err)==0):
+if (len(IV_nod_err)==0):
      print('- Success!!! No node/coordinates mismatch found')
 else:
      print('- The number of node/coordinates mismatch found is: '              \
-           +str(len(IM_nod_err)))
+           +str(len(IV_nod_err)))
      if IS_arg!=4:
           print('ERROR - Node/coordinates mismatches cannot be checked if no ' \
                 'PlusFlow file is provided:')
-          print(sorted(IM_nod_err.keys()))
+          print(IV_nod_err.tolist())
           raise SystemExit(99) 
      if IS_arg==4:
-          BS_error=False
-          IV_error=[]
-          for key in IM_nod_err:
-               if key not in IM_nod_dst:
-                    BS_error=True
-                    IV_error.append(key)
-          if BS_error:
+          BV_nod_unx=numpy.logical_not(numpy.isin(IV_nod_err,IV_nod_dst))
+          print('- The number of expected mismatches is: '                     \
+                +str(len(IV_nod_err)-BV_nod_unx.sum()))
+          if BV_nod_unx.any():
                print('ERROR - Node/coordinates mismatches were not expected '  \
                      'for the following nodes:')
-               print(IV_error)
+               print(IV_nod_err[BV_nod_unx].tolist())
                raise SystemExit(99) 
           else:
                print('- Success!!! All mismatches were expected')
@@ -7,7 +7,8 @@
 #Given a shapefile with river reaches, a shapefile with coastline, and a buffer;
 #this program determines those reaches that have a NextDownID=0 and also
 #intersect with the buffered coastline. These coastal river reaches are saved in
-#a shapefile.
+#a shapefile. The coastline is split into small segments that are stored in a
+#spatial index (STRtree), which is queried for all terminal reaches at once.
 #Author:
 #Cedric H. David, 2023-2023
 
@@ -16,8 +17,10 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
-import shapely.geometry
+import numpy
+import shapely
+import rrr_lib_geo
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -76,23 +79,23 @@ except IOError as e:
 #*******************************************************************************
 print('Read river shapefile')
 
-rrr_riv_lay=fiona.open(rrr_riv_shp, 'r')
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(rrr_riv_shp)
 
-if 'COMID' in rrr_riv_lay[0]['properties']:
+if 'COMID' in IM_riv_fld:
      YS_riv_id='COMID'
-elif 'ARCID' in rrr_riv_lay[0]['properties']:
+elif 'ARCID' in IM_riv_fld:
      YS_riv_id='ARCID'
 else:
      print('ERROR - COMID, or ARCID do not exist in '+rrr_riv_shp)
      raise SystemExit(22)
 
-if 'NextDownID' in rrr_riv_lay[0]['properties']:
+if 'NextDownID' in IM_riv_fld:
      YS_riv_dn='NextDownID'
 else:
      print('ERROR - NextDownID does not exist in '+rrr_riv_shp)
      raise SystemExit(22)
 
-IS_riv_shp=len(rrr_riv_lay)
+IS_riv_shp=IM_riv_met['count']
 print(' - The number of river features is: '+str(IS_riv_shp))
 
 
@@ -101,36 +104,46 @@ print(' - The number of river features is: '+str(IS_riv_shp))
 #*******************************************************************************
 print('Read coast shapefile')
 
-rrr_cst_lay=fiona.open(rrr_cst_shp, 'r')
+IM_cst_fld,YV_cst_geo,IM_cst_met=rrr_lib_vec.vec_rea(rrr_cst_shp)
 
-rrr_cst_geo = shapely.geometry.shape(rrr_cst_lay[0]['geometry'])
+rrr_cst_geo=YV_cst_geo[0]
 #get geometry of coast
 
-IS_cst_shp=len(rrr_cst_lay)
+IS_cst_shp=IM_cst_met['count']
 print(' - The number of coast features is: '+str(IS_cst_shp))
 
+YV_cst_seg=rrr_lib_geo.geo_seg(rrr_cst_geo)
+rrr_cst_tre=shapely.STRtree(YV_cst_seg)
+print(' - The number of coast segments in spatial index is: '                  \
+      +str(len(YV_cst_seg)))
+
 
 #*******************************************************************************
 #Intersect river IDs with buffered coast
 #*******************************************************************************
 print('Intersect river IDs with buffered coast')
 
-IV_riv_cst=[]
+IV_riv_trm=numpy.nonzero(IM_riv_fld[YS_riv_dn]==0)[0]
+#here only looking at the terminal river reaches: NextDownID=0
+print(' - The number of terminal river reaches is: '+str(len(IV_riv_trm)))
+
+IV_riv_qry,IV_cst_qry=rrr_cst_tre.query(YV_riv_geo[IV_riv_trm],                \
+                                        predicate='dwithin',distance=ZS_buf)
+#pairs of terminal reaches and coast segments within buffer distance
+ZV_riv_dis=shapely.distance(YV_riv_geo[IV_riv_trm][IV_riv_qry],                \
+                            YV_cst_seg[IV_cst_qry])
+BV_riv_cst=numpy.zeros(len(IV_riv_trm),dtype=bool)
+BV_riv_cst[IV_riv_qry[ZV_riv_dis<ZS_buf]]=True
+#Current reach is actually within buffer distance of coast
 
-for rrr_riv_fea in rrr_riv_lay:
-     rrr_riv_did=rrr_riv_fea['properties'][YS_riv_dn]
-     if rrr_riv_did==0:
-     #here only looking at the terminal river reaches: NextDownID=0
-          rrr_riv_shy=shapely.geometry.shape(rrr_riv_fea['geometry'])
-          #get geometry
-          rrr_cst_dis = rrr_cst_geo.distance(rrr_riv_shy)
-          #calculate distance to coast
-          #----------------------------------------------------------------
-          #Current reach is actually within buffer distance of coast
-          #----------------------------------------------------------------
-          if rrr_cst_dis < ZS_buf:
-              IV_riv_cst.append(rrr_riv_fea['properties'][YS_riv_id])
-              # Add id to list
+if shapely.get_dimensions(rrr_cst_geo)==2 and ZS_buf>0:
+     shapely.prepare(rrr_cst_geo)
+     BV_riv_cst=BV_riv_cst|shapely.intersects(rrr_cst_geo,                     \
+                                              YV_riv_geo[IV_riv_trm])
+#Reaches within a polygonal coast are at a null distance from it
+
+IV_riv_cst=IM_riv_fld[YS_riv_id][IV_riv_trm[BV_riv_cst]]
+print(' - The number of coastal river reaches is: '+str(len(IV_riv_cst)))
 
 
 #*******************************************************************************
@@ -155,49 +168,22 @@ for rrr_riv_fea in rrr_riv_lay:
 print('Copying river shapefile while only retaining coastal reaches')
 
 #-------------------------------------------------------------------------------
-#Copy Coordinate Reference System
-#-------------------------------------------------------------------------------
-print('- Copy Coordinate Reference System')
-
-rrr_riv_crs=rrr_riv_lay.crs
-rrr_snp_crs=rrr_riv_crs.copy()
-#print(rrr_snp_crs)
-
-#-------------------------------------------------------------------------------
-#Copy Schema
+#Select features
 #-------------------------------------------------------------------------------
-print('- Copy Schema')
+print('- Select features')
 
-rrr_riv_sch=rrr_riv_lay.schema
-rrr_snp_sch=rrr_riv_sch.copy()
-#print(rrr_snp_sch)
+BV_riv_snp=numpy.isin(IM_riv_fld[YS_riv_id],IV_riv_cst)
+IM_snp_fld={YS_fld:IM_riv_fld[YS_fld][BV_riv_snp] for YS_fld in IM_riv_fld}
+YV_snp_geo=YV_riv_geo[BV_riv_snp]
 
 #-------------------------------------------------------------------------------
 #Create Shapefile
 #-------------------------------------------------------------------------------
 print('- Create Shapefile')
 
-rrr_snp_lay=fiona.open(rrr_snp_shp, 'w',                                       \
-                       crs=rrr_snp_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_snp_sch                                      \
-                       )
-
-for rrr_riv_fea in rrr_riv_lay:
-     rrr_riv_prp=rrr_riv_fea['properties']
-     rrr_riv_geo=rrr_riv_fea['geometry']
-     if rrr_riv_prp[YS_riv_id] in IV_riv_cst:
-          rrr_snp_prp=rrr_riv_prp.copy()
-          rrr_snp_geo=rrr_riv_geo.copy()
-          rrr_snp_lay.write({                                                  \
-                             'properties': rrr_snp_prp,                        \
-                             'geometry': rrr_snp_geo,                          \
-                             })
+rrr_lib_vec.vec_wri(rrr_snp_shp,IM_snp_fld,YV_snp_geo,IM_riv_met)
 print('- New shapefile populated')
 
-rrr_snp_lay.close()
-print('- Closing shapefile so that values are saved')
-
 
 #*******************************************************************************
 #End
@@ -8,6 +8,10 @@
 #HydroSHEDS BASIN_ID, and a polyline shapefile that contains HydroSHEDS rivers,
 #this script creates a new polygon shapefile with only the requested HydroSHEDS
 #basins and a new polyline shapefile with the corresponding HydroSHEDS rivers.
+#If the names of both new shapefiles include '{}', one pair of shapefiles is
+#created for each requested basin instead, with '{}' replaced by its BASIN_ID.
+#All river features are read at once and stored in a spatial index (STRtree)
+#that is queried for all requested basins at once.
 #Author:
 #Cedric H. David, 2018-2023
 
@@ -16,11 +20,9 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
-import shapely.geometry
-import shapely.prepared
-import rtree
-import csv
+import numpy
+import shapely
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -82,22 +84,17 @@ except IOError as e:
 #*******************************************************************************
 print('Open rrr_bas_shp')
 
-rrr_bas_lay=fiona.open(rrr_bas_shp, 'r')
-IS_bas_tot=len(rrr_bas_lay)
+IM_bas_fld,YV_bas_geo,IM_bas_met=rrr_lib_vec.vec_rea(rrr_bas_shp)
+IS_bas_tot=IM_bas_met['count']
 print('- The number of basin features is: '+str(IS_bas_tot))
 
-if 'BASIN_ID' in rrr_bas_lay[0]['properties']:
+if 'BASIN_ID' in IM_bas_fld:
      YV_bas_id='BASIN_ID'
 else:
      print('ERROR - BASIN_ID does not exist in '+rrr_bas_shp)
      raise SystemExit(22) 
 
-IV_bas_tot_id=[]
-IH_bas_tot_index={}
-for JS_bas_tot in range(IS_bas_tot):
-     IS_bas_tot_id=int(rrr_bas_lay[JS_bas_tot]['properties'][YV_bas_id])
-     IV_bas_tot_id.append(IS_bas_tot_id)
-     IH_bas_tot_index[IS_bas_tot_id]=JS_bas_tot
+IV_bas_tot_id=IM_bas_fld[YV_bas_id].astype(numpy.int64)
 
 
 #*******************************************************************************
@@ -109,93 +106,43 @@ exec('IV_ba2_tot_id='+rrr_bas_lst)
 IS_ba2_tot=len(IV_ba2_tot_id)
 print('- The number of basin IDs requested is: '+str(IS_ba2_tot))
 
+IH_bas_tot_index={}
+for JS_bas_tot in range(IS_bas_tot):
+     IH_bas_tot_index[IV_bas_tot_id[JS_bas_tot]]=JS_bas_tot
+
+for IS_ba2_tot_id in IV_ba2_tot_id:
+     if IS_ba2_tot_id not in IH_bas_tot_index:
+          print('ERROR - BASIN_ID '+str(IS_ba2_tot_id)+' does not exist in '   \
+                +rrr_bas_shp)
+          raise SystemExit(22) 
+
+IV_ba2_tot_ix=numpy.array([IH_bas_tot_index[IS_ba2_tot_id]                     \
+                           for IS_ba2_tot_id in IV_ba2_tot_id],                \
+                          dtype=numpy.int64)
+
+BS_one='{}' in rrr_ba2_shp and '{}' in rrr_ri2_shp
+if BS_one:
+     print('- One basin and one river shapefile are created for each basin')
+else:
+     print('- One basin and one river shapefile are created for all basins')
+
 
 #*******************************************************************************
 #Open rrr_riv_shp
 #*******************************************************************************
 print('Open rrr_riv_shp')
 
-rrr_riv_lay=fiona.open(rrr_riv_shp, 'r')
-IS_riv_tot=len(rrr_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(rrr_riv_shp)
+IS_riv_tot=IM_riv_met['count']
 print('- The number of river features is: '+str(IS_riv_tot))
 
-if 'ARCID' in rrr_riv_lay[0]['properties']:
+if 'ARCID' in IM_riv_fld:
      YV_riv_id='ARCID'
 else:
      print('ERROR - ARCID does not exist in '+rrr_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_tot_id=[]
-IH_riv_tot_index={}
-for JS_riv_tot in range(IS_riv_tot):
-     IS_riv_tot_id=int(rrr_riv_lay[JS_riv_tot]['properties'][YV_riv_id])
-     IV_riv_tot_id.append(IS_riv_tot_id)
-     IH_riv_tot_index[IS_riv_tot_id]=JS_riv_tot
-
-
-#*******************************************************************************
-#Create new basin shapefile
-#*******************************************************************************
-print('Create new basin shapefile')
-
-rrr_bas_crs=rrr_bas_lay.crs
-rrr_ba2_crs=rrr_bas_crs.copy()
-#print(rrr_ba2_crs)
-print('- Coordinate Reference System copied')
-
-rrr_bas_sch=rrr_bas_lay.schema
-rrr_ba2_sch=rrr_bas_sch.copy()
-#print(rrr_ba2_sch)
-print('- Schema copied')
-
-rrr_ba2_lay=fiona.open(rrr_ba2_shp, 'w',                                       \
-                       crs=rrr_ba2_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_ba2_sch                                      \
-                       )
-print('- New shapefile created')
-
-
-#*******************************************************************************
-#Populate new basin shapefile
-#*******************************************************************************
-print('Populate new basin shapefile')
-
-for JS_ba2_tot in range(IS_ba2_tot):
-     rrr_bas_fea=rrr_bas_lay[IH_bas_tot_index[IV_ba2_tot_id[JS_ba2_tot]]]
-     rrr_ba2_prp=rrr_bas_fea['properties']
-     rrr_ba2_geo=rrr_bas_fea['geometry']
-     rrr_ba2_lay.write({                                                       \
-                        'properties': rrr_ba2_prp,                             \
-                        'geometry': rrr_ba2_geo,                               \
-                        })
-print('- New shapefile populated')
-
-rrr_ba2_lay.close()
-#Closing file to save values and so that it can now be open in read mode
-
-
-#*******************************************************************************
-#Create new river shapefile
-#*******************************************************************************
-print('Create new river shapefile')
-
-rrr_riv_crs=rrr_riv_lay.crs
-rrr_ri2_crs=rrr_riv_crs.copy()
-#print(rrr_ri2_crs)
-print('- Coordinate Reference System copied')
-
-rrr_riv_sch=rrr_riv_lay.schema
-rrr_ri2_sch=rrr_riv_sch.copy()
-#print(rrr_ri2_sch)
-print('- Schema copied')
-
-rrr_ri2_lay=fiona.open(rrr_ri2_shp, 'w',                                       \
-                       crs=rrr_ri2_crs,                                        \
-                       driver='ESRI Shapefile',                                \
-                       schema=rrr_ri2_sch                                      \
-                       )
-print('- New shapefile created')
+IV_riv_tot_id=IM_riv_fld[YV_riv_id].astype(numpy.int64)
 
 
 #*******************************************************************************
@@ -203,12 +150,7 @@ print('- New shapefile created')
 #*******************************************************************************
 print('Create spatial index for the bounds of each river feature')
 
-index=rtree.index.Index()
-for rrr_riv_fea in rrr_riv_lay:
-     riv_fid=int(rrr_riv_fea['id'])
-     #the first argument of index.insert has to be 'int', not 'long' or 'str'
-     riv_geom=shapely.geometry.shape(rrr_riv_fea['geometry'])
-     index.insert(riv_fid, riv_geom.bounds)
+rrr_riv_tre=shapely.STRtree(YV_riv_geo)
 
 
 #*******************************************************************************
@@ -216,68 +158,54 @@ for rrr_riv_fea in rrr_riv_lay:
 #*******************************************************************************
 print('Find intersections')
 
-rrr_ba2_lay=fiona.open(rrr_ba2_shp, 'r')
-#Open newly created shapefile, now in read mode
-
-IV_ri2_tot_id=[]
-#The river IDs in the new river shapefile
-
-print('- Going through each basin feature')
-for rrr_ba2_fea in rrr_ba2_lay:
-     ba2_fid=int(rrr_ba2_fea['id'])
-     ba2_shy=shapely.geometry.shape(rrr_ba2_fea['geometry'])
-     print(' . The number of elements that intersect with this basin feature '+\
-           'is: '+str(len(list(index.intersection(ba2_shy.bounds)))))
-     ba2_pre=shapely.prepared.prep(ba2_shy)
-     #This 'prep' step is crucial for performance: ba2_shy.contains() is much 
-     #slower than ba2_pre.contains() if it is run many times.
-     for riv_fid in [int(x) for x in list(index.intersection(ba2_shy.bounds))]:
-          #---------------------------------------------------------------------
-          #print('The bounds of riv_fid='+str(riv_fid)+                        \
-          #      ' intersect with the bounds of ba2_fid='+str(ba2_fid))
-          #---------------------------------------------------------------------
-          rrr_riv_fea=rrr_riv_lay[riv_fid]
-          riv_shy=shapely.geometry.shape(rrr_riv_fea['geometry'])
-          if ba2_pre.intersects(riv_shy):
-               #----------------------------------------------------------------
-               #print('riv_fid='+str(riv_fid)+                                 \
-               #      ' intersects with ba2_fid='+str(ba2_fid))
-               #Using 'contains' appears to be as fast as 'intersects' here
-               #Note that 'contains' does not select the reaches of a basin that
-               #touch its boundary, but that 'intersects' may select reaches
-               #outside of a basin that touch its boundary. For now 'intersects'
-               #produces the same results as ArcGIS 'contain' (not completely).
-               #----------------------------------------------------------------
-               IS_ri2_tot_id=int(rrr_riv_fea['properties'][YV_riv_id])
-               IV_ri2_tot_id.append(IS_ri2_tot_id)
-
-IV_ri2_tot_id.sort()
-#Sorting in ascending order
-IS_ri2_tot=len(IV_ri2_tot_id)
-#The number of elements in the list
+IV_ba2_qry,IV_riv_qry=rrr_riv_tre.query(YV_bas_geo[IV_ba2_tot_ix],             \
+                                        predicate='intersects')
+#Pairs of requested basins and river features that intersect, for all basins
+#at once. Note that 'contains' does not select the reaches of a basin that touch
+#its boundary, but that 'intersects' may select reaches outside of a basin that
+#touch its boundary. For now 'intersects' produces the same results as ArcGIS
+#'contain' (not completely).
+
+IV_ba2_cnt=numpy.bincount(IV_ba2_qry,minlength=IS_ba2_tot)
+for JS_ba2_tot in range(IS_ba2_tot):
+     print(' . The number of river features that intersect with basin '        \
+           +str(IV_ba2_tot_id[JS_ba2_tot])+' is: '+str(IV_ba2_cnt[JS_ba2_tot]))
 
+IV_ri2_tot_ix=numpy.unique(IV_riv_qry)
+IS_ri2_tot=len(IV_ri2_tot_ix)
 print('- The number of river features completely contained in requested basin '\
       +'features is: '+str(IS_ri2_tot))
 
 
 #*******************************************************************************
-#Populate new river shapefile
+#Create new basin and river shapefiles
 #*******************************************************************************
-print('Populate new river shapefile')
-
-for JS_ri2_tot in range(IS_ri2_tot):
-     IS_ri2_tot_id=IV_ri2_tot_id[JS_ri2_tot]
-     rrr_riv_fea=rrr_riv_lay[IH_riv_tot_index[IS_ri2_tot_id]]
-     rrr_ri2_prp=rrr_riv_fea['properties']
-     rrr_ri2_geo=rrr_riv_fea['geometry']
-     rrr_ri2_lay.write({                                                       \
-                        'properties': rrr_ri2_prp,                             \
-                        'geometry': rrr_ri2_geo,                               \
-                        })
-print('- New shapefile populated')
-
-rrr_ri2_lay.close()
-#Closing file to save values
+print('Create new basin and river shapefiles')
+
+def ext_wri(rrr_ext_shp,IM_fld,YV_geo,IM_met,IV_ix):
+     #Writes the features of index IV_ix in a new shapefile with the same
+     #coordinate system and schema as the input shapefile
+     IM_ext_fld={YS_fld:IM_fld[YS_fld][IV_ix] for YS_fld in IM_fld}
+     rrr_lib_vec.vec_wri(rrr_ext_shp,IM_ext_fld,YV_geo[IV_ix],IM_met)
+
+if BS_one:
+     for JS_ba2_tot in range(IS_ba2_tot):
+          IV_ri2_bas_ix=IV_riv_qry[IV_ba2_qry==JS_ba2_tot]
+          IV_ri2_bas_id=IV_riv_tot_id[IV_ri2_bas_ix]
+          IV_ri2_bas_ix=IV_ri2_bas_ix[numpy.argsort(IV_ri2_bas_id,             \
+                                                    kind='stable')]
+          #Sorting in ascending order of river IDs
+          ext_wri(rrr_ba2_shp.format(IV_ba2_tot_id[JS_ba2_tot]),               \
+                  IM_bas_fld,YV_bas_geo,IM_bas_met,IV_ba2_tot_ix[[JS_ba2_tot]])
+          ext_wri(rrr_ri2_shp.format(IV_ba2_tot_id[JS_ba2_tot]),               \
+                  IM_riv_fld,YV_riv_geo,IM_riv_met,IV_ri2_bas_ix)
+else:
+     IV_ri2_tot_ix=IV_ri2_tot_ix[numpy.argsort(IV_riv_tot_id[IV_ri2_tot_ix],   \
+                                               kind='stable')]
+     #Sorting in ascending order of river IDs
+     ext_wri(rrr_ba2_shp,IM_bas_fld,YV_bas_geo,IM_bas_met,IV_ba2_tot_ix)
+     ext_wri(rrr_ri2_shp,IM_riv_fld,YV_riv_geo,IM_riv_met,IV_ri2_tot_ix)
+print('- New shapefiles populated')
 
 
 #*******************************************************************************
@@ -45,6 +45,7 @@ import shapely.ops
 import functools
 import pyproj
 import csv
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -120,7 +121,8 @@ print('Read shapefile')
 print('- Open file')
 
 hsd_riv_lay=fiona.open(hsd_riv_shp, 'r')
-IS_riv_tot=len(hsd_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(hsd_riv_shp)
+IS_riv_tot=IM_riv_met['count']
 print('- The number of river features is: '+str(IS_riv_tot))
 
 #-------------------------------------------------------------------------------
@@ -140,15 +142,13 @@ print(' . Coordinate system used for computation of length: '+rrr_prj_cde)
 #-------------------------------------------------------------------------------
 print('- Read reach IDs')
 
-if 'ARCID' in hsd_riv_lay[0]['properties']:
+if 'ARCID' in IM_riv_fld:
      YV_riv_id='ARCID'
 else:
      print('ERROR - ARCID does not exist in '+hsd_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_tot_id=[]
-for JS_riv_tot in range(IS_riv_tot):
-     IV_riv_tot_id.append(int(hsd_riv_lay[JS_riv_tot]['properties'][YV_riv_id]))
+IV_riv_tot_id=[int(IS_riv_id) for IS_riv_id in IM_riv_fld[YV_riv_id]]
 
 #-------------------------------------------------------------------------------
 #Reading shapes
@@ -163,7 +163,7 @@ ZV_x_crd=[]
 ZV_y_crd=[]
 ZV_lengthkm=[]
 for JS_riv_tot in range(IS_riv_tot):
-     hsd_riv_crd=hsd_riv_lay[JS_riv_tot]['geometry']['coordinates']
+     hsd_riv_crd=shapely.get_coordinates(YV_riv_geo[JS_riv_tot]).tolist()
      IS_point=len(hsd_riv_crd)
      #Start and end points of each polyline:
      ZV_x_str.append(hsd_riv_crd[0][0])
@@ -35,9 +35,11 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
 import shapely.geometry
 import csv
+import rrr_lib_geo
+import rrr_lib_prf
+import rrr_lib_vec
 
 
 #*******************************************************************************
@@ -103,14 +105,15 @@ except IOError as e:
 #Read shapefile
 #*******************************************************************************
 print('Read shapefile')
+rrr_lib_prf.prf_sec('Read shapefile')
 
 #-------------------------------------------------------------------------------
 #Open file 
 #-------------------------------------------------------------------------------
 print('- Open file')
 
-mer_riv_lay=fiona.open(mer_riv_shp, 'r')
-IS_riv_tot=len(mer_riv_lay)
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(mer_riv_shp)
+IS_riv_tot=IM_riv_met['count']
 print('- The number of river features is: '+str(IS_riv_tot))
 
 #-------------------------------------------------------------------------------
@@ -118,52 +121,47 @@ print('- The number of river features is: '+str(IS_riv_tot))
 #-------------------------------------------------------------------------------
 print('- Read attributes')
 
-if 'COMID' in mer_riv_lay[0]['properties']:
+if 'COMID' in IM_riv_fld:
      YV_riv_id='COMID'
 else:
      print('ERROR - COMID does not exist in '+mer_riv_shp)
      raise SystemExit(22) 
 
-if 'lengthkm' in mer_riv_lay[0]['properties']:
+if 'lengthkm' in IM_riv_fld:
      YV_riv_lkm='lengthkm'
 else:
      print('ERROR - lengthkm does not exist in '+mer_riv_shp)
      raise SystemExit(22) 
 
-IV_riv_tot_id=[]
-ZV_riv_lkm=[]
-for JS_riv_tot in range(IS_riv_tot):
-     IV_riv_tot_id.append(int(mer_riv_lay[JS_riv_tot]['properties'][YV_riv_id]))
-     ZV_riv_lkm.append(float(mer_riv_lay[JS_riv_tot]['properties'][YV_riv_lkm]))
+IV_riv_tot_id=[int(IS_riv_id) for IS_riv_id in IM_riv_fld[YV_riv_id]]
+ZV_riv_lkm=[float(ZS_riv_lkm) for ZS_riv_lkm in IM_riv_fld[YV_riv_lkm]]
 
 #-------------------------------------------------------------------------------
 #Reading shapes
 #-------------------------------------------------------------------------------
 print('- Read shapes')
 
-ZV_x_ups=[]
-ZV_y_ups=[]
-ZV_x_dwn=[]
-ZV_y_dwn=[]
-ZV_x_crd=[]
-ZV_y_crd=[]
-for JS_riv_tot in range(IS_riv_tot):
-     mer_riv_crd=mer_riv_lay[JS_riv_tot]['geometry']['coordinates']
-     IS_point=len(mer_riv_crd)
-     #Upstream and downstream points of each polyline:
-     ZV_x_dwn.append(mer_riv_crd[0][0])
-     ZV_y_dwn.append(mer_riv_crd[0][1])
-     ZV_x_ups.append(mer_riv_crd[IS_point-1][0])
-     ZV_y_ups.append(mer_riv_crd[IS_point-1][1])
-     #Second to last downstream points for each polyline:
-     ZV_x_crd.append(mer_riv_crd[1][0])
-     ZV_y_crd.append(mer_riv_crd[1][1])
+YS_riv_typ,ZM_riv_xy,IV_riv_off=rrr_lib_geo.geo_rag(YV_riv_geo)
+IV_riv_prt,IV_riv_ftr=IV_riv_off
+IV_riv_str=IV_riv_prt[IV_riv_ftr[:-1]]
+IV_riv_end=IV_riv_prt[IV_riv_ftr[:-1]+1]-1
+#Flat array with the vertices of all polyline features, and index of the first
+#and last vertex of the first line of each feature
+#Upstream and downstream points of each polyline:
+ZV_x_dwn=ZM_riv_xy[IV_riv_str,0].tolist()
+ZV_y_dwn=ZM_riv_xy[IV_riv_str,1].tolist()
+ZV_x_ups=ZM_riv_xy[IV_riv_end,0].tolist()
+ZV_y_ups=ZM_riv_xy[IV_riv_end,1].tolist()
+#Second to last downstream points for each polyline:
+ZV_x_crd=ZM_riv_xy[IV_riv_str+1,0].tolist()
+ZV_y_crd=ZM_riv_xy[IV_riv_str+1,1].tolist()
 
 
 #*******************************************************************************
 #Compute connectivity
 #*******************************************************************************
 print('Compute connectivity')
+rrr_lib_prf.prf_sec('Compute connectivity')
 
 #-------------------------------------------------------------------------------
 #Create hash tables
@@ -225,6 +223,7 @@ print('- Total number of nonzero elements in network matrix: '                 \
 #Compute the topological order and a topological sort
 #*******************************************************************************
 print('Compute a topological sort')
+rrr_lib_prf.prf_sec('Compute a topological sort')
 
 #-------------------------------------------------------------------------------
 #Compute the topological order
@@ -273,6 +272,7 @@ print('- Topological sort computed')
 #Compute pfac
 #*******************************************************************************
 print('Processing routing parameters')
+rrr_lib_prf.prf_sec('Processing routing parameters')
 ZV_kfac=[float(0)] * IS_riv_tot
 ZV_xfac=[float(0)] * IS_riv_tot
 
@@ -285,6 +285,7 @@ for JS_riv_tot in range(IS_riv_tot):
 #Write outputs
 #*******************************************************************************
 print('Writing files')
+rrr_lib_prf.prf_sec('Writing files')
 
 with open(rrr_con_csv, 'w') as csvfile:
      csvwriter = csv.writer(csvfile, dialect='excel')
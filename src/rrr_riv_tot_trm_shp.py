@@ -8,6 +8,10 @@
 #this program creates a new shapefile that is similar to the input shapefile but
 #only retains those features for which the attribute has a value greater or
 #equal to the threshold.
+#Several trimmed shapefiles can be created at once by giving comma-separated
+#lists of attribute names (or only one name used for all thresholds), threshold
+#values, and new shapefiles. The attributes are read first, and only the
+#features retained in at least one of the new shapefiles are then read.
 #Author:
 #Cedric H. David, 2022-2023
 
@@ -16,16 +20,17 @@
 #Import Python modules
 #*******************************************************************************
 import sys
-import fiona
+import numpy
+import rrr_lib_vec
 
 
 #*******************************************************************************
 #Declaration of variables (given as command line arguments)
 #*******************************************************************************
 # 1 - rrr_riv_shp
-# 2 - YS_trm
-# 3 - ZS_trm
-# 4 - rrr_trm_shp
+# 2 - YV_trm
+# 3 - ZV_trm
+# 4 - YV_trm_shp
 
 
 #*******************************************************************************
@@ -37,9 +42,10 @@ if IS_arg != 5:
      raise SystemExit(22) 
 
 rrr_riv_shp=sys.argv[1]
-YS_trm=sys.argv[2]
-ZS_trm=float(sys.argv[3])
-rrr_trm_shp=sys.argv[4]
+YV_trm=sys.argv[2].split(',')
+ZV_trm=[float(YS_trm) for YS_trm in sys.argv[3].split(',')]
+YV_trm_shp=sys.argv[4].split(',')
+IS_trm=len(ZV_trm)
 
 
 #*******************************************************************************
@@ -47,9 +53,16 @@ rrr_trm_shp=sys.argv[4]
 #*******************************************************************************
 print('Command line inputs')
 print('- '+rrr_riv_shp)
-print('- '+YS_trm)
-print('- '+str(ZS_trm))
-print('- '+rrr_trm_shp)
+print('- '+','.join(YV_trm))
+print('- '+','.join([str(ZS_trm) for ZS_trm in ZV_trm]))
+print('- '+','.join(YV_trm_shp))
+
+if len(YV_trm)==1: YV_trm=YV_trm*IS_trm
+
+if len(YV_trm)!=IS_trm or len(YV_trm_shp)!=IS_trm:
+     print('ERROR - The numbers of attributes, thresholds and new shapefiles '+\
+           'differ')
+     raise SystemExit(22) 
 
 
 #*******************************************************************************
@@ -69,56 +82,58 @@ except IOError as e:
 print('Read shapefile')
 
 #-------------------------------------------------------------------------------
-#Open file 
+#Read attributes
 #-------------------------------------------------------------------------------
-print('- Open file')
+print('- Read attributes')
+
+YV_riv_fld=rrr_lib_vec.vec_fld(rrr_riv_shp)
+for YS_trm in YV_trm:
+     if YS_trm not in YV_riv_fld:
+          print('ERROR - The '+YS_trm+' attribute does not exist in '          \
+                +rrr_riv_shp)
+          raise SystemExit(22) 
 
-rrr_riv_lay=fiona.open(rrr_riv_shp, 'r')
-IS_riv_tot=len(rrr_riv_lay)
+IM_trm_fld,YV_trm_geo,IM_trm_met=rrr_lib_vec.vec_rea(rrr_riv_shp,              \
+                                                     list(set(YV_trm)),False)
+IS_riv_tot=IM_trm_met['count']
 print('- The number of river features is: '+str(IS_riv_tot))
 
 #-------------------------------------------------------------------------------
-#Read attributes
+#Apply thresholds
 #-------------------------------------------------------------------------------
-print('- Read attributes')
+print('- Apply thresholds')
 
-if YS_trm not in rrr_riv_lay[0]['properties']:
-     print('ERROR - The '+YS_trm+' attribute does not exist in '+rrr_riv_shp)
-     raise SystemExit(22) 
+BM_riv_trm=numpy.zeros((IS_trm,IS_riv_tot),dtype=bool)
+for JS_trm in range(IS_trm):
+     BM_riv_trm[JS_trm,:]=IM_trm_fld[YV_trm[JS_trm]]>=ZV_trm[JS_trm]
+     print(' . The number of features with '+YV_trm[JS_trm]+' >= '             \
+           +str(ZV_trm[JS_trm])+' is: '+str(BM_riv_trm[JS_trm,:].sum()))
+
+IV_riv_sel=numpy.flatnonzero(BM_riv_trm.any(axis=0))
+#Features retained in at least one new shapefile
+print('- The number of features retained in at least one shapefile is: '       \
+      +str(len(IV_riv_sel)))
 
 #-------------------------------------------------------------------------------
-#Read driver, crs, and schema
+#Read retained features
 #-------------------------------------------------------------------------------
-print('- Read driver, crs and schema')
+print('- Read retained features')
 
-rrr_riv_drv=rrr_riv_lay.driver
-rrr_riv_crs=rrr_riv_lay.crs
-rrr_riv_sch=rrr_riv_lay.schema
+IM_riv_fld,YV_riv_geo,IM_riv_met=rrr_lib_vec.vec_rea(rrr_riv_shp,None,True,    \
+                                                     IV_riv_sel)
 
 
 #*******************************************************************************
-#Create a trimmed shapefile based on the threshold
+#Create trimmed shapefiles based on the thresholds
 #*******************************************************************************
-print('Create a trimmed shapefile based on the threshold')
-
-rrr_trm_drv=rrr_riv_drv
-rrr_trm_crs=rrr_riv_crs
-rrr_trm_sch=rrr_riv_sch
-
-with fiona.open(rrr_trm_shp,'w',driver=rrr_trm_drv,                            \
-                                crs=rrr_trm_crs,                               \
-                                schema=rrr_trm_sch) as rrr_trm_lay:
-     JS_riv_trm=0
-     for JS_riv_tot in range(IS_riv_tot):
-          if rrr_riv_lay[JS_riv_tot]['properties'][YS_trm] >= ZS_trm:
-               rrr_trm_prp=rrr_riv_lay[JS_riv_tot]['properties']
-               rrr_trm_geo=rrr_riv_lay[JS_riv_tot]['geometry']
-               rrr_trm_lay.write({                                             \
-                                  'properties': rrr_trm_prp,                   \
-                                  'geometry': rrr_trm_geo,                     \
-                                  })
+print('Create trimmed shapefiles based on the thresholds')
 
-print(' - New shapefile created')
+for JS_trm in range(IS_trm):
+     BV_sel_trm=BM_riv_trm[JS_trm,IV_riv_sel]
+     IM_sel_fld={YS_fld:IM_riv_fld[YS_fld][BV_sel_trm] for YS_fld in IM_riv_fld}
+     rrr_lib_vec.vec_wri(YV_trm_shp[JS_trm],IM_sel_fld,YV_riv_geo[BV_sel_trm], \
+                         IM_riv_met)
+     print(' - New shapefile created: '+YV_trm_shp[JS_trm])
 
 
 #*******************************************************************************
@@ -4,7 +4,12 @@
 #*******************************************************************************
 
 #Purpose:
-#Compare netCDF files.
+#Compare netCDF files. The files are read in blocks of time steps, each block
+#of the second file being reordered if the river IDs are sorted differently.
+#The maximum absolute difference and the relative (L2) difference of each time
+#step are computed for whole blocks at once, and the blocks can be compared by
+#several processes. The comparison can also stop at the first block exceeding
+#the tolerances, which is enough to reject files quickly.
 #Author:
 #Cedric H. David, 2016-2023
 
@@ -15,9 +20,18 @@
 import sys
 import netCDF4
 import math
+import multiprocessing
 import numpy
 
 
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+IS_blk=100      # number of time steps read at once
+IS_cpu=1        # number of processes used to compare blocks
+BS_qck=False    # stop at the first block exceeding the tolerances
+
+
 #*******************************************************************************
 #Declaration of variables (given as command line arguments)
 #*******************************************************************************
@@ -188,63 +202,99 @@ if 'IV_riv_tot1' in locals() and 'IV_riv_tot2' in locals():
      else:
           if numpy.array_equal(numpy.sort(IV_riv_tot1),numpy.sort(IV_riv_tot2)):
                print('WARNING: The rivids are the same, but sorted differently')
-               IM_hsh={}
-               for JS_riv_tot in range(IS_riv_tot):
-                    IM_hsh[IV_riv_tot2[JS_riv_tot]]=JS_riv_tot
-               IV_loc=[]
-               for JS_riv_tot in range(IS_riv_tot):
-                    IV_loc.append(IM_hsh[IV_riv_tot1[JS_riv_tot]])
+               IV_srt=numpy.argsort(IV_riv_tot2,kind='stable')
+               IV_loc=IV_srt[numpy.searchsorted(IV_riv_tot2,IV_riv_tot1,       \
+                                                sorter=IV_srt)]
+               #Index in the second file of each river ID of the first file
           else:
                print('ERROR: The rivids differ')
                raise SystemExit(99)
      print('-------------------------------')
 
 #-------------------------------------------------------------------------------
-#Compute differences
+#Close files before comparing blocks
 #-------------------------------------------------------------------------------
+f1.close()
+f2.close()
+#Each process opens its own file handles, which cannot be shared
+
+
+#*******************************************************************************
+#Functions
+#*******************************************************************************
+def cmp_ini():
+     #Opens both files in the current process
+     global g1,g2
+     g1=netCDF4.Dataset(rrr_ncf_file1, "r")
+     g2=netCDF4.Dataset(rrr_ncf_file2, "r")
+
+def cmp_blk(JS_time):
+     #Compares the block of time steps starting at JS_time and returns the max
+     #absolute difference, the max relative difference over its time steps, and
+     #whether masked values were found in each file.
+     JS_time_end=min(JS_time+IS_blk,IS_time)
+     ZM_Vol_1=g1.variables[rrr_ncf_var][JS_time:JS_time_end,:]
+     ZM_Vol_2=g2.variables[rrr_ncf_var][JS_time:JS_time_end,:]
+     if 'IV_loc' in globals():
+          ZM_Vol_2=ZM_Vol_2[:,IV_loc]
+
+     #--------------------------------------------------------------------------
+     #Converting masked values to -9999
+     #--------------------------------------------------------------------------
+     BS_msk_1=numpy.ma.is_masked(ZM_Vol_1)
+     BS_msk_2=numpy.ma.is_masked(ZM_Vol_2)
+     ZM_Vol_1=numpy.ma.filled(ZM_Vol_1, fill_value=-9999)
+     ZM_Vol_2=numpy.ma.filled(ZM_Vol_2, fill_value=-9999)
+
+     #--------------------------------------------------------------------------
+     #Comparing difference values
+     #--------------------------------------------------------------------------
+     ZM_dVol_abs=numpy.absolute(ZM_Vol_1-ZM_Vol_2)
+     ZS_adif=numpy.max(ZM_dVol_abs)
+     with numpy.errstate(divide='ignore',invalid='ignore'):
+          ZV_rdif=numpy.sqrt( numpy.sum(ZM_dVol_abs*ZM_dVol_abs,axis=1)        \
+                             /numpy.sum(ZM_Vol_1*ZM_Vol_1,axis=1))
+     #One relative difference per time step
+     ZV_rdif=ZV_rdif[~numpy.isnan(ZV_rdif)]
+     ZS_rdif=numpy.max(ZV_rdif) if ZV_rdif.size>0 else 0
+     #Time steps that are null in both files (0/0) are skipped so that they do
+     #not hide the differences of other time steps of the block
+     return ZS_adif,ZS_rdif,BS_msk_1,BS_msk_2
+
+
+#*******************************************************************************
+#Compute differences
+#*******************************************************************************
 ZS_rdif_max=0
 ZS_adif_max=0
 ZS_msk_1=False
 ZS_msk_2=False
 
-for JS_time in range(IS_time):
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#initializing
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-     ZS_rdif=0
-     ZS_adif=0
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#getting variables from netCDF files
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-     ZV_Vol_1=f1.variables[rrr_ncf_var][JS_time,:]
-     ZV_Vol_2=f2.variables[rrr_ncf_var][JS_time,:]
-     if 'IV_loc' in locals():
-          ZV_Vol_2=ZV_Vol_2[IV_loc]
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Converting masked values to -9999
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-     if numpy.ma.is_masked(ZV_Vol_1):
-          ZV_Vol_1=numpy.ma.filled(ZV_Vol_1, fill_value=-9999)
-          ZS_msk_1=True
-     if numpy.ma.is_masked(ZV_Vol_2):
-          ZV_Vol_2=numpy.ma.filled(ZV_Vol_2, fill_value=-9999)
-          ZS_msk_2=True
-
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-#Comparing difference values
-#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-     #Tried computations with regular Python lists but this makes is very slow.
-     #Also tried using map(operator.sub,V,W) or [x-y for x,y in zip(V,W)]
-     #But this still results in slow computations.
-     #The best performance seems to be with Numpy.
-     ZV_dVol_abs=numpy.absolute(ZV_Vol_1-ZV_Vol_2)
-     ZS_adif_max=max(numpy.max(ZV_dVol_abs),ZS_adif_max)
-
-     ZS_rdif= math.sqrt( numpy.sum(ZV_dVol_abs*ZV_dVol_abs)                    \
-                        /numpy.sum(ZV_Vol_1*ZV_Vol_1))
-     ZS_rdif_max=max(ZS_rdif,ZS_rdif_max)
+IV_blk=list(range(0,IS_time,IS_blk))
+print('Number of blocks of time steps:'+str(len(IV_blk)))
+print('-------------------------------')
+
+if IS_cpu==1:
+     cmp_ini()
+     YV_res=map(cmp_blk,IV_blk)
+else:
+     pool=multiprocessing.get_context('fork').Pool(IS_cpu,initializer=cmp_ini)
+     YV_res=pool.imap(cmp_blk,IV_blk,                                          \
+                      chunksize=max(1,math.ceil(len(IV_blk)/IS_cpu/4)))
+     #Each process compares contiguous ranges of blocks
+
+for ZS_adif,ZS_rdif,BS_msk_1,BS_msk_2 in YV_res:
+     ZS_adif_max=numpy.maximum(ZS_adif,ZS_adif_max)
+     ZS_rdif_max=numpy.maximum(ZS_rdif,ZS_rdif_max)
+     ZS_msk_1=ZS_msk_1 or BS_msk_1
+     ZS_msk_2=ZS_msk_2 or BS_msk_2
+     if BS_qck and not (ZS_rdif_max <= ZS_rtol and ZS_adif_max <= ZS_atol):
+          print('WARNING: Stopped at the first block exceeding tolerances')
+          print('-------------------------------')
+          break
+
+if IS_cpu!=1:
+     pool.terminate()
 
 
 #*******************************************************************************
@@ -258,12 +308,12 @@ print('Max relative difference       :'+'{0:.2e}'.format(ZS_rdif_max))
 print('Max absolute difference       :'+'{0:.2e}'.format(ZS_adif_max))
 print('-------------------------------')
 
-if ZS_rdif_max > ZS_rtol:
+if not ZS_rdif_max <= ZS_rtol:
      print('Unacceptable rel. difference!!!')
      print('-------------------------------')
      raise SystemExit(99)
 
-if ZS_adif_max > ZS_atol:
+if not ZS_adif_max <= ZS_atol:
      print('Unacceptable abs. difference!!!')
      print('-------------------------------')
      raise SystemExit(99)
@@ -6,6 +6,14 @@
 #Purpose:
 #Compare two shapefiles. The geometries are first checked, then all the 
 #attributes of the first file are checked within the second file.
+#Both files are read at once into one array per attribute and one array of
+#geometries, which are then compared for all features at once. Unless a
+#tolerance is given, geometries are compared through a hash of their (possibly
+#normalized) WKB representation; otherwise, their coordinates are compared
+#with the tolerance. The numbers of differences and the first indices of the
+#features that differ are reported for the geometries and for each attribute.
+#The types of the attributes, including their widths and precisions, are also
+#compared.
 #Author:
 #Cedric H. David, 2016-2023
 
@@ -14,7 +22,23 @@
 #Prerequisites
 #*******************************************************************************
 import sys
+import math
+import hashlib
+import numpy
+import shapely
+import shapely.geometry
 import fiona
+try:
+     import pyogrio.raw
+except ImportError:
+     pyogrio=None
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+BS_nrm=False    # ignore ring start and orientation of geometries (normalize)
+IS_shw=10       # maximum number of indices of differing features reported
 
 
 #*******************************************************************************
@@ -22,18 +46,23 @@ import fiona
 #*******************************************************************************
 # 1 - rrr_old_shp
 # 2 - rrr_new_shp
+#(3)- absolute tolerance on coordinates
 
 
 #*******************************************************************************
 #Get command line arguments
 #*******************************************************************************
 IS_arg=len(sys.argv)
-if IS_arg != 3 :
-     print('ERROR - 2 and only 2 arguments can be used')
+if IS_arg < 3 or IS_arg > 4:
+     print('ERROR - A minimum of 2 and a maximum of 3 arguments can be used')
      raise SystemExit(22) 
 
 rrr_old_shp=sys.argv[1]
 rrr_new_shp=sys.argv[2]
+if IS_arg > 3:
+     ZS_tol=float(sys.argv[3])
+else:
+     ZS_tol=float(0)
    
 
 #*******************************************************************************
@@ -42,6 +71,7 @@ rrr_new_shp=sys.argv[2]
 print('Command line inputs')
 print('- '+rrr_old_shp)
 print('- '+rrr_new_shp)
+print('- '+str(ZS_tol))
 
 
 #*******************************************************************************
@@ -62,17 +92,77 @@ except IOError as e:
      raise SystemExit(22) 
 
 
+#*******************************************************************************
+#Functions
+#*******************************************************************************
+def cmp_rea(rrr_shp):
+     #Returns the names of the attributes, a dictionary with one array per
+     #attribute, and the array of Shapely geometries of a shapefile, all read at
+     #once by pyogrio if available, or by one sequential pass with fiona.
+     if pyogrio is not None:
+          IM_met,IV_fid,YV_wkb,YV_dat=pyogrio.raw.read(rrr_shp)
+          YV_prp=list(IM_met['fields'])
+          return YV_prp,dict(zip(YV_prp,YV_dat)),shapely.from_wkb(YV_wkb)
+
+     with fiona.open(rrr_shp,'r') as lay:
+          YV_prp=list(lay.schema['properties'])
+          YM_val={YS_prp:[] for YS_prp in YV_prp}
+          YV_geo=[]
+          for fea in lay:
+               for YS_prp in YV_prp:
+                    YM_val[YS_prp].append(fea['properties'][YS_prp])
+               YV_geo.append(fea['geometry'])
+     IM_fld={YS_prp:numpy.array(YM_val[YS_prp]) for YS_prp in YV_prp}
+     YV_geo=numpy.array([None if geo is None else shapely.geometry.shape(geo)  \
+                         for geo in YV_geo],dtype=object)
+     return YV_prp,IM_fld,YV_geo
+
+def cmp_sch(rrr_shp):
+     #Returns the types of the attributes of a shapefile as given in its fiona
+     #schema, e.g. 'float:24.5', which pyogrio does not provide.
+     with fiona.open(rrr_shp,'r') as lay:
+          return dict(lay.schema['properties'])
+
+def cmp_hsh(YV_geo):
+     #Returns a 64-bit hash of the WKB representation of each geometry.
+     YV_wkb=shapely.to_wkb(YV_geo)
+     YS_hsh=b''.join([hashlib.blake2b(wkb or b'',digest_size=8).digest()       \
+                      for wkb in YV_wkb])
+     #Missing geometries have the hash of an empty string
+     return numpy.frombuffer(YS_hsh,dtype=numpy.uint64)
+
+def cmp_nul(ZV_prp):
+     #Returns True where attribute values are missing, which are read as None
+     #by fiona and as NaN for floating-point fields by pyogrio.
+     if ZV_prp.dtype.kind=='f':
+          return numpy.isnan(ZV_prp)
+     if ZV_prp.dtype==object:
+          return numpy.array([val is None or                                   \
+                              (isinstance(val,float) and math.isnan(val))      \
+                              for val in ZV_prp],dtype=bool)
+     return numpy.zeros(len(ZV_prp),dtype=bool)
+
+def cmp_dif(YS_dif,BV_dif):
+     #Prints the number of differences and the first indices where they occur,
+     #and returns True if there are any.
+     IV_dif=numpy.flatnonzero(BV_dif)
+     if len(IV_dif)==0: return False
+     print('ERROR - The '+YS_dif+' of features are different for '             \
+           +str(len(IV_dif))+' feature(s), first indices: '                    \
+           +str(IV_dif[:IS_shw].tolist()))
+     return True
+
+
 #*******************************************************************************
 #Open rrr_old_shp
 #*******************************************************************************
 print('Open rrr_old_shp')
 
-rrr_old_lay=fiona.open(rrr_old_shp, 'r')
+YV_old_prp,IM_old_fld,YV_old_geo=cmp_rea(rrr_old_shp)
 
-IS_old_tot=len(rrr_old_lay)
+IS_old_tot=len(YV_old_geo)
 print('- The number of features is: '+str(IS_old_tot))
 
-YV_old_prp=rrr_old_lay.schema['properties'].keys()
 print('- The number of attributes is: '+str(len(YV_old_prp)))
 
 
@@ -81,12 +171,11 @@ print('- The number of attributes is: '+str(len(YV_old_prp)))
 #*******************************************************************************
 print('Open rrr_new_shp')
 
-rrr_new_lay=fiona.open(rrr_new_shp, 'r')
+YV_new_prp,IM_new_fld,YV_new_geo=cmp_rea(rrr_new_shp)
 
-IS_new_tot=len(rrr_new_lay)
+IS_new_tot=len(YV_new_geo)
 print('- The number of features is: '+str(IS_new_tot))
 
-YV_new_prp=rrr_new_lay.schema['properties'].keys()
 print('- The number of attributes is: '+str(len(YV_new_prp)))
 
 
@@ -101,44 +190,67 @@ else:
            +str(IS_old_tot)+' <> '+str(IS_new_tot))
      raise SystemExit(99) 
 
+for YS_old_prp in YV_old_prp:
+     if YS_old_prp not in IM_new_fld:
+          print('ERROR - The attribute '+YS_old_prp+' does not exist in '      \
+                +rrr_new_shp)
+          raise SystemExit(99) 
+
 
 #*******************************************************************************
 #Compare content of shapefiles
 #*******************************************************************************
 print('Compare content of shapefiles')
 
-for JS_old_tot in range(IS_old_tot):
-     #--------------------------------------------------------------------------
-     #Extract the properties and geometry for the current feature of old file
-     #--------------------------------------------------------------------------
-     rrr_old_fea=rrr_old_lay[JS_old_tot]
-     rrr_old_prp=rrr_old_fea['properties']
-     rrr_old_geo=rrr_old_fea['geometry']
-
-     #--------------------------------------------------------------------------
-     #Extract the properties and geometry for the current feature of new file
-     #--------------------------------------------------------------------------
-     rrr_new_fea=rrr_new_lay[JS_old_tot]
-     rrr_new_prp=rrr_new_fea['properties']
-     rrr_new_geo=rrr_new_fea['geometry']
-     
-     #--------------------------------------------------------------------------
-     #Compare geometry
-     #--------------------------------------------------------------------------
-     if rrr_old_geo!=rrr_new_geo:
-          print('ERROR - The geometries of features are different for index: ' \
-                +str(JS_old_tot))
-          raise SystemExit(99) 
+BS_dif=False
+
+#-------------------------------------------------------------------------------
+#Compare types of attributes
+#-------------------------------------------------------------------------------
+IM_old_sch=cmp_sch(rrr_old_shp)
+IM_new_sch=cmp_sch(rrr_new_shp)
+for YS_old_prp in YV_old_prp:
+     if IM_old_sch[YS_old_prp]!=IM_new_sch[YS_old_prp]:
+          print('ERROR - The types of the attribute '+YS_old_prp+' are '       \
+                +'different: '+IM_old_sch[YS_old_prp]+' <> '                   \
+                +IM_new_sch[YS_old_prp])
+          BS_dif=True
+
+#-------------------------------------------------------------------------------
+#Compare geometries
+#-------------------------------------------------------------------------------
+if BS_nrm:
+     YV_old_geo=shapely.normalize(YV_old_geo)
+     YV_new_geo=shapely.normalize(YV_new_geo)
+
+if ZS_tol==0:
+     BV_geo_dif=cmp_hsh(YV_old_geo)!=cmp_hsh(YV_new_geo)
+else:
+     BV_geo_dif=numpy.logical_not(shapely.equals_exact(YV_old_geo,YV_new_geo,  \
+                                                       tolerance=ZS_tol))
+     BV_geo_dif[shapely.is_missing(YV_old_geo)                                 \
+               &shapely.is_missing(YV_new_geo)]=False
+     #Missing geometries are never equal for equals_exact()
+BS_dif=cmp_dif('geometries',BV_geo_dif) or BS_dif
+
+#-------------------------------------------------------------------------------
+#Compare attributes
+#-------------------------------------------------------------------------------
+for YS_old_prp in YV_old_prp:
+     ZV_old_prp=IM_old_fld[YS_old_prp]
+     ZV_new_prp=IM_new_fld[YS_old_prp]
+     if ZV_old_prp.dtype!=ZV_new_prp.dtype:
+          ZV_old_prp=ZV_old_prp.astype(object)
+          ZV_new_prp=ZV_new_prp.astype(object)
+     #Values of different types are compared as Python objects
+     BV_prp_dif=ZV_old_prp!=ZV_new_prp
+     BV_prp_dif&=~(cmp_nul(ZV_old_prp)&cmp_nul(ZV_new_prp))
+     #Values missing in both files are equal, although NaN!=NaN
+     BS_dif=cmp_dif('attributes ('+YS_old_prp+')',BV_prp_dif) or BS_dif
+
+if BS_dif:
+     raise SystemExit(99) 
 
-     #--------------------------------------------------------------------------
-     #Compare attributes
-     #--------------------------------------------------------------------------
-     for YS_old_prp in YV_old_prp:
-          if rrr_old_prp[YS_old_prp]!=rrr_new_prp[YS_old_prp]:
-               print('ERROR - The attributes of features are different for '+  \
-                     'index: '+str(JS_old_tot)+', attribute: '+str(YS_old_prp))
-               raise SystemExit(99)
-            
 print('Success!!!')
 
 
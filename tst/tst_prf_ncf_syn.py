@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#tst_prf_ncf_syn.py
+#*******************************************************************************
+
+#Purpose:
+#Given a number of river reaches, a number of time steps, and the name of a JSON
+#report file, this script generates a synthetic river network and synthetic
+#inflow files in a temporary directory, one for each of the storage layouts
+#(chunk sizes and compression level) listed below. The access patterns used in
+#RRR are then timed for each file: appending one time step at a time, reading
+#blocks of time steps, gathering the time series at a set of stations spread
+#along the network, and reducing all river reaches one time step at a time. The
+#durations, volumes of data, and throughputs (in MB/s and time steps/s) are
+#saved in a machine-readable report that can be compared across versions or
+#computers. This script extends tst_prf_ncf.py which only considers existing
+#files.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import os
+import csv
+import json
+import time
+import shutil
+import tempfile
+import platform
+import datetime
+import netCDF4
+import numpy
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+YV_lay=[[None,0],                                                              \
+        [[1,-1],0],                                                            \
+        [[16,4096],0],                                                         \
+        [[16,4096],1],                                                         \
+        [[-1,64],1]]
+#Storage layouts as [chunk sizes along (time,rivid), compression level], where
+#None means contiguous storage and -1 means the size of the dimension
+IS_blk=16       # number of time steps read at once in block reads
+IS_obs=100      # number of stations in station gathers
+IS_out=100      # approximate number of reaches per outlet in the network
+IS_sed=0        # seed of the random number generator
+BS_kep=False    # keep the temporary directory with the synthetic files
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - IS_riv_tot
+# 2 - IS_time
+# 3 - rrr_prf_jsn
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 4:
+     print('ERROR - 3 and only 3 arguments must be used')
+     raise SystemExit(22)
+
+IS_riv_tot=int(sys.argv[1])
+IS_time=int(sys.argv[2])
+rrr_prf_jsn=sys.argv[3]
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+str(IS_riv_tot))
+print('- '+str(IS_time))
+print('- '+rrr_prf_jsn)
+
+if IS_riv_tot < IS_obs or IS_time < IS_blk:
+     print('ERROR - At least '+str(IS_obs)+' river reaches and '+str(IS_blk)+  \
+           ' time steps are needed')
+     raise SystemExit(22)
+
+
+#*******************************************************************************
+#Timing function
+#*******************************************************************************
+def tim(YS_pat,fun,ZS_byt,IS_stp):
+     #Runs fun(), prints and returns the duration and throughputs given the
+     #number of bytes and of time steps accessed.
+     ZS_beg=time.time()
+     fun()
+     ZS_dur=max(time.time()-ZS_beg,1e-9)
+     IM_res={'pattern':YS_pat,                                                 \
+             'seconds':ZS_dur,                                                 \
+             'MB':ZS_byt/1e6,                                                  \
+             'MB_per_s':ZS_byt/1e6/ZS_dur,                                     \
+             'steps_per_s':IS_stp/ZS_dur}
+     print(' . '+YS_pat+': '+str(round(ZS_dur,3))+' seconds, '                 \
+           +str(round(IM_res['MB_per_s'],1))+' MB/s, '                         \
+           +str(round(IM_res['steps_per_s'],1))+' steps/s')
+     return IM_res
+
+
+#*******************************************************************************
+#Generating synthetic network
+#*******************************************************************************
+print('Generating synthetic network')
+
+rrr_tmp_dir=tempfile.mkdtemp(prefix='tst_prf_ncf_syn_')
+print('- Temporary directory: '+rrr_tmp_dir)
+
+numpy.random.seed(IS_sed)
+
+IV_riv_tot_id=numpy.random.permutation(IS_riv_tot)+1
+IV_riv_tot_dn=numpy.zeros(IS_riv_tot,dtype=numpy.int64)
+for JS_riv_tot in range(IS_riv_tot-1):
+     if numpy.random.randint(IS_out)!=0:
+          IV_riv_tot_dn[JS_riv_tot]=IV_riv_tot_id[                             \
+                         numpy.random.randint(JS_riv_tot+1,IS_riv_tot)]
+#Each reach flows into a reach further down the list, or is an outlet
+
+rrr_con_csv=os.path.join(rrr_tmp_dir,'rapid_connect_syn.csv')
+with open(rrr_con_csv,'w') as csvfile:
+     csvwriter=csv.writer(csvfile)
+     for JS_riv_tot in range(IS_riv_tot):
+          csvwriter.writerow([IV_riv_tot_id[JS_riv_tot],                       \
+                              IV_riv_tot_dn[JS_riv_tot]])
+
+print('- Number of river reaches: '+str(IS_riv_tot))
+print('- Number of outlets: '+str((IV_riv_tot_dn==0).sum()))
+
+#-------------------------------------------------------------------------------
+#Selecting stations
+#-------------------------------------------------------------------------------
+IM_hsh={}
+with open(rrr_con_csv,'r') as csvfile:
+     csvreader=csv.reader(csvfile)
+     JS_riv_tot=0
+     for row in csvreader:
+          IM_hsh[int(row[0])]=JS_riv_tot
+          JS_riv_tot=JS_riv_tot+1
+
+IV_obs_id=numpy.random.choice(IV_riv_tot_id,IS_obs,replace=False)
+IV_obs_ix=sorted([IM_hsh[IS_obs_id] for IS_obs_id in IV_obs_id])
+print('- Number of stations: '+str(IS_obs))
+
+
+#*******************************************************************************
+#Timing access patterns for each storage layout
+#*******************************************************************************
+print('Timing access patterns for each storage layout')
+
+ZS_byt_stp=4.0*IS_riv_tot
+#Number of bytes in one time step of single precision values
+YV_res=[]
+
+for IV_chk,IS_cmp in YV_lay:
+     if IV_chk is not None:
+          IV_chk=[IS_time if IV_chk[0]==-1 else min(IV_chk[0],IS_time),        \
+                  IS_riv_tot if IV_chk[1]==-1 else min(IV_chk[1],IS_riv_tot)]
+     print('- Chunk sizes: '+str(IV_chk)+', compression level: '+str(IS_cmp))
+     rrr_m3r_ncf=os.path.join(rrr_tmp_dir,'m3_riv_syn_'+str(len(YV_res))+'.nc')
+
+     #--------------------------------------------------------------------------
+     #Appending one time step at a time
+     #--------------------------------------------------------------------------
+     g=netCDF4.Dataset(rrr_m3r_ncf,'w',format='NETCDF4')
+     g.createDimension('time',None if IV_chk is not None else IS_time)
+     g.createDimension('rivid',IS_riv_tot)
+     g.createVariable('rivid','i4',('rivid',))[:]=IV_riv_tot_id
+     m3_riv=g.createVariable('m3_riv','f4',('time','rivid',),                  \
+                             zlib=IS_cmp>0,complevel=max(IS_cmp,1),            \
+                             contiguous=IV_chk is None,chunksizes=IV_chk)
+     #Contiguous storage is only possible with fixed dimensions
+     ZV_stp=numpy.random.random(IS_riv_tot).astype(numpy.float32)
+
+     def app():
+          for JS_time in range(IS_time):
+               m3_riv[JS_time,:]=ZV_stp*(JS_time%24)
+          g.sync()
+
+     IM_app=tim('append_write',app,ZS_byt_stp*IS_time,IS_time)
+     g.close()
+
+     #--------------------------------------------------------------------------
+     #Reading
+     #--------------------------------------------------------------------------
+     f=netCDF4.Dataset(rrr_m3r_ncf,'r')
+     m3_riv=f.variables['m3_riv']
+
+     def blk():
+          for JS_time in range(0,IS_time,IS_blk):
+               m3_riv[JS_time:min(JS_time+IS_blk,IS_time),:]
+
+     def obs():
+          m3_riv[:,IV_obs_ix]
+
+     def red():
+          ZV_sum=numpy.zeros(IS_riv_tot)
+          for JS_time in range(IS_time):
+               ZV_sum=ZV_sum+m3_riv[JS_time,:]
+
+     IM_blk=tim('block_read',blk,ZS_byt_stp*IS_time,IS_time)
+     IM_obs=tim('station_gather',obs,4.0*IS_obs*IS_time,IS_time)
+     IM_red=tim('map_reduction',red,ZS_byt_stp*IS_time,IS_time)
+     f.close()
+
+     IM_lay={'chunksizes':IV_chk,'complevel':IS_cmp,                           \
+             'file_MB':os.path.getsize(rrr_m3r_ncf)/1e6}
+     for IM_res in [IM_app,IM_blk,IM_obs,IM_red]:
+          IM_res.update(IM_lay)
+          YV_res.append(IM_res)
+     os.remove(rrr_m3r_ncf)
+
+
+#*******************************************************************************
+#Writing report
+#*******************************************************************************
+print('Writing report')
+
+IM_rep={'date':datetime.datetime.utcnow().replace(microsecond=0).isoformat(),  \
+        'host':{'node':platform.node(),                                        \
+                'machine':platform.machine(),                                  \
+                'python':platform.python_version(),                            \
+                'netCDF4':netCDF4.__version__,                                 \
+                'netcdf':netCDF4.__netcdf4libversion__,                        \
+                'hdf5':netCDF4.__hdf5libversion__},                            \
+        'config':{'IS_riv_tot':IS_riv_tot,                                     \
+                  'IS_time':IS_time,                                           \
+                  'IS_blk':IS_blk,                                             \
+                  'IS_obs':IS_obs,                                             \
+                  'IS_sed':IS_sed},                                            \
+        'results':YV_res}
+
+with open(rrr_prf_jsn,'w') as jsnfile:
+     json.dump(IM_rep,jsnfile,indent=1)
+
+if not BS_kep:
+     shutil.rmtree(rrr_tmp_dir)
+
+print('- Done')
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************
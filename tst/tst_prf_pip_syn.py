@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#tst_prf_pip_syn.py
+#*******************************************************************************
+
+#Purpose:
+#Given a comma-separated list of numbers of river reaches, a number of time
+#steps, and the name of a JSON report file, this script evaluates the
+#performance of the main RRR processing chain without downloading any data. For
+#each number of river reaches, a synthetic river forest shapefile (following
+#the MERIT Basins format), a synthetic catchment shapefile, and a synthetic
+#gridded runoff netCDF file (following the GLDAS format) are created in a
+#temporary directory. The river reaches are laid on a regular grid in which each
+#reach flows into one of the three closest reaches of the row below, the first
+#row being made of outlets, and each catchment is the grid cell of its reach.
+#The network generation, catchment, coupling, volume, and routing stages are
+#then run as separate processes, and the wall time, peak resident set size
+#(RSS), and size of outputs of each stage are saved in a machine-readable
+#report that allows tracking how performance scales with the size of domains.
+#The traces of the programs that use rrr_lib_prf.py (durations, peak RSS, and
+#netCDF data read and written for each of their sections) are also gathered in
+#the report.
+#Author:
+#Cedric H. David, 2018-2023
+
+
+#*******************************************************************************
+#Import Python modules
+#*******************************************************************************
+import sys
+import os
+import math
+import json
+import time
+import shutil
+import tempfile
+import platform
+import datetime
+import glob
+import subprocess
+import fiona
+import netCDF4
+import numpy
+
+
+#*******************************************************************************
+#Predefined hard-coded variables
+#*******************************************************************************
+ZS_riv_dxy=0.01 # size of the grid cell of each river reach (degrees)
+ZS_lsm_dxy=0.25 # size of the grid cells of the runoff file (degrees)
+ZS_lon_ori=-100 # longitude of the southwest corner of the domain
+ZS_lat_ori=30   # latitude of the southwest corner of the domain
+IS_TaR=10800    # time step of the runoff file (seconds)
+IS_max_up=5     # maximum number of upstream river reaches
+IS_sed=0        # seed of the random number generator
+BS_kep=False    # keep the temporary directory with the synthetic files
+ZS_pol=0.05     # time between two readings of the peak RSS of a stage (s)
+
+
+#*******************************************************************************
+#Declaration of variables (given as command line arguments)
+#*******************************************************************************
+# 1 - IV_riv_tot
+# 2 - IS_time
+# 3 - rrr_prf_jsn
+
+
+#*******************************************************************************
+#Get command line arguments
+#*******************************************************************************
+IS_arg=len(sys.argv)
+if IS_arg != 4:
+     print('ERROR - 3 and only 3 arguments must be used')
+     raise SystemExit(22)
+
+IV_riv_tot=[int(IS_riv_tot) for IS_riv_tot in sys.argv[1].split(',')]
+IS_time=int(sys.argv[2])
+rrr_prf_jsn=sys.argv[3]
+
+
+#*******************************************************************************
+#Print input information
+#*******************************************************************************
+print('Command line inputs')
+print('- '+str(IV_riv_tot))
+print('- '+str(IS_time))
+print('- '+rrr_prf_jsn)
+
+
+#*******************************************************************************
+#Stage function
+#*******************************************************************************
+rrr_tst_dir=os.path.dirname(os.path.abspath(__file__))
+rrr_src_dir=os.path.join(os.path.dirname(rrr_tst_dir),'src')
+
+def stg_hwm(IS_pid):
+     #Returns the peak RSS (MB) of a running process as given by VmHWM in the
+     #Linux /proc interface, or 0 elsewhere. Unlike the ru_maxrss returned by
+     #os.wait4(), which includes the peak inherited from the parent at fork,
+     #VmHWM starts anew when the process executes the script.
+     try:
+          with open('/proc/'+str(IS_pid)+'/status') as file:
+               for line in file:
+                    if line.startswith('VmHWM:'):
+                         return int(line.split()[1])/1024
+     except IOError:
+          pass
+     return 0
+
+def stg(YS_stg,YS_scr,YV_arg,YV_out,rrr_log_dir):
+     #Runs one RRR script in a separate process from the tst directory, as done
+     #in the reproducibility tests, and returns the wall time, the peak RSS, the
+     #size of the given outputs, and the traces written by the script, if any.
+     rrr_log=os.path.join(rrr_log_dir,YS_stg+'.log')
+     rrr_prf_dir=os.path.join(rrr_log_dir,'prf_'+YS_stg)
+     YM_env=dict(os.environ,RRR_PRF_DIR=rrr_prf_dir)
+     with open(rrr_log,'w') as logfile:
+          ZS_beg=time.time()
+          p=subprocess.Popen([sys.executable,os.path.join(rrr_src_dir,YS_scr)] \
+                             +YV_arg,cwd=rrr_tst_dir,stdout=logfile,           \
+                             stderr=subprocess.STDOUT,env=YM_env)
+          ZS_hwm=0
+          while p.poll() is None:
+               ZS_hwm=max(ZS_hwm,stg_hwm(p.pid))
+               time.sleep(ZS_pol)
+          ZS_dur=time.time()-ZS_beg
+     if p.returncode!=0:
+          print('ERROR - Failed stage '+YS_stg+', see '+rrr_log)
+          raise SystemExit(22)
+     ZS_out=sum([os.path.getsize(rrr_out) for rrr_out in YV_out])/1e6
+     YV_trc=[]
+     for rrr_trc_jsn in sorted(glob.glob(os.path.join(rrr_prf_dir,'*.json'))):
+          with open(rrr_trc_jsn,'r') as jsnfile:
+               YV_trc.append(json.load(jsnfile))
+     ZS_hwm=max([ZS_hwm]+[IM_trc['peak_RSS_MB'] for IM_trc in YV_trc])
+     #The traces also give the peak reached between the last reading and exit
+     print(' . '+YS_stg+': '+str(round(ZS_dur,3))+' seconds, '                 \
+           +str(round(ZS_hwm,1))+' MB peak RSS, '                              \
+           +str(round(ZS_out,3))+' MB output')
+     return {'stage':YS_stg,'seconds':ZS_dur,                                  \
+             'peak_RSS_MB':ZS_hwm,'output_MB':ZS_out,                          \
+             'traces':YV_trc}
+
+
+#*******************************************************************************
+#Loop over the numbers of river reaches
+#*******************************************************************************
+YV_run=[]
+
+for IS_riv_tot in IV_riv_tot:
+     print('Benchmarking '+str(IS_riv_tot)+' river reaches')
+
+     rrr_tmp_dir=tempfile.mkdtemp(prefix='tst_prf_pip_syn_')
+     print('- Temporary directory: '+rrr_tmp_dir)
+     def tmp(YS_fil): return os.path.join(rrr_tmp_dir,YS_fil)
+
+     numpy.random.seed(IS_sed)
+     ZS_beg=time.time()
+
+#-------------------------------------------------------------------------------
+#Synthetic river network
+#-------------------------------------------------------------------------------
+     IS_col=math.ceil(math.sqrt(IS_riv_tot))
+     IV_riv_tot_id=numpy.arange(IS_riv_tot)+10000001
+     IV_col=numpy.arange(IS_riv_tot)%IS_col
+     IV_row=numpy.arange(IS_riv_tot)//IS_col
+     ZV_x=ZS_lon_ori+(IV_col+0.5)*ZS_riv_dxy
+     ZV_y=ZS_lat_ori+(IV_row+0.5)*ZS_riv_dxy
+
+     IV_col_dn=numpy.clip(IV_col+numpy.random.randint(-1,2,IS_riv_tot),        \
+                          0,IS_col-1)
+     IV_riv_dn_ix=(IV_row-1)*IS_col+IV_col_dn
+     #Each reach flows into one of the three closest reaches of the row below
+     ZV_x_dn=numpy.where(IV_row>0,ZV_x[IV_riv_dn_ix],ZV_x)
+     ZV_y_dn=numpy.where(IV_row>0,ZV_y[IV_riv_dn_ix],ZV_y-ZS_riv_dxy)
+     #Reaches of the first row are outlets that flow out of the domain
+
+     YS_sch={'geometry':'LineString',                                          \
+             'properties':{'COMID':'int:10','lengthkm':'float:16.6'}}
+     with fiona.open(tmp('riv_syn.shp'),'w',driver='ESRI Shapefile',           \
+                     crs='EPSG:4326',schema=YS_sch) as mer_riv_lay:
+          for JS_riv_tot in range(IS_riv_tot):
+               ZS_lkm=111.2*math.hypot(ZV_x[JS_riv_tot]-ZV_x_dn[JS_riv_tot],   \
+                                       ZV_y[JS_riv_tot]-ZV_y_dn[JS_riv_tot])
+               mer_riv_lay.write({                                             \
+                    'geometry':{'type':'LineString',                           \
+                                'coordinates':[(ZV_x_dn[JS_riv_tot],           \
+                                                ZV_y_dn[JS_riv_tot]),          \
+                                               (ZV_x[JS_riv_tot],              \
+                                                ZV_y[JS_riv_tot])]},           \
+                    'properties':{'COMID':int(IV_riv_tot_id[JS_riv_tot]),      \
+                                  'lengthkm':ZS_lkm}})
+     #MERIT Basins polylines go from downstream to upstream
+
+#-------------------------------------------------------------------------------
+#Synthetic catchments
+#-------------------------------------------------------------------------------
+     YS_sch={'geometry':'Polygon',                                             \
+             'properties':{'COMID':'int:10','unitarea':'float:16.6'}}
+     ZS_hlf=ZS_riv_dxy/2
+     with fiona.open(tmp('cat_syn.shp'),'w',driver='ESRI Shapefile',           \
+                     crs='EPSG:4326',schema=YS_sch) as mer_cat_lay:
+          for JS_riv_tot in range(IS_riv_tot):
+               ZS_x=ZV_x[JS_riv_tot]
+               ZS_y=ZV_y[JS_riv_tot]
+               ZS_sqkm=(111.2*ZS_riv_dxy)**2*math.cos(math.radians(ZS_y))
+               mer_cat_lay.write({                                             \
+                    'geometry':{'type':'Polygon',                              \
+                                'coordinates':[[(ZS_x-ZS_hlf,ZS_y-ZS_hlf),     \
+                                                (ZS_x-ZS_hlf,ZS_y+ZS_hlf),     \
+                                                (ZS_x+ZS_hlf,ZS_y+ZS_hlf),     \
+                                                (ZS_x+ZS_hlf,ZS_y-ZS_hlf),     \
+                                                (ZS_x-ZS_hlf,ZS_y-ZS_hlf)]]},  \
+                    'properties':{'COMID':int(IV_riv_tot_id[JS_riv_tot]),      \
+                                  'unitarea':ZS_sqkm}})
+
+#-------------------------------------------------------------------------------
+#Synthetic runoff
+#-------------------------------------------------------------------------------
+     ZS_lsm_lon=ZS_lon_ori-ZS_lsm_dxy
+     ZS_lsm_lat=ZS_lat_ori-ZS_lsm_dxy
+     IS_lsm_lon=math.ceil(IS_col*ZS_riv_dxy/ZS_lsm_dxy)+2
+     IS_lsm_lat=math.ceil((IV_row[-1]+1)*ZS_riv_dxy/ZS_lsm_dxy)+2
+
+     g=netCDF4.Dataset(tmp('lsm_syn.nc4'),'w',format='NETCDF4')
+     g.createDimension('time',None)
+     g.createDimension('lat',IS_lsm_lat)
+     g.createDimension('lon',IS_lsm_lon)
+     g.createDimension('nv',2)
+     time_=g.createVariable('time','i4',('time',))
+     time_bnds=g.createVariable('time_bnds','i4',('time','nv',))
+     lat=g.createVariable('lat','f4',('lat',))
+     lon=g.createVariable('lon','f4',('lon',))
+     RUNSF=g.createVariable('RUNSF','f4',('time','lat','lon',),                \
+                            fill_value=1e20)
+     RUNSB=g.createVariable('RUNSB','f4',('time','lat','lon',),                \
+                            fill_value=1e20)
+     time_.units='seconds since 1970-01-01 00:00:00 +00:00'
+     RUNSF.units='kg m-2'
+     RUNSB.units='kg m-2'
+     lat[:]=ZS_lsm_lat+(numpy.arange(IS_lsm_lat)+0.5)*ZS_lsm_dxy
+     lon[:]=ZS_lsm_lon+(numpy.arange(IS_lsm_lon)+0.5)*ZS_lsm_dxy
+     ZV_time=numpy.arange(IS_time)*IS_TaR
+     time_[:]=ZV_time
+     time_bnds[:]=numpy.stack([ZV_time,ZV_time+IS_TaR],axis=1)
+     for JS_time in range(IS_time):
+          RUNSF[JS_time,:,:]=numpy.random.random((IS_lsm_lat,IS_lsm_lon))
+          RUNSB[JS_time,:,:]=numpy.random.random((IS_lsm_lat,IS_lsm_lon))
+     g.close()
+
+     ZS_dur=time.time()-ZS_beg
+     print(' . synthesis: '+str(round(ZS_dur,3))+' seconds')
+     YV_stg=[{'stage':'synthesis','seconds':ZS_dur}]
+
+#-------------------------------------------------------------------------------
+#Running stages
+#-------------------------------------------------------------------------------
+     YV_stg.append(stg('network','rrr_riv_tot_gen_all_meritbasins.py',         \
+                       [tmp('riv_syn.shp'),str(IS_max_up),tmp('con.csv'),      \
+                        tmp('kfc.csv'),tmp('xfc.csv'),tmp('srt.csv'),          \
+                        tmp('crd.csv')],                                       \
+                       [tmp('con.csv'),tmp('kfc.csv'),tmp('xfc.csv'),          \
+                        tmp('srt.csv'),tmp('crd.csv')],rrr_tmp_dir))
+     YV_stg.append(stg('basin','rrr_riv_bas_gen_one_meritbasins.py',           \
+                       [tmp('riv_syn.shp'),tmp('con.csv'),tmp('srt.csv'),      \
+                        tmp('bas.csv')],                                       \
+                       [tmp('bas.csv')],rrr_tmp_dir))
+     YV_stg.append(stg('catchment','rrr_cat_tot_gen_one_meritbasins.py',       \
+                       [tmp('cat_syn.shp'),tmp('cat.csv')],                    \
+                       [tmp('cat.csv')],rrr_tmp_dir))
+     YV_stg.append(stg('coupling','rrr_cpl_riv_lsm_lnk.py',                    \
+                       [tmp('con.csv'),tmp('cat.csv'),tmp('lsm_syn.nc4'),      \
+                        tmp('cpl.csv')],                                       \
+                       [tmp('cpl.csv')],rrr_tmp_dir))
+     YV_stg.append(stg('volume','rrr_cpl_riv_lsm_vol.py',                      \
+                       [tmp('con.csv'),tmp('crd.csv'),tmp('lsm_syn.nc4'),      \
+                        tmp('cpl.csv'),tmp('m3_riv.nc4')],                     \
+                       [tmp('m3_riv.nc4')],rrr_tmp_dir))
+     YV_stg.append(stg('routing','rrr_cpl_riv_lsm_rte.py',                     \
+                       [tmp('m3_riv.nc4'),tmp('con.csv'),tmp('bas.csv'),       \
+                        tmp('Qout.nc4')],                                      \
+                       [tmp('Qout.nc4')],rrr_tmp_dir))
+
+     YV_run.append({'IS_riv_tot':IS_riv_tot,                                   \
+                    'seconds':sum([IM_stg['seconds'] for IM_stg in YV_stg]),   \
+                    'peak_RSS_MB':max([IM_stg.get('peak_RSS_MB',0)             \
+                                       for IM_stg in YV_stg]),                 \
+                    'stages':YV_stg})
+
+     if not BS_kep:
+          shutil.rmtree(rrr_tmp_dir)
+
+
+#*******************************************************************************
+#Writing report
+#*******************************************************************************
+print('Writing report')
+
+IM_rep={'date':datetime.datetime.utcnow().replace(microsecond=0).isoformat(),  \
+        'host':{'node':platform.node(),                                        \
+                'machine':platform.machine(),                                  \
+                'cpus':os.cpu_count(),                                         \
+                'python':platform.python_version(),                            \
+                'fiona':fiona.__version__,                                     \
+                'netCDF4':netCDF4.__version__},                                \
+        'config':{'IS_time':IS_time,                                           \
+                  'ZS_riv_dxy':ZS_riv_dxy,                                     \
+                  'ZS_lsm_dxy':ZS_lsm_dxy,                                     \
+                  'IS_sed':IS_sed},                                            \
+        'runs':YV_run}
+
+with open(rrr_prf_jsn,'w') as jsnfile:
+     json.dump(IM_rep,jsnfile,indent=1)
+
+print('- Done')
+
+
+#*******************************************************************************
+#End
+#*******************************************************************************